@@ -0,0 +1,63 @@
+"""Add NOTIFY triggers for cache invalidation on profiles and user_role_links
+
+Revision ID: b7d41e0c9a23
+Revises: 4babbad3802b
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b7d41e0c9a23"
+down_revision: Union[str, None] = "4babbad3802b"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Payload: "<bảng>:<user id>". NOTIFY trùng payload trong cùng transaction được
+# Postgres gộp lại, nên cập nhật hàng loạt một user chỉ phát một thông báo.
+NOTIFY_FUNCTION = """
+CREATE OR REPLACE FUNCTION notify_cache_invalidation() RETURNS trigger AS $$
+DECLARE
+    changed RECORD;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed := OLD;
+    ELSE
+        changed := NEW;
+    END IF;
+
+    IF TG_TABLE_NAME = 'profiles' THEN
+        PERFORM pg_notify('cache_invalidation', TG_TABLE_NAME || ':' || changed.id::text);
+    ELSE
+        PERFORM pg_notify('cache_invalidation', TG_TABLE_NAME || ':' || changed.user_id::text);
+        IF TG_OP = 'UPDATE' AND OLD.user_id IS DISTINCT FROM NEW.user_id THEN
+            PERFORM pg_notify('cache_invalidation', TG_TABLE_NAME || ':' || OLD.user_id::text);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+TABLES = ("profiles", "user_role_links")
+
+
+def upgrade() -> None:
+    op.execute(NOTIFY_FUNCTION)
+    for table in TABLES:
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_cache_invalidation
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION notify_cache_invalidation()
+            """
+        )
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_cache_invalidation ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS notify_cache_invalidation()")
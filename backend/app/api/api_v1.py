@@ -2,6 +2,7 @@
 
 from fastapi import APIRouter
 from app.api.health import router as health_router
+from app.api.metrics import router as metrics_router
 from app.modules.user.user_routes import router as users_router
 from app.modules.user.user_routes import admin_router
 
@@ -12,6 +13,7 @@ api_v1_router = APIRouter(prefix="/api/v1", tags=["v1"])
 api_v1_router.include_router(health_router, prefix="", tags=["health"])
 
 api_v1_router.include_router(admin_router, prefix="/admin", tags=["admin"])
+api_v1_router.include_router(metrics_router, prefix="/admin", tags=["admin"])
 
 api_v1_router.include_router(users_router, prefix="/users", tags=["users"])
 
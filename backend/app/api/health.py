@@ -1,6 +1,7 @@
 """Health check endpoints."""
 
 from datetime import datetime, timezone
+from urllib.parse import urlsplit, urlunsplit
 from fastapi import APIRouter, status
 from app.common.schemas import (
     HealthCheckResponse,
@@ -9,7 +10,9 @@ from app.common.schemas import (
 )
 from app.core.config import settings
 from app.core.database import check_database_health
-from app.redis.client import check_redis_health
+from app.core.db_metrics import db_metrics
+from app.core.replicas import replica_pool
+from app.redis.client import check_redis_health, redis_breaker
 from app.core.logging import logger
 
 router = APIRouter()
@@ -50,9 +53,21 @@ async def database_health_check() -> DatabaseHealthResponse:
         database="postgresql",
         connected=is_healthy,
         response_time_ms=round(response_time * 1000, 2),  # Chuyển sang milliseconds
+        pool=db_metrics.pool_stats(),
     )
 
 
+def _redact_url(url: str | None) -> str:
+    """Bỏ mật khẩu khỏi REDIS_URL trước khi trả về."""
+    if not url:
+        return "Not configured"
+    parts = urlsplit(url)
+    host = parts.hostname or ""
+    if parts.port:
+        host = f"{host}:{parts.port}"
+    return urlunsplit((parts.scheme, host, parts.path, "", ""))
+
+
 @router.get(
     "/health/redis",
     response_model=RedisHealthResponse,
@@ -63,7 +78,10 @@ async def redis_health_check() -> RedisHealthResponse:
     """Health check endpoint cho Redis."""
     is_healthy, response_time = check_redis_health()
 
-    redis_url = settings.upstash_redis_rest_url or "Not configured"
+    if settings.redis_backend == "resp":
+        redis_url = _redact_url(settings.redis_url)
+    else:
+        redis_url = settings.upstash_redis_rest_url or "Not configured"
 
     return RedisHealthResponse(
         status="healthy" if is_healthy else "unhealthy",
@@ -73,6 +91,7 @@ async def redis_health_check() -> RedisHealthResponse:
         redis=redis_url,
         connected=is_healthy,
         response_time_ms=round(response_time * 1000, 2),  # Chuyển sang milliseconds
+        circuit_breaker=redis_breaker.stats(),
     )
 
 
@@ -101,10 +120,14 @@ async def comprehensive_health_check():
             "database": {
                 "healthy": db_healthy,
                 "response_time_ms": round(db_time * 1000, 2),
+                "pool": db_metrics.pool_stats(),
             },
             "redis": {
                 "healthy": redis_healthy,
                 "response_time_ms": round(redis_time * 1000, 2),
+                "circuit_state": redis_breaker.state.value,
             },
+            # Replica không khỏe chỉ làm đọc quay về primary, không ảnh hưởng status
+            "replicas": replica_pool.stats() if replica_pool.enabled else None,
         },
     }
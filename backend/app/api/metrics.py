@@ -0,0 +1,68 @@
+"""Metrics endpoint cho admin (JSON hoặc định dạng text của Prometheus)."""
+
+from datetime import datetime, timezone
+from typing import Literal
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from app.core import db_metrics as db
+from app.core.rate_limit import rate_limiter
+from app.modules.user.user_permissions import (
+    Permission,
+    annotate_route_permissions,
+    require,
+)
+from app.redis.helpers import cache_metrics, cache_stats
+from app.redis.metrics import render_prometheus
+from app.redis.query_cache import query_cache_stats
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+_CIRCUIT_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def _cache_gauges(stats: dict) -> dict[str, float]:
+    """Các số liệu toàn cục (không theo namespace) dưới dạng gauge."""
+    gauges = {
+        "zenspa_cache_circuit_state": _CIRCUIT_STATE_VALUES[
+            stats["circuit_breaker"]["state"]
+        ],
+        "zenspa_cache_invalidation_pending": stats["invalidation"]["pending"],
+    }
+    if stats["l1"] is not None:
+        gauges["zenspa_cache_l1_entries"] = stats["l1"]["entries"]
+    return gauges
+
+
+@router.get(
+    "/metrics",
+    dependencies=[Depends(require(Permission.METRICS_READ))],
+    summary="Metrics cache và DB",
+    description=(
+        "Hit/miss/độ trễ cache theo namespace key, pool DB, độ trễ theo câu lệnh, "
+        "truy vấn chậm; `format=prometheus` cho scraper"
+    ),
+)
+async def get_metrics(format: Literal["json", "prometheus"] = "json"):
+    """Snapshot metrics cache và DB (chỉ admin)."""
+    snapshot = cache_metrics.snapshot()
+    stats = cache_stats()
+    db_snapshot = db.db_metrics.snapshot()
+    if format == "prometheus":
+        return PlainTextResponse(
+            render_prometheus(snapshot, _cache_gauges(stats))
+            + db.render_prometheus(db_snapshot),
+            media_type=PROMETHEUS_CONTENT_TYPE,
+        )
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "cache": {"namespaces": snapshot, **stats, "queries": query_cache_stats()},
+        "database": db_snapshot,
+        "rate_limit": rate_limiter.stats(),
+    }
+
+
+# Gắn quyền yêu cầu (mask, x-permissions trong OpenAPI) vào từng route
+annotate_route_permissions(router.routes)
@@ -20,6 +20,7 @@ class DatabaseHealthResponse(HealthCheckResponse):
     database: str
     connected: bool
     response_time_ms: float
+    pool: Dict[str, Any] | None = None
 
 
 class RedisHealthResponse(HealthCheckResponse):
@@ -28,6 +29,7 @@ class RedisHealthResponse(HealthCheckResponse):
     redis: str
     connected: bool
     response_time_ms: float
+    circuit_breaker: Dict[str, Any] | None = None
 
 
 class ErrorDetail(BaseModel):
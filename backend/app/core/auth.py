@@ -1,39 +1,234 @@
 """Xác thực JWT từ Supabase và quản lý roles."""
 
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jwt import decode
+from starlette.requests import HTTPConnection
+from jwt import decode, get_unverified_header
 
 from app.core.config import settings
+from app.core.jwks import get_jwks_store
+from app.core.logging import logger
+from app.core.revocation import revocation_list
 
 # auto_error=False để cho phép check cookie nếu header không có
 oauth2_scheme = HTTPBearer(auto_error=False)
 
 
-def verify_jwt(token: str) -> dict:
-    """Verify JWT từ Supabase và trả về payload."""
-    try:
+class CurrentUser:
+    """Thông tin user đã xác thực, dựng một lần từ JWT payload.
+
+    Dùng `__slots__` để gọn bộ nhớ khi được giữ trong token cache.
+    Hỗ trợ `user["id"]` và `user.get("email")` để tương thích với code cũ dùng dict.
+    """
+
+    __slots__ = (
+        "id",
+        "email",
+        "full_name",
+        "roles",
+        "expires_at",
+        "issued_at",
+        "jti",
+        "permission_mask",
+        "role_version",
+    )
+
+    def __init__(
+        self,
+        id: str,
+        email: str | None,
+        full_name: str | None,
+        roles: list[str],
+        expires_at: float | None = None,
+        issued_at: float | None = None,
+        jti: str | None = None,
+    ):
+        self.id = id
+        self.email = email
+        self.full_name = full_name
+        self.roles = roles
+        self.expires_at = expires_at
+        self.issued_at = issued_at
+        self.jti = jti
+        # Bitmask quyền, tính lazy bởi RBAC policy
+        self.permission_mask: int | None = None
+        # Role version mà `roles` phản ánh; 0 = roles lấy từ JWT claims
+        self.role_version: int | None = 0
+
+    @classmethod
+    def from_payload(cls, payload: dict) -> "CurrentUser":
+        """Dựng CurrentUser từ JWT payload đã verify."""
+        # Lấy roles từ app_metadata (được inject bởi Supabase Auth Hook)
+        app_metadata = payload.get("app_metadata") or {}
+        user_metadata = payload.get("user_metadata") or {}
+        exp = payload.get("exp")
+        iat = payload.get("iat")
+        return cls(
+            id=payload["sub"],
+            email=payload.get("email"),
+            full_name=user_metadata.get("full_name"),
+            roles=list(app_metadata.get("roles", [])),
+            expires_at=float(exp) if exp is not None else None,
+            issued_at=float(iat) if iat is not None else None,
+            # Supabase không phát hành jti, dùng session_id để thu hồi theo phiên
+            jti=payload.get("jti") or payload.get("session_id"),
+        )
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Tương đương `dict.get`."""
+        return getattr(self, key, default)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "email": self.email,
+            "full_name": self.full_name,
+            "roles": self.roles,
+        }
+
+    def __repr__(self) -> str:
+        return f"CurrentUser(id={self.id!r}, roles={self.roles!r})"
+
+
+class TokenCache:
+    """LRU cache trong process: digest của token -> CurrentUser đã verify.
+
+    Entry hết hạn đúng tại `exp` của token; token không có `exp` sẽ không được cache.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[bytes, CurrentUser] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, digest: bytes, now: float | None = None) -> CurrentUser | None:
+        if self.max_size <= 0:
+            return None
+        now = time.time() if now is None else now
+        with self._lock:
+            user = self._entries.get(digest)
+            if user is None:
+                self.misses += 1
+                return None
+            if user.expires_at is None or user.expires_at <= now:
+                del self._entries[digest]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return user
+
+    def set(self, digest: bytes, user: CurrentUser) -> None:
+        if self.max_size <= 0 or user.expires_at is None:
+            return
+        with self._lock:
+            self._entries[digest] = user
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+# Cache token toàn cục (mỗi worker một instance)
+token_cache = TokenCache(settings.auth_token_cache_size)
+
+
+def _resolve_signing_key(token: str) -> tuple[object, str]:
+    """Chọn key verify theo `alg`/`kid` trong header của token."""
+    header = get_unverified_header(token)
+    alg = header.get("alg")
+    if alg not in settings.jwt_algorithms:
+        raise Exception(f"Thuật toán JWT không được phép: {alg}")
+
+    if alg == "HS256":
         if not settings.supabase_jwt_secret:
             raise Exception("Chưa cấu hình SUPABASE_JWT_SECRET")
+        return settings.supabase_jwt_secret, alg
+
+    store = get_jwks_store()
+    if store is None:
+        raise Exception("Chưa cấu hình JWKS")
+    jwk = store.get_key(header.get("kid"))
+    if jwk is None:
+        raise Exception(f"Không tìm thấy key cho kid={header.get('kid')}")
+    # Không cho phép token đổi thuật toán so với key (alg confusion)
+    if jwk.algorithm_name != alg:
+        raise Exception(f"Thuật toán {alg} không khớp key {jwk.algorithm_name}")
+    return jwk.key, alg
 
+
+def verify_jwt(token: str) -> dict:
+    """Verify JWT từ Supabase (HS256 hoặc RS256/ES256 qua JWKS) và trả về payload."""
+    try:
+        key, alg = _resolve_signing_key(token)
         return decode(
             token,
-            settings.supabase_jwt_secret,
-            algorithms=["HS256"],
+            key,
+            algorithms=[alg],
             audience="authenticated",
             leeway=60,  # Cho phép lệch 60s để tránh lỗi iat
         )
     except Exception as e:
-        print(f"JWT verify error: {e}")  # Debug log
+        logger.debug(f"JWT verify error: {e}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Token không hợp lệ"
         )
 
 
+def _verify_and_cache(token: str, digest: bytes) -> CurrentUser:
+    user = CurrentUser.from_payload(verify_jwt(token))
+    token_cache.set(digest, user)
+    return user
+
+
+def authenticate_token(token: str) -> CurrentUser:
+    """Trả về CurrentUser cho token, ưu tiên lấy từ token cache."""
+    digest = TokenCache.digest(token)
+    user = token_cache.get(digest)
+    if user is None:
+        user = _verify_and_cache(token, digest)
+    return user
+
+
 def get_current_user(
     request: Request,
     credentials: HTTPAuthorizationCredentials | None = Depends(oauth2_scheme),
-) -> dict:
+) -> CurrentUser:
     """Dependency để lấy thông tin cơ bản của user hiện tại từ JWT (Header hoặc Cookie)."""
     token = None
 
@@ -51,16 +246,58 @@ def get_current_user(
             detail="Không tìm thấy token xác thực",
         )
 
-    payload = verify_jwt(token)
+    user = authenticate_token(token)
+    if settings.token_revocation_enabled and revocation_list.is_revoked(
+        user.id, user.jti, user.issued_at
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Token đã bị thu hồi"
+        )
+    return user
 
-    # Lấy roles từ app_metadata (được inject bởi Supabase Auth Hook)
-    app_metadata = payload.get("app_metadata", {})
-    roles = app_metadata.get("roles", [])
 
-    user = {
-        "id": payload["sub"],
-        "email": payload.get("email"),
-        "full_name": payload.get("user_metadata", {}).get("full_name"),
-        "roles": roles,
-    }
-    return user
+def _connection_token(connection: HTTPConnection) -> str | None:
+    scheme, _, token = connection.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        token = connection.cookies.get("access_token")
+    return token or None
+
+
+def _ip_identity(connection: HTTPConnection) -> str:
+    client = connection.client
+    return f"ip:{client.host if client else 'unknown'}"
+
+
+def client_identity(connection: HTTPConnection) -> str:
+    """Danh tính client cho middleware: `user:<id>` nếu token có trong token cache, không thì `ip:<ip>`.
+
+    Chỉ tra token cache, không verify JWT trên event loop: token chưa cache hoặc
+    không hợp lệ được tính theo IP. Không kiểm tra revocation: chỉ dùng để đếm
+    request, endpoint vẫn xác thực đầy đủ.
+    """
+    token = _connection_token(connection)
+    if token:
+        user = token_cache.get(TokenCache.digest(token))
+        if user is not None:
+            return f"user:{user.id}"
+    return _ip_identity(connection)
+
+
+async def verified_client_identity(connection: HTTPConnection) -> str:
+    """Như `client_identity`, nhưng token chưa cache được verify trong thread riêng.
+
+    Dùng khi danh tính phải ổn định giữa các lần gửi lại (idempotency key): lần đầu
+    và lần lặp của cùng một token luôn ra cùng `user:<id>`.
+    """
+    token = _connection_token(connection)
+    if token:
+        digest = TokenCache.digest(token)
+        user = token_cache.get(digest)
+        if user is None:
+            try:
+                user = await asyncio.to_thread(_verify_and_cache, token, digest)
+            except Exception:
+                pass  # Token lỗi: endpoint sẽ trả 401
+        if user is not None:
+            return f"user:{user.id}"
+    return _ip_identity(connection)
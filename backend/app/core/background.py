@@ -0,0 +1,77 @@
+"""Làm mới dữ liệu nền theo kiểu stale-while-revalidate."""
+
+import threading
+import time
+from typing import Callable
+
+from app.core.logging import logger
+
+
+class BackgroundRefresher:
+    """Chạy hàm refresh trong thread nền, caller không bao giờ phải chờ.
+
+    Caller gọi `maybe_refresh()` trên hot path: nếu dữ liệu đã cũ hơn `interval`
+    thì một thread daemon được khởi chạy (tối đa một thread cùng lúc), trong khi
+    caller tiếp tục dùng dữ liệu cũ.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        refresh: Callable[[], object],
+        interval: float,
+        min_retry_interval: float = 5.0,
+    ):
+        self.name = name
+        self.interval = interval
+        self.min_retry_interval = min_retry_interval
+        self.last_success = 0.0
+        self.last_attempt = 0.0
+        self.last_error: str | None = None
+        self._refresh = refresh
+        self._lock = threading.Lock()
+        self._running = False
+
+    def is_stale(self, now: float | None = None) -> bool:
+        now = time.monotonic() if now is None else now
+        return now - self.last_success >= self.interval
+
+    def maybe_refresh(self) -> bool:
+        """Khởi chạy refresh nền nếu dữ liệu đã cũ."""
+        if not self.is_stale():
+            return False
+        return self.trigger()
+
+    def trigger(self) -> bool:
+        """Khởi chạy refresh nền ngay (bỏ qua nếu đang chạy hoặc vừa thất bại)."""
+        now = time.monotonic()
+        with self._lock:
+            if self._running or now - self.last_attempt < self.min_retry_interval:
+                return False
+            self._running = True
+            self.last_attempt = now
+        threading.Thread(
+            target=self._run, name=f"refresh-{self.name}", daemon=True
+        ).start()
+        return True
+
+    def run_now(self) -> bool:
+        """Refresh đồng bộ (dùng lúc khởi động). Trả về True nếu thành công."""
+        with self._lock:
+            self._running = True
+            self.last_attempt = time.monotonic()
+        return self._run()
+
+    def _run(self) -> bool:
+        try:
+            self._refresh()
+            self.last_success = time.monotonic()
+            self.last_error = None
+            return True
+        except Exception as e:
+            self.last_error = str(e)
+            logger.warning(f"Refresh nền '{self.name}' thất bại: {e}")
+            return False
+        finally:
+            with self._lock:
+                self._running = False
@@ -1,6 +1,6 @@
 """Quản lý cấu hình sử dụng Pydantic Settings."""
 
-from typing import List
+from typing import List, Literal
 from pydantic import field_validator
 from pydantic_settings import BaseSettings
 
@@ -23,10 +23,85 @@ class Settings(BaseSettings):
 
     # Database (Supabase PostgreSQL)
     database_url: str
-
-    # Redis (Upstash REST API)
+    # "session": pool của SQLAlchemy, kết nối trực tiếp hoặc session pooler (cổng 5432)
+    # "transaction": qua transaction pooler (pgbouncer/Supavisor, cổng 6543): NullPool,
+    # tắt cache prepared statement và đặt tên statement ngẫu nhiên
+    db_pool_mode: Literal["session", "transaction"] = "session"
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0  # Giây chờ lấy kết nối từ pool
+    db_pool_recycle: int = 1800  # Giây, đóng kết nối cũ trước khi pooler/LB cắt
+    db_pool_pre_ping: bool = True
+    db_statement_cache_size: int = 100  # Prepared statement cache mỗi kết nối (asyncpg)
+    db_query_cache_size: int = 1200  # Câu lệnh đã compile SQLAlchemy giữ lại mỗi engine
+    # Log truy vấn chậm (giây), tỉ lệ lấy mẫu 0..1, số entry giữ lại cho metrics
+    db_slow_query_threshold: float = 0.5
+    db_slow_query_sample_rate: float = 1.0
+    db_slow_query_log_size: int = 100
+    db_echo: bool = False
+    # Read replica (tùy chọn): endpoint đọc dùng get_read_session
+    db_replica_urls: List[str] = []
+    db_replica_strategy: Literal["round_robin", "least_connections"] = "round_robin"
+    db_replica_max_lag: float = 1.0  # Giây; trễ hơn thì loại khỏi vòng quay
+    db_replica_check_interval: float = 5.0  # Giây giữa các lần đo độ trễ
+    # LISTEN/NOTIFY: invalidation cache khi dữ liệu đổi ngoài API (trigger Supabase)
+    db_listen_enabled: bool = True
+    # Kết nối session (cổng 5432), không qua transaction pooler; mặc định dùng database_url
+    db_listen_url: str | None = None
+    db_listen_batch_interval: float = 0.1  # Giây gom NOTIFY trước khi invalidation
+
+    # Redis: "upstash" (REST API qua HTTPS) hoặc "resp" (redis-server, connection pool)
+    redis_backend: Literal["upstash", "resp"] = "upstash"
+    redis_url: str | None = None  # Cho backend resp, ví dụ redis://localhost:6379/0
     upstash_redis_rest_url: str | None = None
     upstash_redis_rest_token: str | None = None
+    redis_timeout: float = 2.0  # Giây cho mỗi lệnh
+    redis_max_connections: int = 100  # Kích thước connection pool (client async)
+    # Circuit breaker: số lỗi liên tiếp trước khi OPEN, backoff (giây) trước khi thử lại
+    redis_circuit_failure_threshold: int = 3
+    redis_circuit_backoff_base: float = 1.0
+    redis_circuit_backoff_max: float = 60.0
+
+    # Cache L1 trong process (đứng trước Redis)
+    cache_l1_enabled: bool = True
+    # "memory": LRU riêng từng worker; "shared": segment mmap dùng chung trên máy
+    cache_l1_backend: Literal["memory", "shared"] = "memory"
+    cache_l1_max_bytes: int = 32 * 1024 * 1024
+    cache_l1_ttl: int = 30  # Giây, luôn ngắn hơn TTL ở Redis
+    cache_l1_sync_interval: float = 1.0  # Giây giữa các lần đọc invalidation
+    # Giá trị cache mã hóa JSON (orjson nếu có); nén zlib từ ngưỡng (byte)
+    cache_compress_threshold: int = 1024
+    cache_shared_path: str = "/dev/shm/zenspa-cache"
+    cache_shared_slots: int = 16_384
+    cache_shared_slot_size: int = 2048  # Byte mỗi slot (key + value + header)
+    # Hàng đợi invalidation: gom key trong cửa sổ (giây), xóa theo lô, thử lại có backoff
+    cache_invalidation_flush_interval: float = 0.02
+    cache_invalidation_batch_size: int = 500
+    cache_invalidation_max_retries: int = 5
+    cache_invalidation_retry_base: float = 0.2
+    cache_invalidation_retry_max: float = 10.0
+    cache_invalidation_drain_timeout: float = 5.0  # Giây chờ khi tắt ứng dụng
+    # Warmup: nạp trước roles và N profile cập nhật gần nhất (khi khởi động hoặc qua admin API).
+    # Khi bật lúc khởi động, chỉ một worker giữ lease Redis chạy warmup
+    cache_warmup_on_startup: bool = False
+    cache_warmup_profiles: int = 10_000
+    cache_warmup_batch_size: int = 500
+    cache_warmup_concurrency: int = 4  # Số batch chạy song song, nhỏ hơn pool DB
+    cache_warmup_lease_ttl: float = 60.0  # Giây, gia hạn sau mỗi batch
+
+    # Rate limit (token bucket trong Redis): "<số request>/<giây>" cho từng nhóm route
+    rate_limit_enabled: bool = True
+    rate_limit_default: str = "300/60"  # Theo IP, cho route không thuộc nhóm nào
+    rate_limit_users: str = "120/60"  # /api/v1/users, theo user
+    rate_limit_admin: str = "60/60"  # /api/v1/admin, theo user
+    rate_limit_exempt_paths: List[str] = ["/health", "/api/v1/health", "/ping"]
+
+    # Idempotency-Key cho request ghi: lưu response đầu tiên trong Redis
+    idempotency_enabled: bool = True
+    idempotency_paths: List[str] = ["/api/v1/admin"]
+    idempotency_ttl: int = 24 * 3600  # Giây giữ response để trả lại cho request lặp
+    idempotency_lock_timeout: float = 30.0  # Giây chờ request trùng đang xử lý
+    idempotency_max_body_bytes: int = 64 * 1024  # Response lớn hơn không được lưu
 
     # Logging
     log_level: str = "INFO"
@@ -37,6 +112,24 @@ class Settings(BaseSettings):
     supabase_service_role_key: str | None = None
     supabase_jwt_secret: str | None = None
 
+    # Auth
+    jwt_algorithms: List[str] = ["HS256"]  # Thêm RS256/ES256 khi dùng signing keys
+    supabase_jwks_source: str | None = None  # URL hoặc file JWKS (mặc định lấy từ SUPABASE_URL)
+    jwks_refresh_interval: int = 600  # Giây
+    auth_token_cache_size: int = 10000  # Số token đã verify giữ trong cache (0 = tắt)
+
+    # Thu hồi token (revocation list trong Redis + Bloom filter mỗi worker)
+    token_revocation_enabled: bool = True
+    token_revocation_capacity: int = 100_000
+    token_revocation_error_rate: float = 0.01
+    token_revocation_retention: int = 7200  # Giây, >= thời gian sống tối đa của JWT
+    token_revocation_sync_interval: int = 5  # Giây giữa các lần đồng bộ tăng dần
+    token_revocation_full_sync_interval: int = 300  # Giây giữa các lần rebuild filter
+
+    # Role version (đổi role có hiệu lực ngay, không cần chờ token refresh)
+    role_version_cache_size: int = 50_000
+    role_version_sync_interval: int = 2  # Giây
+
     class Config:
         env_file = ".env"
         case_sensitive = False
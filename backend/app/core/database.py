@@ -2,10 +2,12 @@
 
 import time
 from typing import AsyncGenerator
+from uuid import uuid4
+from fastapi import Request
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import QueuePool
 from sqlmodel import text
 from tenacity import (
     retry,
@@ -16,6 +18,7 @@ from tenacity import (
 from sqlalchemy.exc import OperationalError, DBAPIError
 
 from app.core.config import settings
+from app.core.db_metrics import InstrumentedNullPool, InstrumentedQueuePool, db_metrics
 from app.core.exceptions import DatabaseException
 from app.core.logging import logger
 
@@ -24,19 +27,67 @@ DATABASE_URL = settings.database_url
 if DATABASE_URL and DATABASE_URL.startswith("postgresql://"):
     DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
 
+# Khóa trong `session.info` trỏ tới `request.state` của request đang xử lý
+REQUEST_STATE_KEY = "request_state"
+
+# Cổng transaction pooler của Supabase (Supavisor)
+TRANSACTION_POOLER_PORT = 6543
+
+
+def _unique_statement_name() -> str:
+    """Tên prepared statement không trùng giữa các kết nối server dùng chung."""
+    return f"__asyncpg_{uuid4()}__"
+
+
+def engine_options(pool_mode: str | None = None) -> dict:
+    """
+    Tham số cho `create_async_engine` theo `db_pool_mode`.
+
+    - "session": QueuePool với kích thước, recycle, pre-ping từ settings.
+    - "transaction": mỗi transaction có thể chạy trên một kết nối server khác,
+      nên bỏ pool phía app (pooler đã gom kết nối) và không dùng lại prepared
+      statement giữa các lần gọi.
+    """
+    pool_mode = pool_mode or settings.db_pool_mode
+    if pool_mode == "transaction":
+        return {
+            "poolclass": InstrumentedNullPool,
+            "connect_args": {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": _unique_statement_name,
+            },
+            "query_cache_size": settings.db_query_cache_size,
+            "echo": settings.db_echo,
+        }
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "connect_args": {
+            "statement_cache_size": settings.db_statement_cache_size,
+            "prepared_statement_cache_size": settings.db_statement_cache_size,
+        },
+        "query_cache_size": settings.db_query_cache_size,
+        "echo": settings.db_echo,
+    }
+
+
+if (
+    settings.db_pool_mode == "session"
+    and make_url(DATABASE_URL).port == TRANSACTION_POOLER_PORT
+):
+    logger.warning(
+        f"DATABASE_URL dùng cổng {TRANSACTION_POOLER_PORT} (transaction pooler) nhưng "
+        "DB_POOL_MODE=session: prepared statement có thể lỗi, đặt DB_POOL_MODE=transaction"
+    )
+
 # Tạo engine async
-engine = create_async_engine(
-    DATABASE_URL,
-    pool_size=settings.db_pool_size if hasattr(settings, "db_pool_size") else 10,
-    max_overflow=(
-        settings.db_max_overflow if hasattr(settings, "db_max_overflow") else 10
-    ),
-    pool_timeout=(
-        settings.db_pool_timeout if hasattr(settings, "db_pool_timeout") else 30
-    ),
-    echo=settings.db_echo if hasattr(settings, "db_echo") else False,
-    future=True,
-)
+engine = create_async_engine(DATABASE_URL, **engine_options())
+db_metrics.instrument(engine, "primary")
 
 # Tạo session factory với AsyncSession
 AsyncSessionLocal = sessionmaker(
@@ -70,12 +121,14 @@ async def close_db() -> None:
     logger.info("Kết nối database đã đóng")
 
 
-async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+async def get_async_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
     """
     Dependency cho FastAPI.
     Cung cấp async database session, tự động close sau request.
+    Session gắn với state của request để đọc qua replica biết request đã ghi.
     """
     async with AsyncSessionLocal() as session:
+        session.info[REQUEST_STATE_KEY] = request.state
         try:
             yield session
         finally:
@@ -0,0 +1,125 @@
+"""Lắng nghe LISTEN/NOTIFY của Postgres trên một kết nối asyncpg riêng.
+
+Trigger trong DB (xem migration `b7d41e0c9a23`) phát payload khi dữ liệu đổi,
+kể cả khi ghi từ ngoài API (Supabase trigger, auth hook). Listener gom payload
+trong `batch_interval` giây (payload trùng chỉ giữ một lần) rồi gọi `on_batch`.
+
+Kết nối nằm ngoài pool của SQLAlchemy và phải là kết nối session (LISTEN không
+chạy qua transaction pooler). Mất kết nối thì kết nối lại với backoff; NOTIFY
+không bền vững nên thay đổi trong lúc mất kết nối chỉ còn được TTL cache che.
+"""
+
+import asyncio
+from typing import Awaitable, Callable
+
+import asyncpg
+
+from app.core.logging import logger
+
+
+class PgNotifyListener:
+    """Task nền nhận NOTIFY trên `channel` và xử lý theo lô."""
+
+    def __init__(
+        self,
+        dsn: str,
+        channel: str,
+        on_batch: Callable[[set[str]], Awaitable[None]],
+        batch_interval: float = 0.1,
+        keepalive_interval: float = 30.0,
+        reconnect_base: float = 1.0,
+        reconnect_max: float = 60.0,
+    ):
+        self.dsn = dsn
+        self.channel = channel
+        self.on_batch = on_batch
+        self.batch_interval = batch_interval
+        self.keepalive_interval = keepalive_interval
+        self.reconnect_base = reconnect_base
+        self.reconnect_max = reconnect_max
+        self._pending: set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._stats = {"notifications": 0, "batches": 0, "errors": 0, "reconnects": 0}
+        self.connected = False
+        self._stopping = False
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        # Cờ dừng: wait_for (Python < 3.12) có thể nuốt cancel khi NOTIFY vừa tới
+        self._stopping = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Xử lý nốt payload đã nhận
+        await self._flush()
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str) -> None:
+        self._stats["notifications"] += 1
+        self._pending.add(payload)
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        backoff = self.reconnect_base
+        while not self._stopping:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                await connection.add_listener(self.channel, self._on_notify)
+                self.connected = True
+                backoff = self.reconnect_base
+                logger.info(f"Đang lắng nghe NOTIFY trên kênh '{self.channel}'")
+                await self._pump(connection)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["errors"] += 1
+                logger.warning(f"Listener '{self.channel}' mất kết nối: {e}")
+            finally:
+                self.connected = False
+                if connection is not None and not connection.is_closed():
+                    await connection.close(timeout=5)
+            if self._stopping:
+                return
+            self._stats["reconnects"] += 1
+            await asyncio.sleep(backoff)
+            backoff = min(self.reconnect_max, backoff * 2)
+
+    async def _pump(self, connection) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.keepalive_interval)
+            except asyncio.TimeoutError:
+                # Không có NOTIFY: ping để phát hiện kết nối chết
+                await connection.execute("SELECT 1")
+                continue
+            self._wakeup.clear()
+            # Gom các thay đổi của những transaction commit gần nhau
+            await asyncio.sleep(self.batch_interval)
+            await self._flush()
+
+    async def _flush(self) -> None:
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, set()
+        self._stats["batches"] += 1
+        try:
+            await self.on_batch(batch)
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.error(f"Lỗi xử lý {len(batch)} NOTIFY từ '{self.channel}': {e}")
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "connected": self.connected,
+            "pending": len(self._pending),
+        }
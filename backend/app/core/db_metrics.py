@@ -0,0 +1,283 @@
+"""Metrics cho pool kết nối và truy vấn DB, kèm log truy vấn chậm có lấy mẫu.
+
+Mỗi engine (primary, từng replica) được gắn nhãn và ghi:
+- thời gian chờ lấy kết nối từ pool (gồm cả mở kết nối mới), số lần hết giờ chờ;
+- số kết nối đang mượn (hiện tại và đỉnh), overflow và kích thước pool;
+- độ trễ theo câu lệnh đã chuẩn hóa (tham số đã là placeholder, danh sách IN gộp lại).
+
+Truy vấn chậm hơn `db_slow_query_threshold` được ghi log (theo tỉ lệ lấy mẫu) cùng
+`request_id` của request đang xử lý; không ghi giá trị tham số.
+"""
+
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.core.middleware import request_id_ctx
+from app.redis.metrics import LatencyHistogram, escape_label
+
+MAX_STATEMENTS = 200
+MAX_STATEMENT_LENGTH = 300
+OVERFLOW_STATEMENT = "_other"
+_QUERY_STARTED = "query_started"
+_WHITESPACE = re.compile(r"\s+")
+# "IN ($1, $2, ...)" có độ dài đổi theo số phần tử: gộp về một dạng
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\$\d+|%\(\w+\)s|\?)(?:::\w+)?\s*,?)+\)")
+
+
+def normalize_statement(statement: str) -> str:
+    normalized = _WHITESPACE.sub(" ", statement).strip()
+    normalized = _PLACEHOLDER_LIST.sub("(...)", normalized)
+    return normalized[:MAX_STATEMENT_LENGTH]
+
+
+class _StatementMetrics:
+    __slots__ = ("latency", "errors", "max")
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.errors = 0
+        self.max = 0.0
+
+
+class _EngineMetrics:
+    """Số liệu của một engine; `pool` trỏ tới pool hiện tại (đổi sau dispose)."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.pool = None
+        self.checkout_wait = LatencyHistogram()
+        self.checkout_timeouts = 0
+        self.connects = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+
+    def snapshot(self) -> dict:
+        pool = self.pool
+        has_queue = hasattr(pool, "overflow")
+        return {
+            "in_use": self.in_use,
+            "peak_in_use": self.peak_in_use,
+            "pool_size": pool.size() if has_queue else None,
+            "idle": pool.checkedin() if has_queue else None,
+            "overflow": max(0, pool.overflow()) if has_queue else None,
+            "connects": self.connects,
+            "checkout_timeouts": self.checkout_timeouts,
+            "checkout_wait_seconds": self.checkout_wait.snapshot(),
+        }
+
+
+class DBMetrics:
+    """Gom metrics của mọi engine đã `instrument`, theo nhãn engine."""
+
+    def __init__(
+        self,
+        slow_query_threshold: float = 0.5,
+        slow_query_sample_rate: float = 1.0,
+        slow_query_log_size: int = 100,
+        max_statements: int = MAX_STATEMENTS,
+    ):
+        self.slow_query_threshold = slow_query_threshold
+        self.slow_query_sample_rate = slow_query_sample_rate
+        self.max_statements = max_statements
+        self.slow_queries: deque[dict] = deque(maxlen=slow_query_log_size)
+        self._engines: dict[str, _EngineMetrics] = {}
+        self._statements: dict[str, _StatementMetrics] = {}
+        self._lock = threading.Lock()
+
+    def instrument(self, engine, label: str) -> None:
+        """Gắn hook của pool và engine (truyền AsyncEngine hoặc Engine)."""
+        sync_engine = getattr(engine, "sync_engine", engine)
+        metrics = self._engines[label] = _EngineMetrics(label)
+        metrics.pool = sync_engine.pool
+        sync_engine.pool.metrics = metrics
+
+        # Listener gắn trên engine được giữ lại khi pool được tạo lại (dispose)
+        @event.listens_for(sync_engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            metrics.connects += 1
+
+        @event.listens_for(sync_engine, "checkout")
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            metrics.in_use += 1
+            metrics.peak_in_use = max(metrics.peak_in_use, metrics.in_use)
+
+        @event.listens_for(sync_engine, "checkin")
+        def on_checkin(dbapi_connection, connection_record):
+            metrics.in_use = max(0, metrics.in_use - 1)
+
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault(_QUERY_STARTED, []).append(time.perf_counter())
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def after_execute(conn, cursor, statement, parameters, context, executemany):
+            started = conn.info[_QUERY_STARTED].pop()
+            self.observe_query(label, statement, time.perf_counter() - started)
+
+        @event.listens_for(sync_engine, "handle_error")
+        def on_error(exception_context):
+            conn = exception_context.connection
+            if conn is not None and conn.info.get(_QUERY_STARTED):
+                conn.info[_QUERY_STARTED].pop()
+            if exception_context.statement:
+                self._statement(exception_context.statement).errors += 1
+
+    def _statement(self, statement: str) -> _StatementMetrics:
+        key = normalize_statement(statement)
+        metrics = self._statements.get(key)
+        if metrics is None:
+            with self._lock:
+                if len(self._statements) >= self.max_statements:
+                    key = OVERFLOW_STATEMENT
+                metrics = self._statements.setdefault(key, _StatementMetrics())
+        return metrics
+
+    def observe_query(self, label: str, statement: str, seconds: float) -> None:
+        metrics = self._statement(statement)
+        metrics.latency.observe(seconds)
+        metrics.max = max(metrics.max, seconds)
+        if (
+            seconds >= self.slow_query_threshold
+            and random.random() < self.slow_query_sample_rate
+        ):
+            entry = {
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "engine": label,
+                "duration_ms": round(seconds * 1000, 2),
+                "statement": normalize_statement(statement),
+                "request_id": request_id_ctx.get(),
+            }
+            self.slow_queries.append(entry)
+            logger.warning(
+                f"Truy vấn chậm {entry['duration_ms']} ms trên {label} "
+                f"(request {entry['request_id']}): {entry['statement']}"
+            )
+
+    def observe_checkout(self, metrics: _EngineMetrics, seconds: float, timeout: bool) -> None:
+        metrics.checkout_wait.observe(seconds)
+        if timeout:
+            metrics.checkout_timeouts += 1
+
+    def pool_stats(self) -> dict:
+        return {label: metrics.snapshot() for label, metrics in self._engines.items()}
+
+    def snapshot(self) -> dict:
+        statements = {}
+        for statement, metrics in list(self._statements.items()):
+            latency = metrics.latency.snapshot()
+            statements[statement] = {
+                "count": latency["count"],
+                "errors": metrics.errors,
+                "mean_ms": (
+                    round(latency["sum"] / latency["count"] * 1000, 3)
+                    if latency["count"]
+                    else None
+                ),
+                "max_ms": round(metrics.max * 1000, 3),
+                "latency_seconds": latency,
+            }
+        return {
+            "pools": self.pool_stats(),
+            "statements": statements,
+            "slow_queries": list(self.slow_queries),
+            "slow_query_threshold_seconds": self.slow_query_threshold,
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._statements.clear()
+        self.slow_queries.clear()
+
+
+db_metrics = DBMetrics(
+    slow_query_threshold=settings.db_slow_query_threshold,
+    slow_query_sample_rate=settings.db_slow_query_sample_rate,
+    slow_query_log_size=settings.db_slow_query_log_size,
+)
+
+
+class _TimedCheckout:
+    """Đo thời gian chờ lấy kết nối của pool (SQLAlchemy không có event trước checkout)."""
+
+    metrics: _EngineMetrics | None = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        timeout = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timeout = True
+            raise
+        finally:
+            if self.metrics is not None:
+                db_metrics.observe_checkout(
+                    self.metrics, time.perf_counter() - started, timeout
+                )
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        if self.metrics is not None:
+            self.metrics.pool = pool
+        return pool
+
+
+class InstrumentedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+class InstrumentedNullPool(_TimedCheckout, NullPool):
+    pass
+
+
+def render_prometheus(snapshot: dict) -> str:
+    """Xuất snapshot của `DBMetrics` (pool và độ trễ câu lệnh) cho Prometheus."""
+    lines = []
+    gauges = ("in_use", "peak_in_use", "pool_size", "idle", "overflow")
+    for gauge in gauges:
+        metric = f"zenspa_db_pool_{gauge}"
+        lines.append(f"# TYPE {metric} gauge")
+        for label, pool in snapshot["pools"].items():
+            if pool[gauge] is not None:
+                lines.append(f'{metric}{{engine="{escape_label(label)}"}} {pool[gauge]}')
+    for counter in ("connects", "checkout_timeouts"):
+        metric = f"zenspa_db_pool_{counter}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for label, pool in snapshot["pools"].items():
+            lines.append(f'{metric}{{engine="{escape_label(label)}"}} {pool[counter]}')
+
+    histograms = [
+        (
+            "zenspa_db_pool_checkout_wait_seconds",
+            f'engine="{escape_label(label)}"',
+            pool["checkout_wait_seconds"],
+        )
+        for label, pool in snapshot["pools"].items()
+    ] + [
+        (
+            "zenspa_db_query_seconds",
+            f'statement="{escape_label(statement)}"',
+            data["latency_seconds"],
+        )
+        for statement, data in snapshot["statements"].items()
+    ]
+    declared = set()
+    for metric, labels, histogram in histograms:
+        if metric not in declared:
+            declared.add(metric)
+            lines.append(f"# TYPE {metric} histogram")
+        for bound, count in histogram["buckets"].items():
+            lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f"{metric}_sum{{{labels}}} {histogram['sum']}")
+        lines.append(f"{metric}_count{{{labels}}} {histogram['count']}")
+    return "\n".join(lines) + "\n"
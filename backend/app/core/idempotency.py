@@ -0,0 +1,271 @@
+"""Hỗ trợ header `Idempotency-Key` cho request ghi (POST/PUT/PATCH/DELETE).
+
+Request đầu tiên với một key giữ marker "pending" trong Redis (`SET NX PX`),
+chạy endpoint rồi lưu response trong `idempotency_ttl` giây. Request lặp lại:
+- cùng worker, khi request đầu còn chạy: chờ chung một future;
+- worker khác: đợi marker chuyển sang "done" (tối đa `lock_timeout`);
+- sau đó: nhận lại response đã lưu, kèm header `Idempotent-Replayed: true`.
+
+Key gắn với danh tính client (user hoặc IP) và fingerprint của request
+(method, path, body); dùng lại key cho request khác trả 422. Response 5xx
+không được lưu để client thử lại. Redis unavailable thì chỉ còn gom trong worker.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from typing import Any
+
+from fastapi import status
+from starlette.requests import HTTPConnection
+from starlette.responses import JSONResponse, Response
+
+from app.core.auth import verified_client_identity
+from app.core.exceptions import ErrorCode
+from app.core.logging import logger
+from app.redis.client import get_async_redis_client
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+IDEMPOTENCY_KEY_PREFIX = "idempotency:"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MUTATING_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+_PENDING = "pending"
+_DONE = "done"
+# Request dẫn đầu bị hủy: request trùng đang chờ tự xử lý lại
+_RETRY = object()
+
+
+def _error(status_code: int, code: ErrorCode, message: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"status": "error", "error": {"code": code, "message": message}},
+    )
+
+
+class IdempotencyMiddleware:
+    """Middleware ASGI lưu và trả lại response theo `Idempotency-Key`."""
+
+    def __init__(
+        self,
+        app,
+        paths: list[str],
+        ttl: int = 24 * 3600,
+        lock_timeout: float = 30.0,
+        max_body_bytes: int = 64 * 1024,
+    ):
+        self.app = app
+        self.paths = tuple(paths)
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.max_body_bytes = max_body_bytes
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in MUTATING_METHODS
+            or not scope["path"].startswith(self.paths)
+        ):
+            await self.app(scope, receive, send)
+            return
+        connection = HTTPConnection(scope)
+        idempotency_key = connection.headers.get(IDEMPOTENCY_HEADER)
+        if not idempotency_key:
+            await self.app(scope, receive, send)
+            return
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            response = _error(
+                status.HTTP_400_BAD_REQUEST,
+                ErrorCode.VALIDATION_ERROR,
+                f"Idempotency-Key dài tối đa {MAX_KEY_LENGTH} ký tự",
+            )
+            await response(scope, receive, send)
+            return
+
+        body = await _read_body(receive)
+        fingerprint = hashlib.sha256(
+            b"%s %s\n%s" % (scope["method"].encode(), scope["path"].encode(), body)
+        ).hexdigest()
+        identity = await verified_client_identity(connection)
+        key = f"{IDEMPOTENCY_KEY_PREFIX}{identity}:{idempotency_key}"
+        response = await self._handle(scope, receive, body, key, fingerprint)
+        await response(scope, receive, send)
+
+    async def _handle(
+        self, scope, receive, body: bytes, key: str, fingerprint: str
+    ) -> Response:
+        while (future := self._inflight.get(key)) is not None:
+            # Request trùng trong cùng worker: chờ kết quả của request đầu
+            record = await asyncio.shield(future)
+            if record is not _RETRY:
+                return self._replay(record, fingerprint)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            record = await self._execute_once(scope, receive, body, key, fingerprint)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                # Không hủy future dùng chung: client đầu ngắt kết nối không được
+                # làm hỏng request trùng của client vẫn đang chờ
+                future.set_result(_RETRY)
+            else:
+                future.set_exception(e)
+                future.exception()  # Đánh dấu đã đọc khi không có request nào chờ
+            raise
+        else:
+            future.set_result(record)
+        finally:
+            self._inflight.pop(key, None)
+
+        if record.get("replayed"):
+            return self._replay(record, fingerprint)
+        return _to_response(record)
+
+    async def _execute_once(
+        self, scope, receive, body: bytes, key: str, fingerprint: str
+    ) -> dict:
+        """Chạy endpoint nếu giữ được marker; không thì đợi response đã lưu."""
+        deadline = time.monotonic() + self.lock_timeout
+        while True:
+            acquired, stored = await self._acquire(key, fingerprint)
+            if acquired:
+                break
+            if stored is not None and stored["state"] == _DONE:
+                return {**stored, "replayed": True}
+            if stored is not None and stored["fingerprint"] != fingerprint:
+                return {**stored, "replayed": True}  # _replay trả 422
+            if time.monotonic() >= deadline:
+                return {"state": _PENDING, "fingerprint": fingerprint, "replayed": True}
+            await asyncio.sleep(POLL_INTERVAL)
+
+        try:
+            record = await self._run_app(scope, _replay_receive(body, receive))
+        except BaseException:
+            await self._forget(key)
+            raise
+        record["fingerprint"] = fingerprint
+        await self._store(key, record)
+        return record
+
+    async def _acquire(self, key: str, fingerprint: str) -> tuple[bool, dict | None]:
+        """(True, None) nếu giữ marker (hoặc Redis unavailable); không thì bản đã lưu."""
+        try:
+            redis = await get_async_redis_client()
+            if redis is None:
+                return True, None
+            marker = json.dumps({"state": _PENDING, "fingerprint": fingerprint})
+            acquired = await redis.execute(
+                "SET", key, marker, "NX", "PX", int(self.lock_timeout * 1000)
+            )
+            if acquired == "OK":
+                return True, None
+            raw = await redis.get(key)
+            # Marker vừa hết hạn hoặc bị xóa (response 5xx): thử lấy lại ở vòng sau
+            return False, json.loads(raw) if raw else None
+        except Exception as e:
+            logger.warning(f"Idempotency qua Redis thất bại, xử lý bình thường: {e}")
+            return True, None
+
+    async def _store(self, key: str, record: dict) -> None:
+        if record["status"] >= 500 or len(record["body"]) > self.max_body_bytes:
+            # Không lưu: request lặp lại sẽ được chạy lại
+            await self._forget(key)
+            return
+        try:
+            redis = await get_async_redis_client()
+            if redis is not None:
+                await redis.setex(key, self.ttl, json.dumps(_encode(record)))
+        except Exception as e:
+            logger.warning(f"Không lưu được response idempotency {key}: {e}")
+
+    async def _forget(self, key: str) -> None:
+        """Bỏ marker để request lặp lại được chạy lại."""
+        try:
+            redis = await get_async_redis_client()
+            if redis is not None:
+                await redis.delete(key)
+        except Exception as e:
+            # Marker tự hết hạn sau lock_timeout
+            logger.warning(f"Không xóa được marker idempotency {key}: {e}")
+
+    async def _run_app(self, scope, receive) -> dict:
+        """Chạy endpoint, gom status/header/body của response."""
+        record: dict[str, Any] = {"state": _DONE, "status": 500, "headers": [], "body": b""}
+        chunks: list[bytes] = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                record["status"] = message["status"]
+                record["headers"] = [
+                    (name.decode("latin-1"), value.decode("latin-1"))
+                    for name, value in message.get("headers", [])
+                ]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        record["body"] = b"".join(chunks)
+        return record
+
+    def _replay(self, record: dict, fingerprint: str) -> Response:
+        if record["fingerprint"] != fingerprint:
+            return _error(
+                status.HTTP_422_UNPROCESSABLE_ENTITY,
+                ErrorCode.VALIDATION_ERROR,
+                "Idempotency-Key đã được dùng cho một request khác",
+            )
+        if record["state"] != _DONE:
+            return _error(
+                status.HTTP_409_CONFLICT,
+                ErrorCode.CONFLICT,
+                "Request với Idempotency-Key này đang được xử lý",
+            )
+        response = _to_response(record)
+        response.headers[REPLAYED_HEADER] = "true"
+        return response
+
+
+def _encode(record: dict) -> dict:
+    return {**record, "body": base64.b64encode(record["body"]).decode("ascii")}
+
+
+def _to_response(record: dict) -> Response:
+    body = record["body"]
+    if isinstance(body, str):
+        body = base64.b64decode(body)
+    response = Response(content=body, status_code=record["status"])
+    # Giữ nguyên header của response gốc, chỉ tính lại content-length
+    response.raw_headers = [
+        (name.encode("latin-1"), value.encode("latin-1"))
+        for name, value in record["headers"]
+        if name.lower() != "content-length"
+    ] + [(b"content-length", str(len(body)).encode())]
+    return response
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def _replay_receive(body: bytes, receive):
+    """Trả body đã đọc cho endpoint, sau đó chuyển tiếp `receive` gốc (http.disconnect)."""
+    sent = False
+
+    async def replay():
+        nonlocal sent
+        if sent:
+            return await receive()
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return replay
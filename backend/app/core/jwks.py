@@ -0,0 +1,103 @@
+"""Tải và cache JWKS (public keys) để verify JWT ký bất đối xứng (RS256/ES256)."""
+
+import json
+from pathlib import Path
+
+import requests
+from jwt import PyJWK
+from jwt.exceptions import PyJWKError
+
+from app.core.background import BackgroundRefresher
+from app.core.config import settings
+from app.core.logging import logger
+
+
+class JWKSKeyStore:
+    """Key set lấy từ URL hoặc file local, cache theo `kid`.
+
+    Key được làm mới nền (stale-while-revalidate): request luôn dùng key hiện có,
+    không bao giờ chờ việc tải JWKS.
+    """
+
+    def __init__(self, source: str, refresh_interval: float, timeout: float = 5.0):
+        self.source = source
+        self.timeout = timeout
+        self._keys: dict[str, PyJWK] = {}
+        self.refresher = BackgroundRefresher(
+            f"jwks:{source}", self.load, refresh_interval
+        )
+
+    def _fetch(self) -> dict:
+        if self.source.startswith(("http://", "https://")):
+            response = requests.get(self.source, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        path = self.source.removeprefix("file://")
+        return json.loads(Path(path).read_text())
+
+    def load(self) -> int:
+        """Tải JWKS và thay thế key set hiện tại. Trả về số key hợp lệ."""
+        document = self._fetch()
+        keys: dict[str, PyJWK] = {}
+        for jwk in document.get("keys", []):
+            try:
+                key = PyJWK(jwk)
+            except PyJWKError as e:
+                logger.warning(f"Bỏ qua JWK không hỗ trợ (kid={jwk.get('kid')}): {e}")
+                continue
+            keys[jwk.get("kid", "")] = key
+        if not keys:
+            raise ValueError(f"JWKS tại {self.source} không có key hợp lệ")
+        # Thay cả dict một lần để reader không thấy trạng thái dở dang
+        self._keys = keys
+        logger.info(f"Đã tải {len(keys)} key từ JWKS {self.source}")
+        return len(keys)
+
+    def get_key(self, kid: str | None) -> PyJWK | None:
+        """Lấy key theo `kid`; kid lạ sẽ kích hoạt refresh nền (key rotation)."""
+        self.refresher.maybe_refresh()
+        key = self._keys.get(kid or "")
+        if key is None:
+            self.refresher.trigger()
+        return key
+
+    @property
+    def kids(self) -> list[str]:
+        return list(self._keys)
+
+
+_jwks_store: JWKSKeyStore | None = None
+
+
+def get_jwks_source() -> str | None:
+    """URL/đường dẫn JWKS từ settings, mặc định là endpoint JWKS của Supabase."""
+    if settings.supabase_jwks_source:
+        return settings.supabase_jwks_source
+    if settings.supabase_url:
+        return f"{settings.supabase_url.rstrip('/')}/auth/v1/.well-known/jwks.json"
+    return None
+
+
+def get_jwks_store() -> JWKSKeyStore | None:
+    """Lấy JWKS store với lazy initialization."""
+    global _jwks_store
+    if _jwks_store is None:
+        source = get_jwks_source()
+        if source is None:
+            return None
+        _jwks_store = JWKSKeyStore(source, settings.jwks_refresh_interval)
+    return _jwks_store
+
+
+def uses_asymmetric_jwt() -> bool:
+    """True nếu cấu hình cho phép thuật toán ký bất đối xứng."""
+    return any(alg != "HS256" for alg in settings.jwt_algorithms)
+
+
+def preload_jwks() -> bool:
+    """Tải JWKS đồng bộ lúc khởi động (không raise nếu thất bại)."""
+    store = get_jwks_store()
+    if store is None:
+        logger.warning("❌ Thiếu SUPABASE_JWKS_SOURCE/SUPABASE_URL, bỏ qua tải JWKS")
+        return False
+    return store.refresher.run_now()
@@ -1,11 +1,16 @@
 """Middleware cho ứng dụng FastAPI."""
 
 import uuid
+from contextvars import ContextVar
 from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
 from app.core.logging import logger
 
 
+# Request ID của request đang xử lý, cho code không có `Request` (log truy vấn DB)
+request_id_ctx: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+
 class SecurityHeadersMiddleware(BaseHTTPMiddleware):
     """Thêm security headers cho tất cả responses."""
 
@@ -36,9 +41,13 @@ class RequestIDMiddleware(BaseHTTPMiddleware):
 
         # Lưu vào request state để logging
         request.state.request_id = request_id
+        token = request_id_ctx.set(request_id)
 
         # Xử lý request
-        response = await call_next(request)
+        try:
+            response = await call_next(request)
+        finally:
+            request_id_ctx.reset(token)
 
         # Thêm vào response header
         response.headers["X-Request-ID"] = request_id
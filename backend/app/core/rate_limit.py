@@ -0,0 +1,250 @@
+"""Rate limit phân tán: token bucket trong Redis, một lệnh script mỗi request.
+
+Middleware ASGI thuần (không qua BaseHTTPMiddleware) chọn rule theo prefix
+đường dẫn, xác định danh tính (user từ token, IP hoặc route) rồi gọi EVALSHA
+script token bucket; NOSCRIPT (Redis mới khởi động lại) thì gửi lại bằng EVAL.
+Redis unavailable thì dùng bucket cục bộ trong worker (xấp xỉ: mỗi worker
+có hạn mức riêng). Response kèm header `RateLimit-*` theo draft IETF.
+"""
+
+import hashlib
+import math
+import time
+from collections import OrderedDict
+
+from fastapi import status
+from redis.exceptions import NoScriptError
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.responses import JSONResponse
+
+from app.core.auth import client_identity
+from app.core.exceptions import ErrorCode
+from app.core.logging import logger
+from app.redis.client import get_async_redis_client
+
+RATE_LIMIT_KEY_PREFIX = "ratelimit:"
+LOCAL_MAX_KEYS = 10_000
+
+# KEYS[1] bucket; ARGV: dung lượng, token/ms, thời điểm hiện tại (ms)
+# Trả về {cho phép, token còn lại, ms tới khi đầy, ms tới khi có token}
+_TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+local reset = math.ceil((capacity - tokens) / rate)
+redis.call('PEXPIRE', KEYS[1], math.max(reset, 1))
+local retry = 0
+if allowed == 0 then
+    retry = math.ceil((1 - tokens) / rate)
+end
+return {allowed, math.floor(tokens), reset, retry}
+"""
+_TOKEN_BUCKET_SHA = hashlib.sha1(_TOKEN_BUCKET_SCRIPT.encode()).hexdigest()
+
+
+def parse_limit(value: str) -> tuple[int, float]:
+    """'120/60' -> (120 request, 60 giây)."""
+    try:
+        limit, period = value.split("/")
+        limit, period = int(limit), float(period)
+    except ValueError:
+        raise ValueError(f"Rate limit không hợp lệ: {value!r} (dạng '<request>/<giây>')") from None
+    if limit <= 0 or period <= 0:
+        raise ValueError(f"Rate limit không hợp lệ: {value!r}")
+    return limit, period
+
+
+class RateLimitRule:
+    """Hạn mức cho một nhóm route (theo prefix đường dẫn)."""
+
+    KEY_BY = ("user", "ip", "route")
+
+    def __init__(self, name: str, path_prefix: str, limit: str, key_by: str = "user"):
+        if key_by not in self.KEY_BY:
+            raise ValueError(f"key_by phải là một trong {self.KEY_BY}")
+        self.name = name
+        self.path_prefix = path_prefix
+        self.limit, self.period = parse_limit(limit)
+        self.key_by = key_by
+
+    def identity(self, scope) -> str:
+        """Danh tính để đếm: user id (token đã có trong token cache), không thì IP; hoặc route."""
+        if self.key_by == "route":
+            return f"route:{scope['method']}:{scope['path']}"
+        connection = HTTPConnection(scope)
+        if self.key_by == "user":
+            return client_identity(connection)
+        client = connection.client
+        return f"ip:{client.host if client else 'unknown'}"
+
+
+def _is_noscript(error: Exception) -> bool:
+    """Lỗi NOSCRIPT: Redis chưa có script trong cache (vd. vừa khởi động lại)."""
+    cause = error.__cause__ or error
+    if isinstance(cause, NoScriptError):  # RESP: redis-py bỏ tiền tố NOSCRIPT
+        return True
+    # Upstash REST trả lỗi lệnh trong body: {"error": "NOSCRIPT ..."}
+    response = getattr(cause, "response", None)
+    message = getattr(response, "text", None) or str(cause)
+    return "NOSCRIPT" in message
+
+
+class RateLimitDecision:
+    __slots__ = ("allowed", "limit", "period", "remaining", "reset", "retry_after")
+
+    def __init__(self, allowed, limit, period, remaining, reset_ms, retry_ms):
+        self.allowed = bool(allowed)
+        self.limit = limit
+        self.period = period
+        self.remaining = max(0, int(remaining))
+        self.reset = math.ceil(reset_ms / 1000)
+        self.retry_after = math.ceil(retry_ms / 1000)
+
+    def headers(self) -> dict[str, str]:
+        return {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(self.reset),
+            "RateLimit-Policy": f"{self.limit};w={self.period:g}",
+        }
+
+
+class RateLimiter:
+    """Token bucket trong Redis, bucket cục bộ khi Redis không dùng được."""
+
+    def __init__(self, local_max_keys: int = LOCAL_MAX_KEYS):
+        self.local_max_keys = local_max_keys
+        # key -> [token, thời điểm cập nhật (ms)]
+        self._local: OrderedDict[str, list[float]] = OrderedDict()
+        self._stats = {"allowed": 0, "limited": 0, "local_fallbacks": 0}
+
+    async def hit(self, key: str, limit: int, period: float) -> RateLimitDecision:
+        rate = limit / (period * 1000)  # token mỗi ms
+        now = int(time.time() * 1000)
+        try:
+            redis = await get_async_redis_client()
+            if redis is not None:
+                allowed, remaining, reset, retry = await self._eval(
+                    redis, key, limit, rate, now
+                )
+                return self._record(
+                    RateLimitDecision(allowed, limit, period, remaining, reset, retry)
+                )
+        except Exception as e:
+            logger.warning(f"Rate limit qua Redis thất bại, dùng bucket cục bộ: {e}")
+        self._stats["local_fallbacks"] += 1
+        return self._record(self._local_hit(key, limit, period, rate, now))
+
+    @staticmethod
+    async def _eval(redis, key: str, limit: int, rate: float, now: int) -> list:
+        args = (1, f"{RATE_LIMIT_KEY_PREFIX}{key}", limit, repr(rate), now)
+        try:
+            return await redis.execute("EVALSHA", _TOKEN_BUCKET_SHA, *args)
+        except Exception as e:
+            if not _is_noscript(e):
+                raise  # Redis lỗi/timeout: không gửi thêm EVAL, dùng bucket cục bộ
+            # Script chưa có trong cache của Redis: EVAL nạp lại cho các lần sau
+            return await redis.execute("EVAL", _TOKEN_BUCKET_SCRIPT, *args)
+
+    def _local_hit(
+        self, key: str, limit: int, period: float, rate: float, now: int
+    ) -> RateLimitDecision:
+        bucket = self._local.get(key)
+        if bucket is None:
+            bucket = self._local[key] = [float(limit), now]
+            if len(self._local) > self.local_max_keys:
+                self._local.popitem(last=False)
+        else:
+            self._local.move_to_end(key)
+        tokens = min(limit, bucket[0] + max(0, now - bucket[1]) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        bucket[0], bucket[1] = tokens, now
+        reset = (limit - tokens) / rate
+        retry = 0 if allowed else (1 - tokens) / rate
+        return RateLimitDecision(allowed, limit, period, tokens, reset, retry)
+
+    def _record(self, decision: RateLimitDecision) -> RateLimitDecision:
+        self._stats["allowed" if decision.allowed else "limited"] += 1
+        return decision
+
+    def stats(self) -> dict:
+        return {**self._stats, "local_keys": len(self._local)}
+
+
+rate_limiter = RateLimiter()
+
+
+class RateLimitMiddleware:
+    """Middleware ASGI áp rate limit theo rule khớp prefix dài nhất."""
+
+    def __init__(
+        self,
+        app,
+        rules: list[RateLimitRule],
+        default: RateLimitRule | None = None,
+        exempt_paths: list[str] | None = None,
+        limiter: RateLimiter | None = None,
+    ):
+        self.app = app
+        # Prefix dài hơn được ưu tiên
+        self.rules = sorted(rules, key=lambda rule: len(rule.path_prefix), reverse=True)
+        self.default = default
+        self.exempt_paths = tuple(exempt_paths or ())
+        self.limiter = limiter or rate_limiter
+
+    def _match(self, path: str) -> RateLimitRule | None:
+        if path.startswith(self.exempt_paths):
+            return None
+        for rule in self.rules:
+            if path.startswith(rule.path_prefix):
+                return rule
+        return self.default
+
+    async def __call__(self, scope, receive, send):
+        rule = self._match(scope["path"]) if scope["type"] == "http" else None
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        decision = await self.limiter.hit(
+            f"{rule.name}:{rule.identity(scope)}", rule.limit, rule.period
+        )
+        headers = decision.headers()
+        if not decision.allowed:
+            headers["Retry-After"] = str(decision.retry_after)
+            response = JSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={
+                    "status": "error",
+                    "error": {
+                        "code": ErrorCode.RATE_LIMITED,
+                        "message": "Quá nhiều request, vui lòng thử lại sau",
+                        "details": {"retry_after": decision.retry_after},
+                    },
+                },
+                headers=headers,
+            )
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                response_headers = MutableHeaders(scope=message)
+                for name, value in headers.items():
+                    response_headers.append(name, value)
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
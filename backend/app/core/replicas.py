@@ -0,0 +1,231 @@
+"""Định tuyến đọc sang read replica (tùy chọn, bật khi có `db_replica_urls`).
+
+`get_read_session` trả về session mà câu lệnh đọc chạy trên một replica khỏe
+(chọn round-robin hoặc ít kết nối nhất), còn flush và `insert/update/delete`
+chạy trên primary. Trong một request, sau khi đã ghi (qua bất kỳ session nào
+của request), mọi lần đọc tiếp theo dính vào primary để đọc được dữ liệu vừa ghi.
+
+Task nền đo độ trễ replay của từng replica; replica trễ quá `db_replica_max_lag`
+giây hoặc không kết nối được bị loại khỏi vòng quay cho tới lần kiểm tra sau.
+Không còn replica khỏe thì mọi truy vấn về primary.
+"""
+
+import asyncio
+import itertools
+from typing import AsyncGenerator
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import Session, text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.database import REQUEST_STATE_KEY, engine, engine_options
+from app.core.db_metrics import db_metrics
+from app.core.logging import logger
+
+# Giây replica chậm hơn primary; 0 khi đã replay hết WAL nhận được (primary rảnh
+# thì pg_last_xact_replay_timestamp không đổi, không được coi là trễ)
+LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    """
+)
+_PINNED = "db_primary_pinned"
+
+
+class Replica:
+    """Một replica: engine riêng, trạng thái khỏe/trễ, số kết nối đang mượn."""
+
+    def __init__(self, url: str):
+        async_url = url.replace("postgresql://", "postgresql+asyncpg://", 1)
+        parsed = make_url(async_url)
+        self.name = parsed.render_as_string(hide_password=True)
+        self.engine: AsyncEngine = create_async_engine(async_url, **engine_options())
+        db_metrics.instrument(self.engine, f"replica:{parsed.host}:{parsed.port or 5432}")
+        self.healthy = True
+        self.lag: float | None = None
+        self.in_use = 0
+        self.last_error: str | None = None
+        pool = self.engine.sync_engine.pool
+        event.listen(pool, "checkout", self._on_checkout)
+        event.listen(pool, "checkin", self._on_checkin)
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.in_use += 1
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        self.in_use = max(0, self.in_use - 1)
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "healthy": self.healthy,
+            "lag_seconds": self.lag,
+            "in_use": self.in_use,
+            "last_error": self.last_error,
+        }
+
+
+class ReplicaPool:
+    """Tập replica, chọn replica cho câu lệnh đọc và kiểm tra độ trễ định kỳ."""
+
+    STRATEGIES = ("round_robin", "least_connections")
+
+    def __init__(
+        self,
+        urls: list[str],
+        strategy: str = "round_robin",
+        max_lag: float = 1.0,
+        check_interval: float = 5.0,
+    ):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"strategy phải là một trong {self.STRATEGIES}")
+        self.replicas = [Replica(url) for url in urls]
+        self.strategy = strategy
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._counter = itertools.count()
+        self._task: asyncio.Task | None = None
+        self._stats = {"replica_statements": 0, "primary_statements": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def choose(self) -> Replica | None:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        if self.strategy == "least_connections":
+            return min(healthy, key=lambda replica: replica.in_use)
+        return healthy[next(self._counter) % len(healthy)]
+
+    async def check(self) -> None:
+        """Đo độ trễ mọi replica, cập nhật trạng thái khỏe."""
+        await asyncio.gather(*(self._check_one(replica) for replica in self.replicas))
+
+    async def _check_one(self, replica: Replica) -> None:
+        try:
+            async with replica.engine.connect() as conn:
+                lag = float((await conn.execute(LAG_QUERY)).scalar() or 0.0)
+            replica.lag, replica.last_error = lag, None
+            healthy = lag <= self.max_lag
+        except Exception as e:
+            replica.lag, replica.last_error = None, str(e)
+            healthy = False
+        if healthy != replica.healthy:
+            if healthy:
+                logger.info(f"Replica {replica.name} đã bắt kịp, đưa lại vào vòng quay")
+            else:
+                logger.warning(
+                    f"Loại replica {replica.name} khỏi vòng quay "
+                    f"(trễ {replica.lag}s, lỗi: {replica.last_error})"
+                )
+        replica.healthy = healthy
+
+    async def _run(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(self.check_interval)
+
+    def start(self) -> None:
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def record(self, target: str) -> None:
+        self._stats[f"{target}_statements"] += 1
+
+    def stats(self) -> dict:
+        return {
+            "strategy": self.strategy,
+            "max_lag_seconds": self.max_lag,
+            **self._stats,
+            "replicas": [replica.stats() for replica in self.replicas],
+        }
+
+
+replica_pool = ReplicaPool(
+    settings.db_replica_urls,
+    strategy=settings.db_replica_strategy,
+    max_lag=settings.db_replica_max_lag,
+    check_interval=settings.db_replica_check_interval,
+)
+
+
+def _pin_primary(session: Session) -> None:
+    """Đánh dấu request đã ghi: các lần đọc sau trong request dùng primary."""
+    state = session.info.get(REQUEST_STATE_KEY)
+    if state is not None:
+        setattr(state, _PINNED, True)
+
+
+def _is_pinned(session: Session) -> bool:
+    state = session.info.get(REQUEST_STATE_KEY)
+    return state is not None and getattr(state, _PINNED, False)
+
+
+class RoutingSession(Session):
+    """Session đọc: câu lệnh đọc sang replica, ghi và đọc-sau-ghi về primary."""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or getattr(clause, "is_dml", False):
+            _pin_primary(self)
+        elif not _is_pinned(self):
+            replica = replica_pool.choose()
+            if replica is not None:
+                replica_pool.record("replica")
+                return replica.engine.sync_engine
+        replica_pool.record("primary")
+        return engine.sync_engine
+
+
+@event.listens_for(Session, "after_flush")
+def _pin_after_flush(session: Session, flush_context) -> None:
+    _pin_primary(session)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _pin_after_dml(orm_execute_state) -> None:
+    state = orm_execute_state
+    if state.is_insert or state.is_update or state.is_delete:
+        _pin_primary(state.session)
+
+
+ReadSessionLocal = sessionmaker(
+    bind=engine,
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    expire_on_commit=False,
+)
+
+
+async def get_read_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency cho endpoint chủ yếu đọc (GET).
+    Không cấu hình replica thì tương đương `get_async_session`.
+    """
+    async with ReadSessionLocal() as session:
+        session.info[REQUEST_STATE_KEY] = request.state
+        try:
+            yield session
+        finally:
+            await session.close()
@@ -0,0 +1,220 @@
+"""Thu hồi JWT: danh sách revoked trong Redis + Bloom filter trong mỗi worker.
+
+- Redis (sorted set `auth:revoked`): member `jti:<id>` hoặc `sub:<user_id>`,
+  score là thời điểm thu hồi (unix time).
+- Mỗi worker giữ một Bloom filter snapshot, đồng bộ tăng dần theo chu kỳ ở thread nền.
+  Request chỉ tra Redis khi filter báo "có thể đã thu hồi".
+- Thu hồi theo `sub` chỉ áp dụng cho token phát hành trước thời điểm thu hồi.
+"""
+
+import hashlib
+import math
+import threading
+import time
+
+from app.core.background import BackgroundRefresher
+from app.core.config import settings
+from app.core.logging import logger
+from app.redis.client import get_redis_client
+
+REVOKED_KEY = "auth:revoked"
+# Lùi cursor khi đồng bộ tăng dần để không bỏ sót do lệch đồng hồ giữa các worker
+SYNC_OVERLAP_SECONDS = 30
+
+
+class BloomFilter:
+    """Bloom filter đơn giản trên bytearray, dùng double hashing từ blake2b."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self._bits
+        return all(
+            bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+
+class RevocationList:
+    """Danh sách token bị thu hồi, tra cứu qua Bloom filter rồi mới hỏi Redis."""
+
+    def __init__(
+        self,
+        capacity: int,
+        retention: int,
+        sync_interval: float,
+        full_sync_interval: float,
+    ):
+        self.capacity = capacity
+        self.retention = retention
+        self.full_sync_interval = full_sync_interval
+        self._filter: BloomFilter | None = None
+        self._cursor = 0.0
+        self._last_full_sync = 0.0
+        # Member đã xác nhận bị thu hồi -> score, tránh hỏi Redis lặp lại
+        self._confirmed: dict[str, float] = {}
+        # Dương tính giả đã xác nhận với Redis, xóa ở mỗi lần đồng bộ
+        self._false_positives: set[str] = set()
+        self._lock = threading.Lock()
+        self.refresher = BackgroundRefresher(
+            "token-revocation", self.sync, sync_interval
+        )
+        self.exact_lookups = 0
+
+    @staticmethod
+    def _jti_member(jti: str) -> str:
+        return f"jti:{jti}"
+
+    @staticmethod
+    def _sub_member(sub: str) -> str:
+        return f"sub:{sub}"
+
+    def sync(self) -> None:
+        """Đồng bộ filter từ Redis: toàn phần theo chu kỳ, còn lại tăng dần."""
+        redis = get_redis_client()
+        if redis is None:
+            raise ConnectionError("Redis unavailable")
+
+        now = time.time()
+        if self._filter is None or now - self._last_full_sync >= self.full_sync_interval:
+            redis.execute("ZREMRANGEBYSCORE", REVOKED_KEY, "-inf", now - self.retention)
+            entries = redis.execute(
+                "ZRANGEBYSCORE", REVOKED_KEY, now - self.retention, "+inf", "WITHSCORES"
+            )
+            bloom = BloomFilter(self.capacity, settings.token_revocation_error_rate)
+            cursor = self._add_entries(bloom, entries or [])
+            with self._lock:
+                self._confirmed = {
+                    member: score
+                    for member, score in self._confirmed.items()
+                    if score >= now - self.retention
+                }
+                # Giữ lại các member thu hồi cục bộ chưa kịp xuất hiện trong snapshot
+                for member in self._confirmed:
+                    bloom.add(member)
+                self._filter = bloom
+                self._false_positives = set()
+                self._cursor = max(cursor, self._cursor)
+                self._last_full_sync = now
+            logger.debug(f"Đồng bộ toàn phần revocation list: {bloom.count} entries")
+            return
+
+        entries = redis.execute(
+            "ZRANGEBYSCORE",
+            REVOKED_KEY,
+            self._cursor - SYNC_OVERLAP_SECONDS,
+            "+inf",
+            "WITHSCORES",
+        )
+        with self._lock:
+            cursor = self._add_entries(self._filter, entries or [])
+            self._false_positives = set()
+            self._cursor = max(cursor, self._cursor)
+
+    @staticmethod
+    def _add_entries(bloom: BloomFilter, entries: list) -> float:
+        """Thêm cặp [member, score, ...] vào filter, trả về score lớn nhất."""
+        cursor = 0.0
+        for member, score in zip(entries[::2], entries[1::2]):
+            bloom.add(member)
+            cursor = max(cursor, float(score))
+        return cursor
+
+    def _exact_score(self, member: str) -> float | None:
+        """Tra Redis cho member nghi ngờ; Redis lỗi thì coi như đã thu hồi (fail closed)."""
+        if member in self._confirmed:
+            return self._confirmed[member]
+        if member in self._false_positives:
+            return None
+        self.exact_lookups += 1
+        try:
+            redis = get_redis_client()
+            if redis is None:
+                raise ConnectionError("Redis unavailable")
+            score = redis.execute("ZSCORE", REVOKED_KEY, member)
+        except Exception as e:
+            logger.warning(f"Không tra được revocation cho {member}, từ chối token: {e}")
+            return math.inf
+        with self._lock:
+            if score is None:
+                # Không ghi đè một lần thu hồi cục bộ xảy ra trong lúc tra Redis
+                if member in self._confirmed:
+                    return self._confirmed[member]
+                self._false_positives.add(member)
+                return None
+            self._confirmed[member] = float(score)
+        return float(score)
+
+    def is_revoked(
+        self, sub: str, jti: str | None = None, issued_at: float | None = None
+    ) -> bool:
+        """Kiểm tra token đã bị thu hồi chưa. O(1) khi filter trả về âm tính."""
+        self.refresher.maybe_refresh()
+        candidates = self._filter
+        if candidates is None:
+            # Chưa từng đồng bộ được (Redis chưa cấu hình hoặc đang lỗi):
+            # chỉ dựa vào các thu hồi đã biết trong worker này
+            candidates = self._confirmed
+
+        if jti:
+            member = self._jti_member(jti)
+            if member in candidates and self._exact_score(member) is not None:
+                return True
+
+        member = self._sub_member(sub)
+        if member in candidates:
+            revoked_at = self._exact_score(member)
+            if revoked_at is not None and (issued_at is None or issued_at <= revoked_at):
+                return True
+        return False
+
+    def _revoke(self, member: str, revoked_at: float) -> bool:
+        with self._lock:
+            self._confirmed[member] = revoked_at
+            self._false_positives.discard(member)
+            if self._filter is not None:
+                self._filter.add(member)
+        try:
+            redis = get_redis_client()
+            if redis is None:
+                logger.warning(f"Redis unavailable, chỉ thu hồi cục bộ {member}")
+                return False
+            redis.execute("ZADD", REVOKED_KEY, revoked_at, member)
+            return True
+        except Exception as e:
+            logger.error(f"Lỗi ghi revocation {member}: {e}")
+            return False
+
+    def revoke_token(self, jti: str) -> bool:
+        """Thu hồi một token (hoặc session) theo jti."""
+        return self._revoke(self._jti_member(jti), time.time())
+
+    def revoke_subject(self, sub: str) -> bool:
+        """Thu hồi mọi token của user đã phát hành trước thời điểm này."""
+        return self._revoke(self._sub_member(sub), time.time())
+
+
+# Instance toàn cục (mỗi worker một filter)
+revocation_list = RevocationList(
+    capacity=settings.token_revocation_capacity,
+    retention=settings.token_revocation_retention,
+    sync_interval=settings.token_revocation_sync_interval,
+    full_sync_interval=settings.token_revocation_full_sync_interval,
+)
@@ -0,0 +1,130 @@
+"""Role version theo user: thay đổi role có hiệu lực ngay mà không cần query DB mỗi request.
+
+- Redis: `role_version:<user_id>` (INCR mỗi lần đổi role) và sorted set
+  `role_version:changed` (user_id, score = thời điểm đổi) làm change feed.
+- Mỗi worker giữ map user_id -> version, làm mới theo lô ở thread nền:
+  chỉ MGET các user đang theo dõi có trong change feed hoặc mới gặp lần đầu.
+- Auth so sánh version đã stamp trên CurrentUser với map (O(1)); chỉ khi khác
+  mới đọc lại roles từ DB. User chưa biết version (mới gặp, bị đẩy khỏi LRU,
+  Redis lỗi) trả về None: luôn đọc roles từ DB cho tới khi đồng bộ xong, không
+  tin roles trong JWT.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from app.core.background import BackgroundRefresher
+from app.core.config import settings
+from app.core.logging import logger
+from app.redis.client import get_redis_client
+
+VERSION_KEY_PREFIX = "role_version:"
+CHANGED_KEY = "role_version:changed"
+# Lùi cursor khi đọc change feed để bù lệch đồng hồ giữa các worker
+SYNC_OVERLAP_SECONDS = 30
+MGET_BATCH_SIZE = 200
+
+
+def _version_key(user_id: str) -> str:
+    return f"{VERSION_KEY_PREFIX}{user_id}"
+
+
+class RoleVersionMap:
+    """Map user_id -> role version trong process, đồng bộ theo lô từ Redis."""
+
+    def __init__(self, max_size: int, retention: int, sync_interval: float):
+        self.max_size = max_size
+        self.retention = retention
+        # None: đang chờ đồng bộ version từ Redis
+        self._versions: OrderedDict[str, int | None] = OrderedDict()
+        # User mới gặp, cần đọc version ở lần đồng bộ tới
+        self._pending: set[str] = set()
+        self._cursor = time.time()
+        self._lock = threading.Lock()
+        self.refresher = BackgroundRefresher("role-version", self.sync, sync_interval)
+
+    def current(self, user_id: str) -> int | None:
+        """Version hiện biết của user (0 nếu chưa từng đổi role, None nếu chưa biết)."""
+        self.refresher.maybe_refresh()
+        with self._lock:
+            if user_id not in self._versions:
+                self._track(user_id, None)
+                self._pending.add(user_id)
+                return None
+            self._versions.move_to_end(user_id)
+            return self._versions[user_id]
+
+    def _track(self, user_id: str, version: int | None) -> None:
+        self._versions[user_id] = version
+        self._versions.move_to_end(user_id)
+        while len(self._versions) > self.max_size:
+            evicted, _ = self._versions.popitem(last=False)
+            self._pending.discard(evicted)
+
+    def sync(self) -> None:
+        """Đọc change feed từ cursor rồi MGET version cho các user liên quan."""
+        redis = get_redis_client()
+        if redis is None:
+            raise ConnectionError("Redis unavailable")
+
+        now = time.time()
+        entries = redis.execute(
+            "ZRANGEBYSCORE",
+            CHANGED_KEY,
+            self._cursor - SYNC_OVERLAP_SECONDS,
+            "+inf",
+            "WITHSCORES",
+        ) or []
+        changed = set(entries[::2])
+        cursor = max([float(score) for score in entries[1::2]], default=self._cursor)
+
+        with self._lock:
+            user_ids = [
+                user_id
+                for user_id in self._pending | changed
+                if user_id in self._versions
+            ]
+            self._pending.clear()
+
+        for start in range(0, len(user_ids), MGET_BATCH_SIZE):
+            batch = user_ids[start : start + MGET_BATCH_SIZE]
+            values = redis.execute("MGET", *[_version_key(u) for u in batch]) or []
+            with self._lock:
+                for user_id, value in zip(batch, values):
+                    if user_id in self._versions:
+                        self._versions[user_id] = int(value or 0)
+
+        self._cursor = max(cursor, self._cursor)
+        if entries:
+            redis.execute("ZREMRANGEBYSCORE", CHANGED_KEY, "-inf", now - self.retention)
+
+    def bump(self, user_id: str) -> int | None:
+        """Tăng role version của user sau khi đổi role. Trả về version mới."""
+        user_id = str(user_id)
+        try:
+            redis = get_redis_client()
+            if redis is None:
+                raise ConnectionError("Redis unavailable")
+            version = int(redis.execute("INCR", _version_key(user_id)))
+            redis.execute("ZADD", CHANGED_KEY, time.time(), user_id)
+        except Exception as e:
+            # Không có Redis: chỉ worker hiện tại thấy thay đổi
+            logger.error(f"Lỗi tăng role version cho {user_id}: {e}")
+            with self._lock:
+                version = (self._versions.get(user_id) or 0) + 1
+                self._track(user_id, version)
+            return None
+
+        with self._lock:
+            self._track(user_id, version)
+            self._pending.discard(user_id)
+        return version
+
+
+# Instance toàn cục (mỗi worker một map)
+role_versions = RoleVersionMap(
+    max_size=settings.role_version_cache_size,
+    retention=settings.token_revocation_retention,
+    sync_interval=settings.role_version_sync_interval,
+)
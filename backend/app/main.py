@@ -1,5 +1,6 @@
 """Main FastAPI application."""
 
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
@@ -9,7 +10,13 @@ from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from app.core.config import settings
 from app.core.logging import setup_logging, logger
 from app.core.database import init_db, close_db
-from app.redis.client import close_redis
+from app.core.db_listener import PgNotifyListener
+from app.core.replicas import replica_pool
+from app.core.jwks import preload_jwks, uses_asymmetric_jwt
+from app.redis.client import close_async_redis, close_redis
+from app.redis.helpers import invalidation_queue
+from app.modules.user.user_warmup import start_warmup, stop_warmup
+from app.modules.user.user_service import invalidate_changed_users
 from app.core.exceptions import (
     zenspa_exception_handler,
     validation_exception_handler,
@@ -17,13 +24,27 @@ from app.core.exceptions import (
     ZenSpaException,
 )
 from app.core.middleware import SecurityHeadersMiddleware, RequestIDMiddleware
+from app.core.rate_limit import RateLimitMiddleware, RateLimitRule
+from app.core.idempotency import IdempotencyMiddleware
 from app.api.api_v1 import api_v1_router
 from app.api.health import router as health_router
 
 
+CACHE_INVALIDATION_CHANNEL = "cache_invalidation"
+
+db_listener: PgNotifyListener | None = None
+
+
+def _listen_dsn() -> str:
+    """DSN cho asyncpg: bỏ tên driver SQLAlchemy khỏi URL."""
+    url = settings.db_listen_url or settings.database_url
+    return url.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Quản lý vòng đời ứng dụng."""
+    global db_listener
     # Khởi động
     try:
         # Thiết lập logging trước
@@ -32,6 +53,35 @@ async def lifespan(app: FastAPI):
         # Khởi tạo database
         await init_db()
 
+        # Tải JWKS trước để request đầu tiên không phải chờ
+        if uses_asymmetric_jwt():
+            await asyncio.to_thread(preload_jwks)
+
+        # Đo độ trễ read replica nền (khi có cấu hình replica)
+        replica_pool.start()
+
+        # Nhận NOTIFY từ trigger DB để invalidation cache hồ sơ
+        if (
+            settings.db_listen_enabled
+            and settings.db_pool_mode == "transaction"
+            and not settings.db_listen_url
+        ):
+            logger.warning(
+                "Bỏ qua LISTEN/NOTIFY: transaction pooler không giữ LISTEN, cần DB_LISTEN_URL"
+            )
+        elif settings.db_listen_enabled:
+            db_listener = PgNotifyListener(
+                _listen_dsn(),
+                CACHE_INVALIDATION_CHANNEL,
+                invalidate_changed_users,
+                batch_interval=settings.db_listen_batch_interval,
+            )
+            db_listener.start()
+
+        # Warmup cache chạy nền, không chặn khởi động
+        if settings.cache_warmup_on_startup:
+            await start_warmup()
+
         logger.info("✅ Ứng dụng khởi động thành công")
     except Exception as e:
         logger.error(f"❌ Ứng dụng khởi động thất bại: {e}")
@@ -41,11 +91,23 @@ async def lifespan(app: FastAPI):
 
     # Tắt máy
     try:
-        # Đóng kết nối database
+        # Dừng warmup trước khi đóng pool DB
+        await stop_warmup()
+
+        # Dừng listener (xử lý nốt NOTIFY đã nhận) trước khi drain hàng đợi invalidation
+        if db_listener is not None:
+            await db_listener.stop()
+
+        # Đóng kết nối database (replica rồi primary)
+        await replica_pool.stop()
         await close_db()
 
+        # Xóa nốt các key cache đang chờ invalidation trước khi đóng Redis
+        await invalidation_queue.drain(settings.cache_invalidation_drain_timeout)
+
         # Đóng kết nối Redis
         close_redis()
+        await close_async_redis()
 
         logger.info("✅ Ứng dụng tắt thành công")
     except Exception as e:
@@ -62,6 +124,26 @@ app = FastAPI(
 )
 
 # Thêm middleware theo thứ tự đúng
+# Idempotency và rate limit trong cùng: response của chúng vẫn có security headers,
+# request ID và CORS; request lặp lại vẫn bị tính vào rate limit
+if settings.idempotency_enabled:
+    app.add_middleware(
+        IdempotencyMiddleware,
+        paths=settings.idempotency_paths,
+        ttl=settings.idempotency_ttl,
+        lock_timeout=settings.idempotency_lock_timeout,
+        max_body_bytes=settings.idempotency_max_body_bytes,
+    )
+if settings.rate_limit_enabled:
+    app.add_middleware(
+        RateLimitMiddleware,
+        rules=[
+            RateLimitRule("admin", "/api/v1/admin", settings.rate_limit_admin),
+            RateLimitRule("users", "/api/v1/users", settings.rate_limit_users),
+        ],
+        default=RateLimitRule("default", "/", settings.rate_limit_default, key_by="ip"),
+        exempt_paths=settings.rate_limit_exempt_paths,
+    )
 app.add_middleware(SecurityHeadersMiddleware)
 app.add_middleware(RequestIDMiddleware)
 
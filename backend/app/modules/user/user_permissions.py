@@ -0,0 +1,174 @@
+"""RBAC: ma trận quyền khai báo, biên dịch thành bitmask lúc khởi động."""
+
+from enum import Enum
+from typing import Iterable, Mapping
+
+from uuid import UUID
+
+from fastapi import Depends, HTTPException, status
+from fastapi.routing import APIRoute
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.auth import CurrentUser, get_current_user
+from app.core.database import get_async_session
+from app.core.role_version import role_versions
+from .user_models import RoleEnum
+from .user_service import get_role_names
+
+
+class Permission(str, Enum):
+    """Các quyền trong hệ thống (resource:action[:scope])."""
+
+    PROFILE_READ_OWN = "profile:read:own"
+    PROFILE_UPDATE_OWN = "profile:update:own"
+    USER_ROLE_ASSIGN = "user:role:assign"
+    USER_SESSION_REVOKE = "user:session:revoke"
+    STAFF_INVITE = "staff:invite"
+    METRICS_READ = "metrics:read"
+    CACHE_WARMUP = "cache:warmup"
+
+
+# Ma trận quyền theo role — nguồn sự thật duy nhất cho phân quyền
+PERMISSION_MATRIX: dict[RoleEnum, set[Permission]] = {
+    RoleEnum.CUSTOMER: {
+        Permission.PROFILE_READ_OWN,
+        Permission.PROFILE_UPDATE_OWN,
+    },
+    RoleEnum.RECEPTIONIST: {
+        Permission.PROFILE_READ_OWN,
+        Permission.PROFILE_UPDATE_OWN,
+    },
+    RoleEnum.TECHNICIAN: {
+        Permission.PROFILE_READ_OWN,
+        Permission.PROFILE_UPDATE_OWN,
+    },
+    RoleEnum.ADMIN: set(Permission),
+}
+
+
+class PermissionPolicy:
+    """Ma trận quyền đã biên dịch: mỗi permission một bit, mỗi role một mask."""
+
+    def __init__(
+        self,
+        matrix: Mapping[str, Iterable[Permission]],
+        permissions: Iterable[Permission] = Permission,
+    ):
+        self.bits: dict[Permission, int] = {
+            permission: 1 << index for index, permission in enumerate(permissions)
+        }
+        self.role_masks: dict[str, int] = {
+            str(getattr(role, "value", role)): self.mask_of(granted)
+            for role, granted in matrix.items()
+        }
+
+    def mask_of(self, permissions: Iterable[Permission]) -> int:
+        mask = 0
+        for permission in permissions:
+            mask |= self.bits[permission]
+        return mask
+
+    def mask_for_roles(self, roles: Iterable[str]) -> int:
+        """OR mask của các role; role không có trong ma trận không có quyền nào."""
+        mask = 0
+        for role in roles:
+            mask |= self.role_masks.get(role, 0)
+        return mask
+
+    def user_mask(self, user: CurrentUser) -> int:
+        """Mask của user, tính một lần rồi giữ trên CurrentUser (đã được token cache)."""
+        mask = user.permission_mask
+        if mask is None:
+            mask = user.permission_mask = self.mask_for_roles(user.roles)
+        return mask
+
+    def has(self, user: CurrentUser, required_mask: int) -> bool:
+        return self.user_mask(user) & required_mask == required_mask
+
+    def refresh_roles(
+        self, user: CurrentUser, roles: list[str], version: int | None
+    ) -> None:
+        """Cập nhật roles (lấy từ DB) cho user đã cache và stamp version mới."""
+        mask = self.mask_for_roles(roles)
+        user.roles = roles
+        user.permission_mask = mask
+        user.role_version = version
+
+
+async def ensure_current_roles(user: CurrentUser, session: AsyncSession) -> None:
+    """Đọc lại roles từ DB nếu role version của user đã thay đổi sau khi stamp.
+
+    Version chưa biết (None) không bao giờ khớp: roles trong JWT có thể đã cũ.
+    """
+    version = role_versions.current(user.id)
+    if version is not None and user.role_version == version:
+        return
+    roles = await get_role_names(session, UUID(user.id))
+    policy.refresh_roles(user, roles, version)
+
+
+# Biên dịch một lần khi import (lúc khởi động ứng dụng)
+policy = PermissionPolicy(PERMISSION_MATRIX)
+
+_dependency_cache: dict[frozenset[Permission], object] = {}
+
+
+def require(*permissions: Permission):
+    """Dependency yêu cầu user có đủ các quyền.
+
+    Mask cần thiết được tính sẵn khi khai báo route; mỗi request chỉ còn một phép AND
+    (cộng một lần so sánh role version, chỉ query DB khi version đổi).
+    Cùng tập quyền trả về cùng một dependency để FastAPI dùng lại kết quả trong request.
+    """
+    cache_key = frozenset(permissions)
+    dependency = _dependency_cache.get(cache_key)
+    if dependency is not None:
+        return dependency
+
+    required_mask = policy.mask_of(permissions)
+
+    async def permission_dependency(
+        current_user: CurrentUser = Depends(get_current_user),
+        session: AsyncSession = Depends(get_async_session),
+    ) -> CurrentUser:
+        await ensure_current_roles(current_user, session)
+        if not policy.has(current_user, required_mask):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Không có quyền thực hiện thao tác này",
+            )
+        return current_user
+
+    permission_dependency.required_permissions = cache_key
+    permission_dependency.required_mask = required_mask
+    _dependency_cache[cache_key] = permission_dependency
+    return permission_dependency
+
+
+def _route_permissions(dependant) -> frozenset[Permission]:
+    """Các quyền mà route yêu cầu, gom từ dependency require() (kể cả lồng nhau)."""
+    permissions: set[Permission] = set()
+    for sub in dependant.dependencies:
+        permissions |= getattr(sub.call, "required_permissions", frozenset())
+        permissions |= _route_permissions(sub)
+    return frozenset(permissions)
+
+
+def annotate_route_permissions(routes: Iterable) -> None:
+    """Gắn quyền và mask vào từng route của router (gọi sau khi khai báo route).
+
+    Dependency của require() dùng chung giữa các route nên không mang thông tin
+    route; ở đây mỗi APIRoute có `required_mask` riêng và OpenAPI có `x-permissions`.
+    Gọi trước include_router để route được include mang theo openapi_extra.
+    """
+    for route in routes:
+        if not isinstance(route, APIRoute):
+            continue
+        permissions = _route_permissions(route.dependant)
+        if not permissions:
+            continue
+        route.required_mask = policy.mask_of(permissions)
+        route.openapi_extra = {
+            **(route.openapi_extra or {}),
+            "x-permissions": sorted(permission.value for permission in permissions),
+        }
@@ -1,13 +1,15 @@
 """Routes API cho user - Consolidated từ admin và customer routes."""
 
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.core.auth import get_current_user
+from app.core.auth import CurrentUser, get_current_user
 from app.core.database import get_async_session
-from .user_models import Profile, Role, RoleEnum, UserRoleLink
+from app.core.replicas import get_read_session
+from .user_models import Profile, Role, UserRoleLink
+from .user_permissions import Permission, annotate_route_permissions, require
 from .user_schemas import (
     ProfileResponse,
     ProfileUpdate,
@@ -16,56 +18,42 @@ from .user_schemas import (
 )
 from .user_service import (
     get_profile_by_id,
-    create_profile,
+    ensure_profile_with_roles,
     update_profile,
     get_profile_with_roles,
     update_user_role_service,
+    revoke_user_sessions_service,
     invite_staff_service,
 )
+from .user_warmup import WARMUP_MAX_PROFILES, get_warmup_status, start_warmup
 
 router = APIRouter()
 admin_router = APIRouter()
 
 
-# Dependency để check quyền admin
-async def require_admin(
-    current_user: dict = Depends(get_current_user),
-):
-    """Dependency yêu cầu user phải có role admin."""
-    # Check role từ JWT claims (đã được inject vào current_user)
-    roles = current_user.get("roles", [])
-
-    if RoleEnum.ADMIN.value not in roles:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Yêu cầu quyền admin",
-        )
-    return current_user
-
-
 @router.get("/me", response_model=ProfileResponse)
 async def get_user_profile(
-    current_user: dict = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
+    read_session: AsyncSession = Depends(get_read_session),
     session: AsyncSession = Depends(get_async_session),
 ) -> ProfileResponse:
-    """Lấy profile của người dùng hiện tại."""
+    """Lấy profile của người dùng hiện tại (đọc qua replica nếu có).
+
+    Chưa có profile thì kiểm tra lại và tạo lazy trên primary; session primary chỉ
+    mượn kết nối khi thực sự dùng tới.
+    """
     user_id = current_user["id"]
     email = current_user.get("email")  # Lấy email từ JWT
 
-    profile_data = await get_profile_with_roles(session, user_id, email)
+    profile_data = await get_profile_with_roles(read_session, user_id, email)
 
     if not profile_data:
-        # Tạo lazy nếu chưa tồn tại
-        profile = await create_profile(
+        profile_data = await ensure_profile_with_roles(
             session,
-            {
-                "id": user_id,
-                "email": email,  # Truyền email để service xử lý (nhưng không lưu vào DB)
-                "full_name": current_user.get("user_metadata", {}).get("full_name"),
-            },
+            user_id,
+            email,
+            current_user.get("user_metadata", {}).get("full_name"),
         )
-        # Lấy lại thông tin đầy đủ sau khi tạo
-        profile_data = await get_profile_with_roles(session, user_id, email)
 
     return ProfileResponse(**profile_data)
 
@@ -73,7 +61,7 @@ async def get_user_profile(
 @router.put("/me", response_model=ProfileResponse)
 async def update_user_profile(
     update_data: ProfileUpdate,
-    current_user: dict = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
     session: AsyncSession = Depends(get_async_session),
 ) -> ProfileResponse:
     """Cập nhật profile của người dùng hiện tại."""
@@ -96,7 +84,7 @@ async def update_user_profile(
 # Admin endpoints
 @admin_router.put(
     "/users/{user_id}/role",
-    dependencies=[Depends(require_admin)],
+    dependencies=[Depends(require(Permission.USER_ROLE_ASSIGN))],
     tags=["Admin"],
 )
 async def update_user_role(
@@ -116,9 +104,20 @@ async def update_user_role(
     return {"message": message}
 
 
+@admin_router.post(
+    "/users/{user_id}/revoke-sessions",
+    dependencies=[Depends(require(Permission.USER_SESSION_REVOKE))],
+    tags=["Admin"],
+)
+async def revoke_user_sessions(user_id: UUID):
+    """Thu hồi mọi token hiện có của user (chỉ admin)."""
+    message = await revoke_user_sessions_service(user_id)
+    return {"message": message}
+
+
 @admin_router.post(
     "/invite-staff",
-    dependencies=[Depends(require_admin)],
+    dependencies=[Depends(require(Permission.STAFF_INVITE))],
     tags=["Admin"],
 )
 async def invite_staff(
@@ -128,3 +127,36 @@ async def invite_staff(
     """Mời nhân viên mới qua email và gán vai trò (chỉ admin)."""
     message = await invite_staff_service(request.email, request.role, session)
     return {"message": message}
+
+
+@admin_router.post(
+    "/cache/warmup",
+    dependencies=[Depends(require(Permission.CACHE_WARMUP))],
+    status_code=status.HTTP_202_ACCEPTED,
+    tags=["Admin"],
+)
+async def start_cache_warmup(
+    limit: int | None = Query(None, ge=1, le=WARMUP_MAX_PROFILES),
+):
+    """Chạy warmup cache nền: roles và `limit` profile cập nhật gần nhất (chỉ admin)."""
+    if not await start_warmup(limit=limit):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Warmup cache đang chạy",
+        )
+    return await get_warmup_status()
+
+
+@admin_router.get(
+    "/cache/warmup",
+    dependencies=[Depends(require(Permission.CACHE_WARMUP))],
+    tags=["Admin"],
+)
+async def get_cache_warmup_status():
+    """Tiến độ lần warmup cache gần nhất trên mọi worker (chỉ admin)."""
+    return await get_warmup_status()
+
+
+# Gắn quyền yêu cầu (mask, x-permissions trong OpenAPI) vào từng route
+annotate_route_permissions(router.routes)
+annotate_route_permissions(admin_router.routes)
@@ -1,5 +1,6 @@
 """Dịch vụ user (Async)."""
 
+import asyncio
 from datetime import datetime, timezone
 from uuid import UUID
 from fastapi import HTTPException, status
@@ -9,11 +10,26 @@ from supabase.client import Client, create_client
 
 from app.core.config import settings
 from app.core.logging import logger
-from app.redis.helpers import cache_delete, cache_get, cache_set
+from app.core.replicas import replica_pool
+from app.core.revocation import revocation_list
+from app.core.role_version import role_versions
+from app.redis.helpers import (
+    async_cache_invalidate,
+    async_cache_get_many,
+    async_cache_set_many,
+    get_or_load,
+    unwrap_loaded,
+)
+from . import user_statements as statements
 from .user_models import Profile, Role, RoleEnum, UserRoleLink
 
 # Thời gian sống cho cache hồ sơ người dùng (1 giờ)
 USER_CACHE_TTL = 3600
+# Tombstone cho user chưa có profile (profile được tạo lazy ở lần gọi /me đầu tiên)
+USER_NEGATIVE_CACHE_TTL = 60
+# Danh sách role ít thay đổi: cache lâu, xóa khi có role mới
+ROLES_CACHE_KEY = "roles:all"
+ROLES_CACHE_TTL = 24 * 3600
 
 # Supabase admin client
 supabase_admin: Client = create_client(
@@ -21,15 +37,47 @@ supabase_admin: Client = create_client(
 )
 
 
-def _generate_user_cache_key(user_id: UUID) -> str:
+def generate_user_cache_key(user_id: UUID) -> str:
     """Tạo khóa cache chuẩn cho hồ sơ người dùng."""
     return f"user_profile:{user_id}"
 
 
+def _invalidate_profile_cache(*cache_keys: str) -> None:
+    """Xóa cache hồ sơ; có read replica thì xóa lại sau độ trễ tối đa cho phép.
+
+    Request đọc qua replica chưa nhận thay đổi có thể nạp lại bản cũ vào cache
+    ngay sau lần xóa đầu, lần xóa thứ hai loại bỏ bản đó.
+    """
+    async_cache_invalidate(*cache_keys)
+    if replica_pool.enabled:
+        asyncio.get_running_loop().call_later(
+            settings.db_replica_max_lag, async_cache_invalidate, *cache_keys
+        )
+
+
+async def load_roles(session: AsyncSession) -> list[dict]:
+    """Đọc toàn bộ bảng roles (dữ liệu tham chiếu, vài dòng)."""
+    result = (await session.exec(statements.all_roles())).scalars()
+    return [
+        {"id": role.id, "name": role.name, "description": role.description}
+        for role in result.all()
+    ]
+
+
 async def get_role_by_name(session: AsyncSession, role_name: str) -> Role:
-    """Lấy role object từ DB theo tên."""
-    result = await session.exec(select(Role).where(Role.name == role_name))
-    role = result.first()
+    """Lấy role theo tên, ưu tiên danh sách role đã cache.
+
+    Role lấy từ cache là object detached (chưa gắn session), caller chỉ dùng `id`.
+    """
+    roles = await get_or_load(
+        ROLES_CACHE_KEY, lambda: load_roles(session), ttl=ROLES_CACHE_TTL
+    )
+    for role_data in roles or []:
+        if role_data["name"] == role_name:
+            return Role(**role_data)
+
+    result = await session.exec(statements.role_by_name(role_name))
+    role = result.scalars().first()
     if not role:
         # Nếu chưa có role trong DB (lần đầu chạy), tạo mới
         # Đây là cơ chế seed data đơn giản
@@ -37,54 +85,20 @@ async def get_role_by_name(session: AsyncSession, role_name: str) -> Role:
         session.add(role)
         await session.commit()
         await session.refresh(role)
+    # Danh sách role trong cache đã cũ
+    async_cache_invalidate(ROLES_CACHE_KEY)
     return role
 
 
 async def get_profile_by_id(session: AsyncSession, user_id: UUID) -> Profile | None:
     """Lấy profile theo ID người dùng."""
-    result = await session.exec(select(Profile).where(Profile.id == user_id))
-    return result.first()
+    result = await session.exec(statements.profile_by_id(user_id))
+    return result.scalars().first()
 
 
-async def get_profile_with_roles(
-    session: AsyncSession, user_id: UUID, email: str | None = None
-) -> dict | None:
-    """
-    Lấy profile với list roles, ưu tiên từ cache.
-    Áp dụng Cache-Aside Pattern.
-    """
-    cache_key = _generate_user_cache_key(user_id)
-
-    # 1. Thử đọc từ cache
-    cached_profile = cache_get(cache_key)
-    if cached_profile and isinstance(cached_profile, dict):
-        logger.debug(f"Cache hit cho hồ sơ người dùng: {cache_key}")
-        # Nếu email được truyền vào và khác cache, update cache (optional)
-        if email and cached_profile.get("email") != email:
-            cached_profile["email"] = email
-        return cached_profile
-
-    logger.debug(f"Cache miss: {cache_key}. Truy vấn database...")
-
-    # 2. Không có trong cache, truy vấn database
-    profile = await get_profile_by_id(session, user_id)
-    if not profile:
-        return None
-
-    # Lấy roles qua bảng liên kết và bảng roles
-    # Join UserRoleLink với Role để lấy tên role
-    statement = (
-        select(Role.name)
-        .join(UserRoleLink, UserRoleLink.role_id == Role.id)
-        .where(UserRoleLink.user_id == user_id)
-    )
-    roles_result = await session.exec(statement)
-    roles = roles_result.all()
-
-    if not roles:
-        roles = [RoleEnum.CUSTOMER.value]
-
-    profile_data = {
+def _build_profile_data(profile: Profile, roles: list[str], email: str | None) -> dict:
+    """Dữ liệu profile dạng dict để cache và trả về client."""
+    return {
         "id": profile.id,
         "email": email,  # Email lấy từ tham số (JWT/Auth), không phải từ DB profile
         "full_name": profile.full_name,
@@ -96,13 +110,106 @@ async def get_profile_with_roles(
         "updated_at": profile.updated_at.isoformat(),
     }
 
-    # 3. Lưu vào cache trước khi trả về
-    cache_set(cache_key, profile_data, ttl=USER_CACHE_TTL)
-    logger.info(f"Đã lưu hồ sơ người dùng {user_id} vào cache.")
 
+async def get_role_names(session: AsyncSession, user_id: UUID) -> list[str]:
+    """Lấy danh sách tên role của user từ DB (mặc định là customer)."""
+    # Join UserRoleLink với Role để lấy tên role
+    roles_result = await session.exec(statements.role_names_of_user(user_id))
+    roles = list(roles_result.scalars().all())
+    return roles or [RoleEnum.CUSTOMER.value]
+
+
+async def get_profile_with_roles(
+    session: AsyncSession, user_id: UUID, email: str | None = None
+) -> dict | None:
+    """
+    Lấy profile với list roles, ưu tiên từ cache.
+    Áp dụng Cache-Aside Pattern qua `get_or_load`: request đồng thời dùng chung
+    một lần truy vấn, user chưa có profile được cache tombstone ngắn hạn.
+    """
+    cache_key = generate_user_cache_key(user_id)
+
+    async def load() -> dict | None:
+        logger.debug(f"Cache miss: {cache_key}. Truy vấn database...")
+        profile = await get_profile_by_id(session, user_id)
+        if not profile:
+            return None
+        roles = await get_role_names(session, user_id)
+        return _build_profile_data(profile, roles, email)
+
+    profile_data = await get_or_load(
+        cache_key,
+        load,
+        ttl=USER_CACHE_TTL,
+        negative_ttl=USER_NEGATIVE_CACHE_TTL,
+        lock=True,
+    )
+    if not isinstance(profile_data, dict):
+        return None
+
+    # Email lấy từ JWT hiện tại nếu khác bản đã cache
+    if email and profile_data.get("email") != email:
+        profile_data = {**profile_data, "email": email}
     return profile_data
 
 
+async def load_profiles_with_roles(
+    session: AsyncSession, user_ids: list[UUID]
+) -> dict[UUID, dict]:
+    """Đọc nhiều profile kèm roles từ DB bằng hai query (không qua cache)."""
+    if not user_ids:
+        return {}
+    profiles_result = await session.exec(select(Profile).where(Profile.id.in_(user_ids)))
+    profiles = profiles_result.all()
+
+    roles_by_user: dict[UUID, list[str]] = {}
+    roles_result = await session.exec(
+        select(UserRoleLink.user_id, Role.name)
+        .join(Role, UserRoleLink.role_id == Role.id)
+        .where(UserRoleLink.user_id.in_(user_ids))
+    )
+    for user_id, role_name in roles_result.all():
+        roles_by_user.setdefault(user_id, []).append(role_name)
+
+    return {
+        profile.id: _build_profile_data(
+            profile,
+            roles_by_user.get(profile.id) or [RoleEnum.CUSTOMER.value],
+            None,
+        )
+        for profile in profiles
+    }
+
+
+async def get_profiles_with_roles(
+    session: AsyncSession, user_ids: list[UUID]
+) -> dict[UUID, dict]:
+    """
+    Lấy nhiều profile kèm roles (màn hình danh sách admin).
+    Một MGET cho cache, hai query cho các key miss, một pipeline để ghi lại cache.
+    """
+    cache_keys = {generate_user_cache_key(user_id): user_id for user_id in user_ids}
+    cached = await async_cache_get_many(list(cache_keys))
+
+    result: dict[UUID, dict] = {}
+    missing: list[UUID] = []
+    for cache_key, user_id in cache_keys.items():
+        value = unwrap_loaded(cached.get(cache_key))
+        if isinstance(value, dict):
+            result[user_id] = value
+        else:
+            missing.append(user_id)
+
+    loaded = await load_profiles_with_roles(session, missing)
+    if loaded:
+        await async_cache_set_many(
+            {generate_user_cache_key(user_id): data for user_id, data in loaded.items()},
+            ttl=USER_CACHE_TTL,
+        )
+    result.update(loaded)
+    return result
+
+
 async def create_profile(session: AsyncSession, profile_data: dict) -> Profile:
     """Tạo profile mới và gán role mặc định."""
     # Tách email ra khỏi profile_data nếu có (vì model không còn cột email)
@@ -121,9 +228,34 @@ async def create_profile(session: AsyncSession, profile_data: dict) -> Profile:
 
     await session.commit()
     await session.refresh(profile)
+
+    # Bỏ tombstone "chưa có profile" nếu đã được cache
+    _invalidate_profile_cache(generate_user_cache_key(profile.id))
     return profile
 
 
+async def ensure_profile_with_roles(
+    session: AsyncSession, user_id: UUID, email: str | None, full_name: str | None
+) -> dict | None:
+    """
+    Xử lý khi đọc (qua replica) không thấy profile: kiểm tra lại trên primary
+    (`session` ghi) và chỉ tạo profile lazy khi primary cũng chưa có.
+    Profile đã có trên primary (replica trễ) thì bỏ tombstone vừa bị cache.
+    """
+    if await get_profile_by_id(session, user_id) is None:
+        await create_profile(
+            session,
+            {
+                "id": user_id,
+                "email": email,  # Truyền email để service xử lý (nhưng không lưu vào DB)
+                "full_name": full_name,
+            },
+        )
+    else:
+        _invalidate_profile_cache(generate_user_cache_key(user_id))
+    return await get_profile_with_roles(session, user_id, email)
+
+
 async def update_profile(
     session: AsyncSession, profile: Profile, update_data: dict
 ) -> Profile:
@@ -137,10 +269,10 @@ async def update_profile(
     await session.commit()
     await session.refresh(profile)
 
-    # Vô hiệu hóa cache sau khi cập nhật DB
-    cache_key = _generate_user_cache_key(profile.id)
-    if cache_delete(cache_key):
-        logger.info(f"Đã vô hiệu hóa cache cho hồ sơ: {cache_key}")
+    # Vô hiệu hóa cache sau khi cập nhật DB (xóa ở Redis chạy nền, có thử lại)
+    cache_key = generate_user_cache_key(profile.id)
+    _invalidate_profile_cache(cache_key)
+    logger.info(f"Đã vô hiệu hóa cache cho hồ sơ: {cache_key}")
 
     return profile
 
@@ -190,13 +322,48 @@ async def update_user_role_service(
     await session.commit()
 
     # Vô hiệu hóa cache sau khi cập nhật role
-    cache_key = _generate_user_cache_key(user_id)
-    if cache_delete(cache_key):
-        logger.info(f"Đã vô hiệu hóa cache cho hồ sơ do thay đổi role: {cache_key}")
+    cache_key = generate_user_cache_key(user_id)
+    _invalidate_profile_cache(cache_key)
+    logger.info(f"Đã vô hiệu hóa cache cho hồ sơ do thay đổi role: {cache_key}")
+
+    # Tăng role version để quyền mới có hiệu lực ngay, không cần chờ token refresh
+    await asyncio.to_thread(role_versions.bump, user_id)
 
     return f"Đã gán role '{new_role_enum.value}' cho user {user_id}"
 
 
+async def invalidate_changed_users(payloads: set[str]) -> None:
+    """Xử lý lô NOTIFY `<bảng>:<user id>` từ trigger trên profiles/user_role_links.
+
+    Gồm cả thay đổi do chính API ghi (đã invalidation rồi): xóa thêm lần nữa vô hại.
+    """
+    cache_keys: set[str] = set()
+    role_changes: set[UUID] = set()
+    for payload in payloads:
+        table, _, raw_id = payload.partition(":")
+        try:
+            user_id = UUID(raw_id)
+        except ValueError:
+            logger.warning(f"Bỏ qua NOTIFY không hợp lệ: {payload!r}")
+            continue
+        cache_keys.add(generate_user_cache_key(user_id))
+        if table == "user_role_links":
+            role_changes.add(user_id)
+
+    if cache_keys:
+        _invalidate_profile_cache(*cache_keys)
+        logger.info(f"Vô hiệu hóa {len(cache_keys)} cache hồ sơ từ thay đổi trong DB")
+    for user_id in role_changes:
+        await asyncio.to_thread(role_versions.bump, user_id)
+
+
+async def revoke_user_sessions_service(user_id: UUID) -> str:
+    """Thu hồi mọi JWT đã phát hành cho user (buộc refresh token)."""
+    await asyncio.to_thread(revocation_list.revoke_subject, str(user_id))
+    logger.info(f"Đã thu hồi các phiên đăng nhập của user {user_id}")
+    return f"Đã thu hồi các phiên đăng nhập của user {user_id}"
+
+
 async def invite_staff_service(
     email: str, role: RoleEnum, session: AsyncSession
 ) -> str:
@@ -230,6 +397,7 @@ async def invite_staff_service(
                 link = UserRoleLink(user_id=user_id, role_id=role_obj.id)
                 session.add(link)
                 await session.commit()
+                await asyncio.to_thread(role_versions.bump, user_id)
 
         return f"Đã gửi email mời đến {email} với role '{role.value}'"
     except Exception as e:
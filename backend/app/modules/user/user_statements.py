@@ -0,0 +1,40 @@
+"""Câu lệnh SELECT dùng thường xuyên của module user, dựng bằng `lambda_stmt`.
+
+Với `select()` thông thường, mỗi lần gọi phải dựng lại cây câu lệnh và duyệt
+toàn bộ cây để tính cache key trước khi tra cache compiled của engine. Lambda
+statement được phân tích một lần theo vị trí code; các lần sau chỉ lấy giá trị
+biến closure làm tham số bind, rồi dùng lại bản compiled (cỡ cache:
+`db_query_cache_size`). Ở chế độ `session`, asyncpg còn dùng lại prepared
+statement trên từng kết nối.
+
+Chỉ dùng biến closure cho giá trị tham số (id, tên); không rẽ nhánh trong lambda.
+Kết quả là hàng (Row): lấy object bằng `.scalars()`.
+"""
+
+from uuid import UUID
+
+from sqlalchemy import lambda_stmt
+from sqlalchemy.sql.lambdas import StatementLambdaElement
+from sqlmodel import select
+
+from .user_models import Profile, Role, UserRoleLink
+
+
+def profile_by_id(user_id: UUID) -> StatementLambdaElement:
+    return lambda_stmt(lambda: select(Profile).where(Profile.id == user_id))
+
+
+def role_by_name(role_name: str) -> StatementLambdaElement:
+    return lambda_stmt(lambda: select(Role).where(Role.name == role_name))
+
+
+def all_roles() -> StatementLambdaElement:
+    return lambda_stmt(lambda: select(Role).order_by(Role.id))
+
+
+def role_names_of_user(user_id: UUID) -> StatementLambdaElement:
+    return lambda_stmt(
+        lambda: select(Role.name)
+        .join(UserRoleLink, UserRoleLink.role_id == Role.id)
+        .where(UserRoleLink.user_id == user_id)
+    )
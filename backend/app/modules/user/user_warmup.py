@@ -0,0 +1,283 @@
+"""Warmup cache: nạp trước roles và các profile hay dùng sau deploy hoặc Redis flush.
+
+Danh sách id lấy bằng một query; profile được đọc theo batch (hai query mỗi
+batch, mỗi batch một session riêng) và ghi vào cache bằng một pipeline. Số
+batch chạy song song bị giới hạn bởi semaphore để không chiếm hết pool DB.
+
+Với nhiều worker, chỉ worker giữ lease trên Redis (`SET NX`, gia hạn sau mỗi
+batch) chạy warmup; trạng thái được ghi vào Redis để admin API ở worker nào
+cũng thấy cùng một tiến độ. Redis unavailable thì quay về kiểm tra trong worker.
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from uuid import UUID
+
+from sqlmodel import select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.logging import logger
+from app.redis.client import get_async_redis_client
+from app.redis.helpers import async_cache_set, async_cache_set_many, loaded_envelope
+from .user_models import Profile
+from .user_service import (
+    ROLES_CACHE_KEY,
+    ROLES_CACHE_TTL,
+    USER_CACHE_TTL,
+    generate_user_cache_key,
+    load_profiles_with_roles,
+    load_roles,
+)
+
+# Trần cho `limit` của warmup qua admin API
+WARMUP_MAX_PROFILES = 100_000
+WARMUP_LEASE_KEY = "cache:warmup:lease"
+WARMUP_STATUS_KEY = "cache:warmup:status"
+WARMUP_STATUS_TTL = 24 * 3600
+_RENEW_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class WarmupProgress:
+    """Trạng thái lần warmup gần nhất do worker này chạy."""
+
+    def __init__(self):
+        self.status = "idle"  # idle | running | completed | failed
+        self.total = 0
+        self.warmed = 0
+        self.failed_batches = 0
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.error: str | None = None
+
+    def start(self) -> None:
+        self.__init__()
+        self.status = "running"
+        self.started_at = time.time()
+
+    def finish(self, error: Exception | None = None) -> None:
+        self.status = "failed" if error else "completed"
+        self.error = str(error) if error else None
+        self.finished_at = time.time()
+
+    def as_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        return {
+            "status": self.status,
+            "total": self.total,
+            "warmed": self.warmed,
+            "failed_batches": self.failed_batches,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_seconds": (
+                round(end - self.started_at, 3) if self.started_at else None
+            ),
+            "error": self.error,
+        }
+
+
+warmup_progress = WarmupProgress()
+_warmup_task: asyncio.Task | None = None
+_lease_token: str | None = None
+
+
+async def _acquire_lease() -> str | None:
+    """Lấy lease warmup. Trả về token, None nếu worker khác đang chạy warmup.
+
+    Redis unavailable thì trả về chuỗi rỗng: chạy luôn, không cần lease.
+    """
+    try:
+        redis = await get_async_redis_client()
+        if redis is None:
+            return ""
+        token = uuid.uuid4().hex
+        acquired = await redis.execute(
+            "SET",
+            WARMUP_LEASE_KEY,
+            token,
+            "NX",
+            "PX",
+            int(settings.cache_warmup_lease_ttl * 1000),
+        )
+        return token if acquired == "OK" else None
+    except Exception as e:
+        logger.warning(f"Không lấy được lease warmup, chạy trong worker: {e}")
+        return ""
+
+
+async def _release_lease(token: str) -> None:
+    try:
+        redis = await get_async_redis_client()
+        if redis is not None:
+            await redis.execute("EVAL", _RELEASE_LEASE_SCRIPT, 1, WARMUP_LEASE_KEY, token)
+    except Exception as e:
+        # Lease tự hết hạn sau cache_warmup_lease_ttl
+        logger.warning(f"Không nhả được lease warmup: {e}")
+
+
+async def _publish_progress() -> None:
+    """Ghi tiến độ vào Redis và gia hạn lease đang giữ."""
+    try:
+        redis = await get_async_redis_client()
+        if redis is None:
+            return
+        await redis.setex(
+            WARMUP_STATUS_KEY, WARMUP_STATUS_TTL, json.dumps(warmup_progress.as_dict())
+        )
+        if _lease_token:
+            await redis.execute(
+                "EVAL",
+                _RENEW_LEASE_SCRIPT,
+                1,
+                WARMUP_LEASE_KEY,
+                _lease_token,
+                int(settings.cache_warmup_lease_ttl * 1000),
+            )
+    except Exception as e:
+        logger.warning(f"Không ghi được tiến độ warmup: {e}")
+
+
+async def get_warmup_status() -> dict:
+    """Tiến độ lần warmup gần nhất trên mọi worker (từ Redis, không thì của worker này)."""
+    try:
+        redis = await get_async_redis_client()
+        raw = await redis.get(WARMUP_STATUS_KEY) if redis is not None else None
+        if raw:
+            progress = json.loads(raw)
+            if progress["status"] == "running" and not await redis.exists(
+                WARMUP_LEASE_KEY
+            ):
+                # Worker chạy warmup đã dừng mà không kịp ghi trạng thái cuối
+                progress["status"] = "failed"
+                progress["error"] = "Warmup bị gián đoạn"
+            return progress
+    except Exception as e:
+        logger.warning(f"Không đọc được tiến độ warmup từ Redis: {e}")
+    return warmup_progress.as_dict()
+
+
+async def _warm_batch(user_ids: list[UUID], semaphore: asyncio.Semaphore) -> None:
+    async with semaphore:
+        try:
+            started = time.monotonic()
+            async with AsyncSessionLocal() as session:
+                loaded = await load_profiles_with_roles(session, user_ids)
+            delta = round(time.monotonic() - started, 4)
+            # Cùng envelope với get_or_load để XFetch làm mới sớm các entry này
+            cached = await async_cache_set_many(
+                {
+                    generate_user_cache_key(uid): loaded_envelope(
+                        data, USER_CACHE_TTL, delta
+                    )
+                    for uid, data in loaded.items()
+                },
+                ttl=USER_CACHE_TTL,
+            )
+        except Exception as e:
+            logger.warning(f"Warmup batch {len(user_ids)} profile thất bại: {e}")
+            cached = False
+        if cached:
+            warmup_progress.warmed += len(loaded)
+        else:
+            warmup_progress.failed_batches += 1
+        await _publish_progress()
+
+
+async def warm_user_cache(
+    limit: int | None = None,
+    batch_size: int | None = None,
+    concurrency: int | None = None,
+) -> dict:
+    """
+    Nạp roles và `limit` profile có `updated_at` mới nhất vào cache.
+
+    Trả về:
+        Trạng thái warmup (`WarmupProgress.as_dict()`)
+    """
+    limit = settings.cache_warmup_profiles if limit is None else limit
+    batch_size = batch_size or settings.cache_warmup_batch_size
+    semaphore = asyncio.Semaphore(concurrency or settings.cache_warmup_concurrency)
+
+    warmup_progress.start()
+    await _publish_progress()
+    try:
+        async with AsyncSessionLocal() as session:
+            started = time.monotonic()
+            roles = await load_roles(session)
+            delta = round(time.monotonic() - started, 4)
+            result = await session.exec(
+                select(Profile.id).order_by(Profile.updated_at.desc()).limit(limit)
+            )
+            user_ids = list(result.all())
+        await async_cache_set(
+            ROLES_CACHE_KEY,
+            loaded_envelope(roles, ROLES_CACHE_TTL, delta),
+            ttl=ROLES_CACHE_TTL,
+        )
+
+        warmup_progress.total = len(user_ids)
+        await asyncio.gather(
+            *(
+                _warm_batch(user_ids[start : start + batch_size], semaphore)
+                for start in range(0, len(user_ids), batch_size)
+            )
+        )
+    except Exception as e:
+        warmup_progress.finish(e)
+        logger.error(f"Warmup cache thất bại: {e}")
+    else:
+        warmup_progress.finish()
+        logger.info(
+            f"Warmup cache xong: {warmup_progress.warmed}/{warmup_progress.total} "
+            f"profile trong {warmup_progress.as_dict()['duration_seconds']}s"
+        )
+    await _publish_progress()
+    return warmup_progress.as_dict()
+
+
+async def _run_with_lease(token: str, **kwargs) -> None:
+    global _lease_token
+    _lease_token = token
+    try:
+        await warm_user_cache(**kwargs)
+    finally:
+        _lease_token = None
+        if token:
+            await _release_lease(token)
+
+
+async def start_warmup(**kwargs) -> bool:
+    """Chạy warmup nền; False nếu đang có lần warmup khác chạy (ở bất kỳ worker nào)."""
+    global _warmup_task
+    if _warmup_task is not None and not _warmup_task.done():
+        return False
+    token = await _acquire_lease()
+    if token is None:
+        return False
+    _warmup_task = asyncio.get_running_loop().create_task(
+        _run_with_lease(token, **kwargs)
+    )
+    return True
+
+
+async def stop_warmup() -> None:
+    """Hủy warmup đang chạy (khi tắt ứng dụng)."""
+    if _warmup_task is not None and not _warmup_task.done():
+        _warmup_task.cancel()
+        try:
+            await _warmup_task
+        except asyncio.CancelledError:
+            pass
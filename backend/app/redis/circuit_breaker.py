@@ -0,0 +1,136 @@
+"""Circuit breaker cho lớp Redis.
+
+- CLOSED: gọi bình thường, đếm lỗi liên tiếp.
+- OPEN: sau `failure_threshold` lỗi liên tiếp; mọi lời gọi fail nhanh (trả fallback)
+  trong thời gian backoff, tăng gấp đôi sau mỗi lần thử lại thất bại.
+- HALF_OPEN: hết backoff, cho đúng một lời gọi thử; thành công thì CLOSED,
+  thất bại thì OPEN lại với backoff dài hơn.
+"""
+
+import random
+import threading
+import time
+from enum import Enum
+
+from app.core.logging import logger
+
+
+class CircuitState(str, Enum):
+    """Trạng thái circuit breaker."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Circuit breaker dùng chung cho client sync và async (thread-safe)."""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 3,
+        base_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        probe_timeout: float = 10.0,
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        # Lời gọi thử không báo kết quả trong khoảng này thì cho lời gọi thử khác
+        self.probe_timeout = probe_timeout
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self.rejected = 0
+        self.transitions: dict[str, int] = {state.value: 0 for state in CircuitState}
+        self.last_transition: float | None = None
+        self.last_error: str | None = None
+        self._open_count = 0  # Số lần OPEN liên tiếp, quyết định backoff
+        self._open_until = 0.0
+        self._probe_started: float | None = None
+        self._lock = threading.Lock()
+
+    def _transition(self, state: CircuitState) -> None:
+        if state == self.state:
+            return
+        logger.warning(
+            f"Circuit breaker '{self.name}': {self.state.value} -> {state.value}"
+        )
+        self.state = state
+        self.transitions[state.value] += 1
+        self.last_transition = time.time()
+
+    def allow_request(self) -> bool:
+        """False nếu nên fail nhanh; chuyển OPEN -> HALF_OPEN khi hết backoff."""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == CircuitState.CLOSED:
+                return True
+            if self.state == CircuitState.OPEN:
+                if now < self._open_until:
+                    self.rejected += 1
+                    return False
+                self._transition(CircuitState.HALF_OPEN)
+            if (
+                self._probe_started is not None
+                and now - self._probe_started < self.probe_timeout
+            ):
+                self.rejected += 1
+                return False
+            self._probe_started = now
+            return True
+
+    def record_success(self) -> None:
+        if self.state == CircuitState.CLOSED and not self.failures:
+            return  # Đường nhanh: không cần lock khi mọi thứ bình thường
+        with self._lock:
+            self.failures = 0
+            self._open_count = 0
+            self._probe_started = None
+            self._transition(CircuitState.CLOSED)
+
+    def record_failure(self, error: Exception | str | None = None) -> None:
+        with self._lock:
+            self.failures += 1
+            if error is not None:
+                self.last_error = str(error)
+            if (
+                self.state == CircuitState.HALF_OPEN
+                or self.failures >= self.failure_threshold
+            ):
+                self._open()
+
+    def trip(self, error: Exception | str | None = None) -> None:
+        """Mở circuit ngay (ví dụ khởi tạo kết nối thất bại)."""
+        with self._lock:
+            self.failures += 1
+            if error is not None:
+                self.last_error = str(error)
+            self._open()
+
+    def _open(self) -> None:
+        backoff = min(self.max_backoff, self.base_backoff * 2**self._open_count)
+        # Jitter để các worker không cùng thử lại một lúc
+        backoff *= random.uniform(0.8, 1.2)
+        self._open_count += 1
+        self._open_until = time.monotonic() + backoff
+        self._probe_started = None
+        self._transition(CircuitState.OPEN)
+
+    def retry_in(self) -> float:
+        """Số giây còn lại trước lần thử lại (0 nếu không OPEN)."""
+        if self.state != CircuitState.OPEN:
+            return 0.0
+        return max(0.0, self._open_until - time.monotonic())
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state.value,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "retry_in_seconds": round(self.retry_in(), 3),
+            "transitions": dict(self.transitions),
+            "last_transition": self.last_transition,
+            "last_error": self.last_error,
+        }
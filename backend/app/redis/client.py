@@ -1,19 +1,37 @@
-"""Quản lý kết nối Redis với hỗ trợ REST API."""
+"""Quản lý kết nối Redis: Upstash REST API hoặc giao thức RESP (connection pool).
 
+Chọn backend bằng `REDIS_BACKEND` (`upstash` | `resp`). Mọi client có cùng tập
+method (get/setex/delete/exists/execute/mget/pipeline) và trả về giá trị thô như
+REST API của Upstash, nên helpers dùng chung được.
+"""
+
+import asyncio
 import json
 import time
 from typing import Any
+import httpx
+import redis as redis_py
+import redis.asyncio as redis_asyncio
 import requests
 from app.core.config import settings
 from app.core.exceptions import CacheException
 from app.core.logging import logger
+from app.redis.circuit_breaker import CircuitBreaker
 
 
 class UpstashRestClient:
     """Redis client sử dụng Upstash REST API."""
 
-    def __init__(self, base_url: str, token: str):
+    def __init__(
+        self,
+        base_url: str,
+        token: str,
+        timeout: float = 5.0,
+        breaker: CircuitBreaker | None = None,
+    ):
         self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.breaker = breaker
         self.session = requests.Session()
         self.session.headers.update(
             {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
@@ -22,13 +40,17 @@ class UpstashRestClient:
     def _request(self, method: str, endpoint: str, **kwargs) -> dict:
         """Thực hiện HTTP request đến Upstash REST API."""
         url = f"{self.base_url}{endpoint}"
+        kwargs.setdefault("timeout", self.timeout)
         try:
             response = self.session.request(method, url, **kwargs)
             response.raise_for_status()
-            return response.json()
         except requests.RequestException as e:
+            status_code = getattr(e.response, "status_code", None)
+            _record_failure(self.breaker, e, status_code is None or status_code >= 500)
             logger.error(f"Upstash REST API error: {e}")
-            raise CacheException(f"Redis REST API error: {e}")
+            raise CacheException(f"Redis REST API error: {e}") from e
+        _record_success(self.breaker)
+        return response.json()
 
     def ping(self) -> str:
         """Test connection."""
@@ -57,40 +79,481 @@ class UpstashRestClient:
         result = self._request("GET", f"/exists/{key}")
         return result.get("result", 0)
 
+    def execute(self, *command: Any) -> Any:
+        """Thực thi lệnh Redis bất kỳ, ví dụ `execute("ZADD", key, score, member)`."""
+        result = self._request("POST", "/", json=[str(part) for part in command])
+        return result.get("result")
+
+    def mget(self, *keys: str) -> list[str | None]:
+        """Get nhiều key trong một round trip."""
+        return self.execute("MGET", *keys) if keys else []
+
+    def pipeline(self, commands: list[list[Any]], transaction: bool = False) -> list:
+        """Gửi nhiều lệnh trong một HTTP request (`/pipeline` hoặc `/multi-exec`)."""
+        if not commands:
+            return []
+        endpoint = "/multi-exec" if transaction else "/pipeline"
+        response = self._request("POST", endpoint, json=_encode_commands(commands))
+        return _pipeline_results(response)
+
     def close(self) -> None:
         """Close session."""
         self.session.close()
 
 
+class AsyncUpstashRestClient:
+    """Redis client async sử dụng Upstash REST API.
+
+    Dùng một connection pool keep-alive (HTTP/2 khi server hỗ trợ) dùng chung cho
+    mọi request; mỗi lệnh có thể truyền `timeout` riêng.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        token: str,
+        timeout: float = 5.0,
+        max_connections: int = 100,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.breaker = breaker
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json",
+            },
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            http2=_http2_available(),
+        )
+
+    async def _request(
+        self, method: str, endpoint: str, timeout: float | None = None, **kwargs
+    ) -> dict:
+        """Thực hiện HTTP request đến Upstash REST API."""
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        try:
+            response = await self.client.request(method, endpoint, **kwargs)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            outage = (
+                not isinstance(e, httpx.HTTPStatusError)
+                or e.response.status_code >= 500
+            )
+            _record_failure(self.breaker, e, outage)
+            logger.error(f"Upstash REST API error: {e}")
+            raise CacheException(f"Redis REST API error: {e}") from e
+        _record_success(self.breaker)
+        return response.json()
+
+    async def ping(self, timeout: float | None = None) -> str:
+        """Test connection."""
+        result = await self._request("GET", "/ping", timeout=timeout)
+        return result.get("result", "PONG")
+
+    async def get(self, key: str, timeout: float | None = None) -> str | None:
+        """Get value by key."""
+        result = await self._request("GET", f"/get/{key}", timeout=timeout)
+        return result.get("result")
+
+    async def setex(
+        self, key: str, time: int, value: str, timeout: float | None = None
+    ) -> str | None:
+        """Set key with expiration."""
+        result = await self._request(
+            "POST", "/", json=["SETEX", key, str(time), value], timeout=timeout
+        )
+        return result.get("result")
+
+    async def delete(self, key: str, timeout: float | None = None) -> int:
+        """Delete key."""
+        result = await self._request("POST", f"/del/{key}", timeout=timeout)
+        return result.get("result", 0)
+
+    async def exists(self, key: str, timeout: float | None = None) -> int:
+        """Check if key exists."""
+        result = await self._request("GET", f"/exists/{key}", timeout=timeout)
+        return result.get("result", 0)
+
+    async def execute(self, *command: Any, timeout: float | None = None) -> Any:
+        """Thực thi lệnh Redis bất kỳ."""
+        result = await self._request(
+            "POST", "/", json=[str(part) for part in command], timeout=timeout
+        )
+        return result.get("result")
+
+    async def mget(self, *keys: str, timeout: float | None = None) -> list[str | None]:
+        """Get nhiều key trong một round trip."""
+        return await self.execute("MGET", *keys, timeout=timeout) if keys else []
+
+    async def pipeline(
+        self,
+        commands: list[list[Any]],
+        transaction: bool = False,
+        timeout: float | None = None,
+    ) -> list:
+        """Gửi nhiều lệnh trong một HTTP request (`/pipeline` hoặc `/multi-exec`)."""
+        if not commands:
+            return []
+        endpoint = "/multi-exec" if transaction else "/pipeline"
+        response = await self._request(
+            "POST", endpoint, json=_encode_commands(commands), timeout=timeout
+        )
+        return _pipeline_results(response)
+
+    async def close(self) -> None:
+        """Đóng connection pool."""
+        await self.client.aclose()
+
+
+def _raw_responses(client):
+    """Bỏ response callback của redis-py để kết quả giống Upstash REST (giá trị thô)."""
+    client.response_callbacks.clear()
+    return client
+
+
+def _normalize_resp(command: tuple | list, result: Any) -> Any:
+    # RESP3/fakeredis có thể trả WITHSCORES dạng cặp; Upstash trả list phẳng
+    if (
+        isinstance(result, list)
+        and str(command[-1]).upper() == "WITHSCORES"
+        and result
+        and isinstance(result[0], (list, tuple))
+    ):
+        return [item for pair in result for item in pair]
+    return result
+
+
+def _resp_pipeline_results(commands: list[list[Any]], raw: list) -> list:
+    """Lệnh lỗi trả về None và được ghi log, giống `_pipeline_results`."""
+    results = []
+    for command, item in zip(commands, raw):
+        if isinstance(item, Exception):
+            logger.error(f"Redis pipeline error: {item}")
+            results.append(None)
+        else:
+            results.append(_normalize_resp(command, item))
+    return results
+
+
+class RespRedisClient:
+    """Redis client qua giao thức RESP với connection pool (redis-py)."""
+
+    def __init__(self, client: redis_py.Redis, breaker: CircuitBreaker | None = None):
+        self.client = _raw_responses(client)
+        self.breaker = breaker
+
+    @classmethod
+    def from_url(
+        cls,
+        url: str,
+        timeout: float = 5.0,
+        max_connections: int = 100,
+        breaker: CircuitBreaker | None = None,
+    ) -> "RespRedisClient":
+        # Pool chặn (chờ tối đa `timeout`) thay vì lỗi ngay khi hết connection
+        pool = redis_py.BlockingConnectionPool.from_url(
+            url,
+            decode_responses=True,
+            socket_timeout=timeout,
+            socket_connect_timeout=timeout,
+            max_connections=max_connections,
+            timeout=timeout,
+            health_check_interval=30,
+        )
+        return cls(redis_py.Redis(connection_pool=pool), breaker)
+
+    def _call(self, fn, *args, **kwargs):
+        try:
+            result = fn(*args, **kwargs)
+        except redis_py.RedisError as e:
+            _record_failure(self.breaker, e, _is_resp_outage(e))
+            logger.error(f"Redis error: {e}")
+            raise CacheException(f"Redis error: {e}") from e
+        _record_success(self.breaker)
+        return result
+
+    def execute(self, *command: Any) -> Any:
+        """Thực thi lệnh Redis bất kỳ."""
+        return _normalize_resp(command, self._call(self.client.execute_command, *command))
+
+    def ping(self) -> str:
+        return self.execute("PING")
+
+    def get(self, key: str) -> str | None:
+        return self.execute("GET", key)
+
+    def setex(self, key: str, time: int, value: str) -> str | None:
+        return self.execute("SETEX", key, time, value)
+
+    def delete(self, key: str) -> int:
+        return self.execute("DEL", key)
+
+    def exists(self, key: str) -> int:
+        return self.execute("EXISTS", key)
+
+    def mget(self, *keys: str) -> list[str | None]:
+        return self.execute("MGET", *keys) if keys else []
+
+    def pipeline(self, commands: list[list[Any]], transaction: bool = False) -> list:
+        """Gửi nhiều lệnh trong một round trip (MULTI/EXEC khi `transaction`)."""
+        if not commands:
+            return []
+        pipe = self.client.pipeline(transaction=transaction)
+        for command in commands:
+            pipe.execute_command(*command)
+        raw = self._call(pipe.execute, raise_on_error=False)
+        return _resp_pipeline_results(commands, raw)
+
+    def close(self) -> None:
+        self.client.close()
+
+
+class AsyncRespRedisClient:
+    """Redis client async qua giao thức RESP với connection pool (redis.asyncio)."""
+
+    def __init__(
+        self, client: redis_asyncio.Redis, breaker: CircuitBreaker | None = None
+    ):
+        self.client = _raw_responses(client)
+        self.breaker = breaker
+
+    @classmethod
+    def from_url(
+        cls,
+        url: str,
+        timeout: float = 5.0,
+        max_connections: int = 100,
+        breaker: CircuitBreaker | None = None,
+    ) -> "AsyncRespRedisClient":
+        # Pool chặn (chờ tối đa `timeout`) thay vì lỗi ngay khi hết connection
+        pool = redis_asyncio.BlockingConnectionPool.from_url(
+            url,
+            decode_responses=True,
+            socket_timeout=timeout,
+            socket_connect_timeout=timeout,
+            max_connections=max_connections,
+            timeout=timeout,
+            health_check_interval=30,
+        )
+        return cls(redis_asyncio.Redis(connection_pool=pool), breaker)
+
+    async def _call(self, coro, timeout: float | None):
+        try:
+            if timeout is None:
+                result = await coro
+            else:
+                result = await asyncio.wait_for(coro, timeout)
+        except (redis_py.RedisError, asyncio.TimeoutError) as e:
+            _record_failure(self.breaker, e, _is_resp_outage(e))
+            logger.error(f"Redis error: {e}")
+            raise CacheException(f"Redis error: {e}") from e
+        _record_success(self.breaker)
+        return result
+
+    async def execute(self, *command: Any, timeout: float | None = None) -> Any:
+        """Thực thi lệnh Redis bất kỳ."""
+        result = await self._call(self.client.execute_command(*command), timeout)
+        return _normalize_resp(command, result)
+
+    async def ping(self, timeout: float | None = None) -> str:
+        return await self.execute("PING", timeout=timeout)
+
+    async def get(self, key: str, timeout: float | None = None) -> str | None:
+        return await self.execute("GET", key, timeout=timeout)
+
+    async def setex(
+        self, key: str, time: int, value: str, timeout: float | None = None
+    ) -> str | None:
+        return await self.execute("SETEX", key, time, value, timeout=timeout)
+
+    async def delete(self, key: str, timeout: float | None = None) -> int:
+        return await self.execute("DEL", key, timeout=timeout)
+
+    async def exists(self, key: str, timeout: float | None = None) -> int:
+        return await self.execute("EXISTS", key, timeout=timeout)
+
+    async def mget(self, *keys: str, timeout: float | None = None) -> list[str | None]:
+        return await self.execute("MGET", *keys, timeout=timeout) if keys else []
+
+    async def pipeline(
+        self,
+        commands: list[list[Any]],
+        transaction: bool = False,
+        timeout: float | None = None,
+    ) -> list:
+        """Gửi nhiều lệnh trong một round trip (MULTI/EXEC khi `transaction`)."""
+        if not commands:
+            return []
+        pipe = self.client.pipeline(transaction=transaction)
+        for command in commands:
+            pipe.execute_command(*command)
+        raw = await self._call(pipe.execute(raise_on_error=False), timeout)
+        return _resp_pipeline_results(commands, raw)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def _record_success(breaker: CircuitBreaker | None) -> None:
+    if breaker is not None:
+        breaker.record_success()
+
+
+def _record_failure(breaker: CircuitBreaker | None, error: Exception, outage: bool) -> None:
+    """Chỉ lỗi kết nối/timeout/5xx mới tính vào breaker; lỗi lệnh (4xx) thì không."""
+    if breaker is not None and outage:
+        breaker.record_failure(error)
+
+
+def _is_resp_outage(error: Exception) -> bool:
+    return isinstance(
+        error, (redis_py.ConnectionError, redis_py.TimeoutError, asyncio.TimeoutError)
+    )
+
+
+def _encode_commands(commands: list[list[Any]]) -> list[list[str]]:
+    return [[str(part) for part in command] for command in commands]
+
+
+def _pipeline_results(response: list[dict]) -> list:
+    """Lấy `result` của từng lệnh; lệnh lỗi trả về None và được ghi log."""
+    results = []
+    for item in response:
+        if "error" in item:
+            logger.error(f"Upstash pipeline error: {item['error']}")
+            results.append(None)
+        else:
+            results.append(item.get("result"))
+    return results
+
+
+def _http2_available() -> bool:
+    """HTTP/2 cần package `h2` (httpx[http2])."""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# Circuit breaker dùng chung cho client sync và async của worker
+redis_breaker = CircuitBreaker(
+    "redis",
+    failure_threshold=settings.redis_circuit_failure_threshold,
+    base_backoff=settings.redis_circuit_backoff_base,
+    max_backoff=settings.redis_circuit_backoff_max,
+)
+
 # Instance client Redis toàn cục
-_redis_client: UpstashRestClient | None = None
+_redis_client: UpstashRestClient | RespRedisClient | None = None
+_async_redis_client: AsyncUpstashRestClient | AsyncRespRedisClient | None = None
+
+
+def _create_redis_client() -> UpstashRestClient | RespRedisClient | None:
+    """Tạo client sync theo `REDIS_BACKEND`; None nếu thiếu cấu hình."""
+    if settings.redis_backend == "resp":
+        if not settings.redis_url:
+            logger.warning("❌ Thiếu REDIS_URL cho REDIS_BACKEND=resp")
+            return None
+        return RespRedisClient.from_url(
+            settings.redis_url,
+            timeout=settings.redis_timeout,
+            max_connections=settings.redis_max_connections,
+            breaker=redis_breaker,
+        )
+    if settings.upstash_redis_rest_url and settings.upstash_redis_rest_token:
+        return UpstashRestClient(
+            settings.upstash_redis_rest_url,
+            settings.upstash_redis_rest_token,
+            timeout=settings.redis_timeout,
+            breaker=redis_breaker,
+        )
+    logger.warning("❌ Thiếu UPSTASH_REDIS_REST_URL hoặc UPSTASH_REDIS_REST_TOKEN")
+    return None
+
+
+def _create_async_redis_client() -> AsyncUpstashRestClient | AsyncRespRedisClient | None:
+    """Tạo client async theo `REDIS_BACKEND`; None nếu thiếu cấu hình."""
+    if settings.redis_backend == "resp":
+        if not settings.redis_url:
+            logger.warning("❌ Thiếu REDIS_URL cho REDIS_BACKEND=resp")
+            return None
+        return AsyncRespRedisClient.from_url(
+            settings.redis_url,
+            timeout=settings.redis_timeout,
+            max_connections=settings.redis_max_connections,
+            breaker=redis_breaker,
+        )
+    if settings.upstash_redis_rest_url and settings.upstash_redis_rest_token:
+        return AsyncUpstashRestClient(
+            settings.upstash_redis_rest_url,
+            settings.upstash_redis_rest_token,
+            timeout=settings.redis_timeout,
+            max_connections=settings.redis_max_connections,
+            breaker=redis_breaker,
+        )
+    logger.warning("❌ Thiếu UPSTASH_REDIS_REST_URL hoặc UPSTASH_REDIS_REST_TOKEN")
+    return None
 
 
-def get_redis_client() -> UpstashRestClient | None:
-    """Lấy instance client Redis với lazy initialization."""
+def get_redis_client() -> UpstashRestClient | RespRedisClient | None:
+    """Lấy instance client Redis với lazy initialization.
+
+    Trả về None ngay (không chờ kết nối) khi circuit breaker đang OPEN.
+    """
     global _redis_client
+    if not redis_breaker.allow_request():
+        return None
     if _redis_client is None:
         try:
-            if settings.upstash_redis_rest_url and settings.upstash_redis_rest_token:
-                # Use REST API
-                _redis_client = UpstashRestClient(
-                    settings.upstash_redis_rest_url, settings.upstash_redis_rest_token
-                )
+            client = _create_redis_client()
+            if client is not None:
                 # Test kết nối
-                _redis_client.ping()
-                logger.info("✅ Kết nối Upstash REST API thành công")
-            else:
-                logger.warning(
-                    "❌ Thiếu UPSTASH_REDIS_REST_URL hoặc UPSTASH_REDIS_REST_TOKEN"
-                )
-                _redis_client = None
+                client.ping()
+                _redis_client = client
+                logger.info(f"✅ Kết nối Redis ({settings.redis_backend}) thành công")
         except Exception as e:
-            logger.error(f"Lỗi khởi tạo Redis REST client: {e}")
-            _redis_client = None
+            logger.error(f"Lỗi khởi tạo Redis client: {e}")
+            redis_breaker.trip(e)
 
     return _redis_client
 
 
+async def get_async_redis_client() -> AsyncUpstashRestClient | AsyncRespRedisClient | None:
+    """Lấy instance client Redis async với lazy initialization.
+
+    Trả về None ngay (không chờ kết nối) khi circuit breaker đang OPEN.
+    """
+    global _async_redis_client
+    if not redis_breaker.allow_request():
+        return None
+    if _async_redis_client is None:
+        client = _create_async_redis_client()
+        if client is None:
+            return None
+        # Gán trước khi await để các coroutine khác dùng chung một pool
+        _async_redis_client = client
+        try:
+            await client.ping()
+            logger.info(f"✅ Kết nối Redis ({settings.redis_backend}, async) thành công")
+        except Exception as e:
+            logger.error(f"Lỗi khởi tạo Redis client (async): {e}")
+            redis_breaker.trip(e)
+            if _async_redis_client is client:
+                _async_redis_client = None
+            await client.close()
+            return None
+
+    return _async_redis_client
+
+
 def check_redis_health() -> tuple[bool, float]:
     """
     Kiểm tra sức khỏe Redis bằng cách ping server.
@@ -121,3 +584,12 @@ def close_redis() -> None:
         _redis_client.close()
         _redis_client = None
         logger.info("Kết nối Redis đã đóng")
+
+
+async def close_async_redis() -> None:
+    """Đóng connection pool của client Redis async."""
+    global _async_redis_client
+    if _async_redis_client:
+        await _async_redis_client.close()
+        _async_redis_client = None
+        logger.info("Kết nối Redis (async) đã đóng")
@@ -0,0 +1,110 @@
+"""Codec cho giá trị cache: encode thành chuỗi có envelope phiên bản.
+
+Định dạng: `\\x1f` + phiên bản + codec + nén + payload.
+- codec `j`: JSON (orjson nếu có, không thì json chuẩn), payload là text JSON.
+- nén `z`: zlib khi payload vượt `compress_threshold`, payload base64; `-` là không nén.
+
+Transport (Upstash REST, RESP với decode_responses) và L1 đều lưu chuỗi, nên
+payload nhị phân phải qua base64 (+33%): một định dạng nhị phân như msgpack vì
+vậy không nhỏ hơn text JSON, chỉ payload nén mới đáng trả chi phí đó. Giá trị cũ
+(JSON thuần, không có envelope) vẫn đọc được; envelope phiên bản hoặc codec lạ
+được coi như cache miss.
+"""
+
+import base64
+import json
+import zlib
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Any
+from uuid import UUID
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson là tùy chọn
+    orjson = None
+
+ENVELOPE_MARKER = "\x1f"
+CODEC_VERSION = "1"
+JSON_CODEC = "j"
+NO_COMPRESSION = "-"
+ZLIB_COMPRESSION = "z"
+
+
+class CodecError(ValueError):
+    """Không decode được giá trị trong cache (phiên bản hoặc codec không hỗ trợ)."""
+
+
+def _default(value: Any) -> Any:
+    """Chuyển các kiểu không có sẵn trong JSON về dạng cơ bản."""
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Kiểu {type(value).__name__} không serialize được vào cache")
+
+
+def _json_dumps(value: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(value, default=_default).decode()
+    return json.dumps(value, default=_default, separators=(",", ":"), ensure_ascii=False)
+
+
+def _json_loads(payload: str | bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+class CacheCodec:
+    """Encode/decode giá trị cache theo ngưỡng nén."""
+
+    def __init__(self, compress_threshold: int = 1024):
+        # 0 = không bao giờ nén
+        self.compress_threshold = compress_threshold
+
+    def encode(self, value: Any) -> str:
+        text = _json_dumps(value)
+        if self.compress_threshold and len(text) >= self.compress_threshold:
+            raw = text.encode()
+            compressed = zlib.compress(raw, 6)
+            # Chỉ giữ bản nén khi nhỏ hơn cả sau base64
+            if len(compressed) * 4 // 3 + 4 < len(raw):
+                payload = base64.b64encode(compressed).decode("ascii")
+                return f"{ENVELOPE_MARKER}{CODEC_VERSION}{JSON_CODEC}{ZLIB_COMPRESSION}{payload}"
+        return f"{ENVELOPE_MARKER}{CODEC_VERSION}{JSON_CODEC}{NO_COMPRESSION}{text}"
+
+    def decode(self, value: str) -> Any:
+        """Decode giá trị; raise CodecError nếu envelope không hỗ trợ."""
+        if not value.startswith(ENVELOPE_MARKER):
+            return _decode_legacy(value)
+        if len(value) < 4 or value[1] != CODEC_VERSION:
+            raise CodecError(f"Phiên bản codec không hỗ trợ: {value[1:2]!r}")
+        codec_id, compression, payload = value[2], value[3], value[4:]
+
+        if codec_id != JSON_CODEC:
+            raise CodecError(f"Codec không hỗ trợ: {codec_id!r}")
+        if compression == NO_COMPRESSION:
+            return _json_loads(payload)
+        if compression != ZLIB_COMPRESSION:
+            raise CodecError(f"Kiểu nén không hỗ trợ: {compression!r}")
+        try:
+            raw = zlib.decompress(base64.b64decode(payload))
+        except (ValueError, zlib.error) as e:
+            raise CodecError(f"Payload cache hỏng: {e}") from e
+        return _json_loads(raw)
+
+
+def _decode_legacy(value: str) -> Any:
+    """Giá trị ghi trước khi có envelope: JSON thuần, không được thì giữ chuỗi gốc."""
+    try:
+        return json.loads(value)
+    except (json.JSONDecodeError, TypeError):
+        return value
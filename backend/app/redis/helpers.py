@@ -1,13 +1,416 @@
-"""Redis cache helpers với hỗ trợ fallback."""
+"""Redis cache helpers với hỗ trợ fallback.
 
-import json
-from typing import Any
-from redis.exceptions import ConnectionError as RedisConnectionError
+Cache hai tầng: L1 trong process (LRU + TTL ngắn) hoặc segment mmap dùng chung
+giữa các worker trên cùng máy, đứng trước L2 là Redis.
+Xóa key sẽ được phát qua Redis để mọi worker bỏ entry L1 tương ứng.
 
-from app.redis.client import get_redis_client
+Tag: `cache_set(..., tags=[...])` lưu kèm version hiện tại của từng tag
+(`tag:<tên>`, tăng bằng INCR); `invalidate_tag` chỉ tăng version (O(1)), mọi
+entry mang version cũ bị coi là miss khi đọc.
+
+`async_cache_invalidate` đưa key vào hàng đợi nền (`invalidation.py`) để request
+ghi không phải chờ Redis.
+"""
+
+import asyncio
+import functools
+import math
+import random
+import time
+import uuid
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+from redis.exceptions import ConnectionError as RedisConnectionError, RedisError
+
+from app.core.background import BackgroundRefresher
+from app.core.config import settings
+from app.redis.client import get_async_redis_client, get_redis_client, redis_breaker
+from app.redis.codec import CacheCodec, CodecError
+from app.redis.invalidation import InvalidationQueue
+from app.redis.metrics import CacheMetrics
+from app.redis.local_cache import LocalCache
 from app.core.logging import logger
 
+if TYPE_CHECKING:
+    # shared_cache cần fcntl (chỉ có trên POSIX): chỉ import khi bật backend "shared"
+    from app.redis.shared_cache import SharedMemoryCache
+
+# Kênh invalidation L1: sorted set key -> seq, seq tăng dần qua INCR
+L1_INVALIDATION_KEY = "cache:l1_invalidations"
+L1_INVALIDATION_SEQ_KEY = "cache:l1_invalidation_seq"
+L1_INVALIDATION_MAX_ENTRIES = 10_000
+_PUBLISH_INVALIDATION_SCRIPT = f"""
+local seq = redis.call('INCR', KEYS[2])
+for _, key in ipairs(ARGV) do
+    redis.call('ZADD', KEYS[1], seq, key)
+end
+redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -{L1_INVALIDATION_MAX_ENTRIES + 1})
+return seq
+"""
+
+
+def _build_l1() -> "LocalCache | SharedMemoryCache | None":
+    """Tạo tầng L1 theo cấu hình; segment dùng chung lỗi thì lùi về LRU riêng."""
+    if not settings.cache_l1_enabled:
+        return None
+    if settings.cache_l1_backend == "shared":
+        try:
+            from app.redis.shared_cache import SharedMemoryCache
+
+            return SharedMemoryCache(
+                settings.cache_shared_path,
+                settings.cache_shared_slots,
+                settings.cache_shared_slot_size,
+                settings.cache_l1_ttl,
+            )
+        except ImportError as e:
+            # Windows không có fcntl
+            logger.error(f"Shared cache không hỗ trợ trên nền tảng này: {e}")
+        except OSError as e:
+            logger.error(f"Không mở được shared cache {settings.cache_shared_path}: {e}")
+    return LocalCache(settings.cache_l1_max_bytes, settings.cache_l1_ttl)
+
+
+_l1 = _build_l1()
+_l1_cursor: int | None = None
+_l2_stats = {"hits": 0, "misses": 0, "errors": 0}
+cache_metrics = CacheMetrics()
+
+
+def _timed(operation: str):
+    """Ghi độ trễ của hàm cache vào histogram theo namespace của key (tham số đầu)."""
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(keys, *args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(keys, *args, **kwargs)
+                finally:
+                    cache_metrics.observe(operation, keys, time.perf_counter() - started)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(keys, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(keys, *args, **kwargs)
+            finally:
+                cache_metrics.observe(operation, keys, time.perf_counter() - started)
+
+        return wrapper
+
+    return decorator
+
+
+def _record_fallback(keys: Any, error: bool = False) -> None:
+    """Đếm các key phải dùng fallback (Redis unavailable hoặc lỗi)."""
+    if isinstance(keys, str):
+        keys = [keys]
+    cache_metrics.record_many(keys, "fallbacks")
+    if error:
+        cache_metrics.record_many(keys, "errors")
+
+TAGS_MARKER = "__tags__"
+TAG_KEY_PREFIX = "tag:"
+# Member trong kênh invalidation L1 báo một tag vừa đổi version
+TAG_INVALIDATION_PREFIX = "#tag:"
+# Version tag đã biết trong worker: tag -> (version, thời điểm đọc), giữ cả khi tắt L1
+TAG_VERSIONS_MAX_ENTRIES = 10_000
+_tag_versions: dict[str, tuple[int, float]] = {}
+_tag_stats = {"stale": 0, "lookups": 0, "invalidations": 0}
+
+
+def _sync_l1_invalidations() -> None:
+    """Đọc các key/tag bị xóa bởi worker khác kể từ cursor và bỏ khỏi L1, version tag."""
+    global _l1_cursor
+    redis = get_redis_client()
+    if redis is None:
+        raise ConnectionError("Redis unavailable")
+
+    if _l1_cursor is None:
+        _l1_cursor = int(redis.execute("GET", L1_INVALIDATION_SEQ_KEY) or 0)
+        return
+
+    entries = redis.execute(
+        "ZRANGEBYSCORE", L1_INVALIDATION_KEY, f"({_l1_cursor}", "+inf", "WITHSCORES"
+    ) or []
+    if len(entries) // 2 >= L1_INVALIDATION_MAX_ENTRIES:
+        # Worker tụt quá xa so với kênh invalidation: bỏ toàn bộ L1 cho an toàn
+        if _l1 is not None:
+            _l1.clear()
+        _tag_versions.clear()
+    else:
+        for member in entries[::2]:
+            if member.startswith(TAG_INVALIDATION_PREFIX):
+                _tag_versions.pop(member[len(TAG_INVALIDATION_PREFIX) :], None)
+            elif _l1 is not None:
+                _l1.delete(member)
+    if entries:
+        _l1_cursor = max(_l1_cursor, int(float(entries[-1])))
+
+
+_l1_refresher = BackgroundRefresher(
+    "cache-l1-invalidation",
+    _sync_l1_invalidations,
+    settings.cache_l1_sync_interval,
+    min_retry_interval=settings.cache_l1_sync_interval,
+)
+
+
+def _l1_get(key: str) -> str | None:
+    if _l1 is None:
+        return None
+    _l1_refresher.maybe_refresh()
+    return _l1.get(key)
+
+
+def _l1_set(key: str, serialized: str, ttl: int | None = None) -> None:
+    if _l1 is not None:
+        _l1.set(key, serialized, ttl)
+
+
+def _l1_delete(keys: list[str]) -> None:
+    if _l1 is not None:
+        for key in keys:
+            _l1.delete(key)
+
+
+def _publish_commands(members: list[str]) -> list[list[Any]]:
+    """Lệnh phát invalidation cho L1 và version tag của các worker khác."""
+    return [
+        [
+            "EVAL",
+            _PUBLISH_INVALIDATION_SCRIPT,
+            2,
+            L1_INVALIDATION_KEY,
+            L1_INVALIDATION_SEQ_KEY,
+            *members,
+        ]
+    ]
+
+
+def _delete_commands(keys: list[str]) -> list[list[Any]]:
+    """Lệnh xóa key ở L2 kèm lệnh phát invalidation cho L1 của các worker khác."""
+    if _l1 is None:
+        return [["DEL", *keys]]
+    return [["DEL", *keys], *_publish_commands(keys)]
+
+
+def _store_set_results(serialized: dict[str, str], ttl: int, results: list) -> bool:
+    """Ghi L1 và metrics cho các SETEX thành công; SETEX lỗi (None) bị ghi log, trả về False."""
+    failed = [key for key, result in zip(serialized, results) if result is None]
+    if failed:
+        _record_fallback(failed, error=True)
+        logger.error(f"Lỗi cache set many: {len(failed)} keys không ghi được: {failed[:10]}")
+    skipped = set(failed)
+    for key, value in serialized.items():
+        if key in skipped:
+            continue
+        _l1_set(key, value, ttl)
+        cache_metrics.record(key, "sets")
+        cache_metrics.record(key, "bytes_written", len(value))
+    return not failed
+
+
+def _delete_failed(results: list) -> bool:
+    """DEL và EVAL phát invalidation luôn trả về số: None là lệnh lỗi trong pipeline."""
+    return any(result is None for result in results)
+
+
+def cache_stats() -> dict:
+    """Thống kê hit/miss/eviction cho từng tầng cache."""
+    return {
+        "l1": _l1.stats() if _l1 is not None else None,
+        "l2": dict(_l2_stats),
+        "loader": dict(_load_stats),
+        "tags": {**_tag_stats, "known": len(_tag_versions)},
+        "circuit_breaker": redis_breaker.stats(),
+        "invalidation": invalidation_queue.stats(),
+    }
+
+
+def clear_local_cache() -> None:
+    """Xóa toàn bộ L1 của worker hiện tại."""
+    _tag_versions.clear()
+    if _l1 is not None:
+        _l1.clear()
+
+
+def _tag_key(tag: str) -> str:
+    return f"{TAG_KEY_PREFIX}{tag}"
+
+
+def _is_tagged(value: Any) -> bool:
+    return isinstance(value, dict) and TAGS_MARKER in value
+
+
+def _remember_tag_versions(tags: list[str], raw_versions: list) -> dict[str, int]:
+    """Parse version đọc từ Redis và lưu lại trong worker (độc lập với L1)."""
+    now = time.monotonic()
+    versions = {}
+    for tag, raw in zip(tags, raw_versions):
+        versions[tag] = int(raw or 0)
+        _tag_versions.pop(tag, None)
+        if len(_tag_versions) >= TAG_VERSIONS_MAX_ENTRIES:
+            # Bỏ tag đọc lâu nhất (dict giữ thứ tự chèn)
+            _tag_versions.pop(next(iter(_tag_versions)))
+        _tag_versions[tag] = (versions[tag], now)
+    return versions
+
+
+def _known_tag_versions(values: list) -> tuple[dict[str, int], list[str]]:
+    """Version các tag mà values cần: phần worker đã biết và phần phải hỏi Redis.
+
+    Version lưu trong worker được làm mới qua kênh invalidation L1 (kể cả khi tắt
+    L1) và hết hạn sau CACHE_L1_TTL để không phụ thuộc hoàn toàn vào kênh đó.
+    """
+    _l1_refresher.maybe_refresh()
+    known: dict[str, int] = {}
+    missing: list[str] = []
+    now = time.monotonic()
+    for tag in {tag for value in values if _is_tagged(value) for tag in value[TAGS_MARKER]}:
+        entry = _tag_versions.get(tag)
+        if entry is not None and now - entry[1] < settings.cache_l1_ttl:
+            known[tag] = entry[0]
+        else:
+            missing.append(tag)
+    return known, missing
+
+
+def _unwrap_tagged(values: list, versions: dict[str, int] | None, fallback: Any) -> list:
+    """Bỏ envelope tag; entry có version cũ (hoặc không kiểm tra được) thành fallback."""
+    result = []
+    for value in values:
+        if not _is_tagged(value):
+            result.append(value)
+        elif versions is not None and all(
+            versions.get(tag) == version for tag, version in value[TAGS_MARKER].items()
+        ):
+            result.append(value["value"])
+        else:
+            _tag_stats["stale"] += 1
+            result.append(fallback)
+    return result
+
+
+def _check_tags(values: list, fallback: Any = None) -> list:
+    """Kiểm tra version tag cho các giá trị đã decode (client sync)."""
+    if not any(_is_tagged(value) for value in values):
+        return values
+    versions, missing = _known_tag_versions(values)
+    if missing:
+        _tag_stats["lookups"] += 1
+        try:
+            redis = get_redis_client()
+            if redis is None:
+                raise ConnectionError("Redis unavailable")
+            raw = redis.mget(*[_tag_key(tag) for tag in missing])
+            versions.update(_remember_tag_versions(missing, raw))
+        except Exception as e:
+            logger.warning(f"Không đọc được version tag, coi như miss: {e}")
+            versions = None
+    return _unwrap_tagged(values, versions, fallback)
+
+
+async def _async_check_tags(values: list, fallback: Any = None) -> list:
+    """Phiên bản async của `_check_tags`."""
+    if not any(_is_tagged(value) for value in values):
+        return values
+    versions, missing = _known_tag_versions(values)
+    if missing:
+        _tag_stats["lookups"] += 1
+        try:
+            redis = await get_async_redis_client()
+            if redis is None:
+                raise ConnectionError("Redis unavailable")
+            raw = await redis.mget(*[_tag_key(tag) for tag in missing])
+            versions.update(_remember_tag_versions(missing, raw))
+        except Exception as e:
+            logger.warning(f"Không đọc được version tag, coi như miss: {e}")
+            versions = None
+    return _unwrap_tagged(values, versions, fallback)
+
+
+def _tag_envelope(value: Any, tags: list[str], versions: dict[str, int]) -> dict:
+    return {TAGS_MARKER: {tag: versions[tag] for tag in tags}, "value": value}
+
+
+def invalidate_tag(*tags: str) -> bool:
+    """
+    Vô hiệu hóa mọi entry mang một trong các tag (tăng version, O(1) mỗi tag).
+
+    Returns:
+        True nếu thành công, False nếu Redis unavailable
+    """
+    if not tags:
+        return True
+    try:
+        redis = get_redis_client()
+        if redis is None:
+            logger.warning(f"Redis unavailable, bỏ qua invalidate tag {tags}")
+            return False
+        results = redis.pipeline(_invalidate_tag_commands(tags))
+        _after_invalidate_tags(tags, results)
+        return True
+    except Exception as e:
+        logger.error(f"Lỗi invalidate tag: {e}")
+        return False
+
+
+async def async_invalidate_tag(*tags: str) -> bool:
+    """Phiên bản async của `invalidate_tag`."""
+    if not tags:
+        return True
+    try:
+        redis = await get_async_redis_client()
+        if redis is None:
+            logger.warning(f"Redis unavailable, bỏ qua invalidate tag {tags}")
+            return False
+        results = await redis.pipeline(_invalidate_tag_commands(tags))
+        _after_invalidate_tags(tags, results)
+        return True
+    except Exception as e:
+        logger.error(f"Lỗi invalidate tag: {e}")
+        return False
+
+
+def _invalidate_tag_commands(tags: tuple[str, ...]) -> list[list[Any]]:
+    return [
+        *[["INCR", _tag_key(tag)] for tag in tags],
+        *_publish_commands([f"{TAG_INVALIDATION_PREFIX}{tag}" for tag in tags]),
+    ]
+
+
+def _after_invalidate_tags(tags: tuple[str, ...], results: list) -> None:
+    _tag_stats["invalidations"] += len(tags)
+    for tag, version in zip(tags, results):
+        if version is None:
+            _tag_versions.pop(tag, None)
+        else:
+            _remember_tag_versions([tag], [version])
+
+
+_codec = CacheCodec(settings.cache_compress_threshold)
 
+
+def _serialize(value: Any) -> str:
+    """Encode giá trị qua codec (UUID/datetime/Enum được hỗ trợ sẵn)."""
+    return _codec.encode(value)
+
+
+def _deserialize(value: str, fallback: Any = None) -> Any:
+    """Decode giá trị từ cache; envelope không đọc được coi như miss (trả fallback)."""
+    try:
+        return _codec.decode(value)
+    except (CodecError, ValueError) as e:
+        logger.warning(f"Không decode được giá trị cache: {e}")
+        return fallback
+
+
+@_timed("get")
 def cache_get(key: str, fallback: Any = None) -> Any:
     """
     Lấy giá trị từ cache với fallback.
@@ -21,31 +424,46 @@ def cache_get(key: str, fallback: Any = None) -> Any:
     Returns:
         Giá trị cached hoặc fallback
     """
+    local_value = _l1_get(key)
+    if local_value is not None:
+        cache_metrics.record(key, "hits_l1")
+        return _check_tags([_deserialize(local_value, fallback)], fallback)[0]
+
     try:
         redis = get_redis_client()
         if redis is None:
             logger.warning(f"Redis unavailable, trả về fallback cho {key}")
+            _record_fallback(key)
             return fallback
 
         value = redis.get(key)
         if value is None:
+            _l2_stats["misses"] += 1
+            cache_metrics.record(key, "misses")
             return fallback
 
-        # Thử parse JSON, fallback về string
-        try:
-            return json.loads(value)
-        except (json.JSONDecodeError, TypeError):
-            return value
+        _l2_stats["hits"] += 1
+        cache_metrics.record(key, "hits_l2")
+        cache_metrics.record(key, "bytes_read", len(value))
+        _l1_set(key, value)
+        return _check_tags([_deserialize(value, fallback)], fallback)[0]
 
     except RedisConnectionError:
+        _l2_stats["errors"] += 1
+        _record_fallback(key, error=True)
         logger.warning(f"Lỗi kết nối Redis, trả về fallback cho {key}")
         return fallback
     except Exception as e:
+        _l2_stats["errors"] += 1
+        _record_fallback(key, error=True)
         logger.error(f"Lỗi cache: {e}, trả về fallback")
         return fallback
 
 
-def cache_set(key: str, value: Any, ttl: int = 3600) -> bool:
+@_timed("set")
+def cache_set(
+    key: str, value: Any, ttl: int = 3600, tags: list[str] | None = None
+) -> bool:
     """
     Lưu giá trị vào cache.
 
@@ -53,6 +471,7 @@ def cache_set(key: str, value: Any, ttl: int = 3600) -> bool:
         key: Cache key
         value: Giá trị để cache (sẽ được JSON serialize)
         ttl: Thời gian sống tính bằng giây
+        tags: Tag để vô hiệu hóa theo nhóm bằng `invalidate_tag`
 
     Returns:
         True nếu thành công, False nếu Redis unavailable
@@ -61,23 +480,28 @@ def cache_set(key: str, value: Any, ttl: int = 3600) -> bool:
         redis = get_redis_client()
         if redis is None:
             logger.warning(f"Redis unavailable, bỏ qua cache set cho {key}")
+            _record_fallback(key)
             return False
 
-        # Serialize giá trị thành JSON
-        try:
-            serialized_value = json.dumps(value)
-        except (TypeError, ValueError):
-            # Nếu không thể serialize, chuyển thành string
-            serialized_value = str(value)
+        if tags:
+            versions = redis.mget(*[_tag_key(tag) for tag in tags])
+            value = _tag_envelope(value, tags, _remember_tag_versions(tags, versions))
 
-        redis.setex(key, ttl, serialized_value)
+        # Serialize giá trị thành JSON
+        serialized = _serialize(value)
+        redis.setex(key, ttl, serialized)
+        _l1_set(key, serialized, ttl)
+        cache_metrics.record(key, "sets")
+        cache_metrics.record(key, "bytes_written", len(serialized))
         return True
 
     except Exception as e:
+        _record_fallback(key, error=True)
         logger.error(f"Lỗi cache set: {e}")
         return False
 
 
+@_timed("delete")
 def cache_delete(key: str) -> bool:
     """
     Xóa giá trị khỏi cache.
@@ -86,18 +510,24 @@ def cache_delete(key: str) -> bool:
         key: Cache key cần xóa
 
     Returns:
-        True nếu thành công, False nếu Redis unavailable
+        True nếu thành công, False nếu Redis unavailable hoặc lệnh xóa lỗi
     """
+    _l1_delete([key])
     try:
         redis = get_redis_client()
         if redis is None:
             logger.warning(f"Redis unavailable, bỏ qua cache delete cho {key}")
+            _record_fallback(key)
             return False
 
-        redis.delete(key)
+        if _delete_failed(redis.pipeline(_delete_commands([key]))):
+            _record_fallback(key, error=True)
+            return False
+        cache_metrics.record(key, "deletes")
         return True
 
     except Exception as e:
+        _record_fallback(key, error=True)
         logger.error(f"Lỗi cache delete: {e}")
         return False
 
@@ -122,3 +552,678 @@ def cache_exists(key: str) -> bool:
     except Exception as e:
         logger.error(f"Lỗi kiểm tra cache exists: {e}")
         return False
+
+
+# Async variants: dùng client async, không chặn event loop trong request handler
+
+
+@_timed("get")
+async def async_cache_get(key: str, fallback: Any = None) -> Any:
+    """Phiên bản async của `cache_get`; L1 hit không chạm network."""
+    if invalidation_queue.is_pending(key):
+        # Key vừa ghi, chưa xóa xong ở Redis: coi như miss để không đọc giá trị cũ
+        return fallback
+    local_value = _l1_get(key)
+    if local_value is not None:
+        cache_metrics.record(key, "hits_l1")
+        return (await _async_check_tags([_deserialize(local_value, fallback)], fallback))[0]
+
+    try:
+        redis = await get_async_redis_client()
+        if redis is None:
+            logger.warning(f"Redis unavailable, trả về fallback cho {key}")
+            _record_fallback(key)
+            return fallback
+
+        value = await redis.get(key)
+        if value is None:
+            _l2_stats["misses"] += 1
+            cache_metrics.record(key, "misses")
+            return fallback
+
+        _l2_stats["hits"] += 1
+        cache_metrics.record(key, "hits_l2")
+        cache_metrics.record(key, "bytes_read", len(value))
+        _l1_set(key, value)
+        return (await _async_check_tags([_deserialize(value, fallback)], fallback))[0]
+
+    except Exception as e:
+        _l2_stats["errors"] += 1
+        _record_fallback(key, error=True)
+        logger.error(f"Lỗi cache: {e}, trả về fallback")
+        return fallback
+
+
+@_timed("set")
+async def async_cache_set(
+    key: str, value: Any, ttl: int = 3600, tags: list[str] | None = None
+) -> bool:
+    """Phiên bản async của `cache_set`."""
+    try:
+        redis = await get_async_redis_client()
+        if redis is None:
+            logger.warning(f"Redis unavailable, bỏ qua cache set cho {key}")
+            _record_fallback(key)
+            return False
+
+        if tags:
+            versions = await redis.mget(*[_tag_key(tag) for tag in tags])
+            value = _tag_envelope(value, tags, _remember_tag_versions(tags, versions))
+
+        serialized = _serialize(value)
+        await redis.setex(key, ttl, serialized)
+        _l1_set(key, serialized, ttl)
+        cache_metrics.record(key, "sets")
+        cache_metrics.record(key, "bytes_written", len(serialized))
+        return True
+
+    except Exception as e:
+        _record_fallback(key, error=True)
+        logger.error(f"Lỗi cache set: {e}")
+        return False
+
+
+@_timed("delete")
+async def async_cache_delete(key: str) -> bool:
+    """Phiên bản async của `cache_delete`."""
+    _l1_delete([key])
+    try:
+        redis = await get_async_redis_client()
+        if redis is None:
+            logger.warning(f"Redis unavailable, bỏ qua cache delete cho {key}")
+            _record_fallback(key)
+            return False
+
+        if _delete_failed(await redis.pipeline(_delete_commands([key]))):
+            _record_fallback(key, error=True)
+            return False
+        cache_metrics.record(key, "deletes")
+        return True
+
+    except Exception as e:
+        _record_fallback(key, error=True)
+        logger.error(f"Lỗi cache delete: {e}")
+        return False
+
+
+async def async_cache_exists(key: str) -> bool:
+    """Phiên bản async của `cache_exists`."""
+    try:
+        redis = await get_async_redis_client()
+        if redis is None:
+            return False
+
+        return bool(await redis.exists(key))
+
+    except Exception as e:
+        logger.error(f"Lỗi kiểm tra cache exists: {e}")
+        return False
+
+
+# Multi-key: một round trip cho nhiều key
+
+
+@_timed("get")
+def cache_get_many(keys: list[str], fallback: Any = None) -> dict[str, Any]:
+    """
+    Lấy nhiều giá trị bằng một lệnh MGET.
+
+    Returns:
+        Dict key -> giá trị (key miss hoặc Redis down nhận `fallback`)
+    """
+    if not keys:
+        return {}
+    result: dict[str, Any] = {}
+    remote_keys: list[str] = []
+    for key in keys:
+        local_value = _l1_get(key)
+        if local_value is None:
+            remote_keys.append(key)
+        else:
+            cache_metrics.record(key, "hits_l1")
+            result[key] = _deserialize(local_value, fallback)
+    try:
+        redis = get_redis_client() if remote_keys else None
+        if redis is None and remote_keys:
+            logger.warning(f"Redis unavailable, trả về fallback cho {len(remote_keys)} keys")
+            _record_fallback(remote_keys)
+        values = redis.mget(*remote_keys) if redis is not None else []
+    except Exception as e:
+        _l2_stats["errors"] += 1
+        _record_fallback(remote_keys, error=True)
+        logger.error(f"Lỗi cache get many: {e}, trả về fallback")
+        values = []
+
+    for key, value in zip(remote_keys, values):
+        if value is None:
+            _l2_stats["misses"] += 1
+            cache_metrics.record(key, "misses")
+        else:
+            _l2_stats["hits"] += 1
+            cache_metrics.record(key, "hits_l2")
+            cache_metrics.record(key, "bytes_read", len(value))
+            _l1_set(key, value)
+            result[key] = _deserialize(value, fallback)
+    for key in remote_keys:
+        result.setdefault(key, fallback)
+
+    checked = _check_tags(list(result.values()), fallback)
+    return dict(zip(result, checked))
+
+
+@_timed("set")
+def cache_set_many(
+    mapping: dict[str, Any],
+    ttl: int = 3600,
+    tags: dict[str, list[str]] | None = None,
+) -> bool:
+    """Lưu nhiều giá trị bằng một request pipeline (SETEX cho từng key).
+
+    `tags` map key -> danh sách tag của key đó (xem `cache_set`).
+    """
+    if not mapping:
+        return True
+    try:
+        redis = get_redis_client()
+        if redis is None:
+            logger.warning(f"Redis unavailable, bỏ qua cache set {len(mapping)} keys")
+            _record_fallback(mapping)
+            return False
+
+        if tags:
+            tag_names = sorted({tag for key_tags in tags.values() for tag in key_tags})
+            versions = _remember_tag_versions(
+                tag_names, redis.mget(*[_tag_key(tag) for tag in tag_names])
+            )
+            mapping = {
+                key: _tag_envelope(value, tags[key], versions) if tags.get(key) else value
+                for key, value in mapping.items()
+            }
+
+        serialized = {key: _serialize(value) for key, value in mapping.items()}
+        results = redis.pipeline(
+            [["SETEX", key, ttl, value] for key, value in serialized.items()]
+        )
+        return _store_set_results(serialized, ttl, results)
+
+    except Exception as e:
+        _record_fallback(mapping, error=True)
+        logger.error(f"Lỗi cache set many: {e}")
+        return False
+
+
+@_timed("delete")
+def cache_delete_many(keys: list[str]) -> bool:
+    """Xóa nhiều key bằng một lệnh DEL."""
+    if not keys:
+        return True
+    _l1_delete(keys)
+    try:
+        redis = get_redis_client()
+        if redis is None:
+            logger.warning(f"Redis unavailable, bỏ qua cache delete {len(keys)} keys")
+            _record_fallback(keys)
+            return False
+
+        if _delete_failed(redis.pipeline(_delete_commands(keys))):
+            _record_fallback(keys, error=True)
+            return False
+        cache_metrics.record_many(keys, "deletes")
+        return True
+
+    except Exception as e:
+        _record_fallback(keys, error=True)
+        logger.error(f"Lỗi cache delete many: {e}")
+        return False
+
+
+@_timed("get")
+async def async_cache_get_many(keys: list[str], fallback: Any = None) -> dict[str, Any]:
+    """Phiên bản async của `cache_get_many`."""
+    if not keys:
+        return {}
+    result: dict[str, Any] = {}
+    remote_keys: list[str] = []
+    for key in keys:
+        if invalidation_queue.is_pending(key):
+            result[key] = fallback
+            continue
+        local_value = _l1_get(key)
+        if local_value is None:
+            remote_keys.append(key)
+        else:
+            cache_metrics.record(key, "hits_l1")
+            result[key] = _deserialize(local_value, fallback)
+    try:
+        redis = await get_async_redis_client() if remote_keys else None
+        if redis is None and remote_keys:
+            logger.warning(f"Redis unavailable, trả về fallback cho {len(remote_keys)} keys")
+            _record_fallback(remote_keys)
+        values = await redis.mget(*remote_keys) if redis is not None else []
+    except Exception as e:
+        _l2_stats["errors"] += 1
+        _record_fallback(remote_keys, error=True)
+        logger.error(f"Lỗi cache get many: {e}, trả về fallback")
+        values = []
+
+    for key, value in zip(remote_keys, values):
+        if value is None:
+            _l2_stats["misses"] += 1
+            cache_metrics.record(key, "misses")
+        else:
+            _l2_stats["hits"] += 1
+            cache_metrics.record(key, "hits_l2")
+            cache_metrics.record(key, "bytes_read", len(value))
+            _l1_set(key, value)
+            result[key] = _deserialize(value, fallback)
+    for key in remote_keys:
+        result.setdefault(key, fallback)
+
+    checked = await _async_check_tags(list(result.values()), fallback)
+    return dict(zip(result, checked))
+
+
+@_timed("set")
+async def async_cache_set_many(
+    mapping: dict[str, Any],
+    ttl: int = 3600,
+    tags: dict[str, list[str]] | None = None,
+) -> bool:
+    """Phiên bản async của `cache_set_many`."""
+    if not mapping:
+        return True
+    try:
+        redis = await get_async_redis_client()
+        if redis is None:
+            logger.warning(f"Redis unavailable, bỏ qua cache set {len(mapping)} keys")
+            _record_fallback(mapping)
+            return False
+
+        if tags:
+            tag_names = sorted({tag for key_tags in tags.values() for tag in key_tags})
+            versions = _remember_tag_versions(
+                tag_names, await redis.mget(*[_tag_key(tag) for tag in tag_names])
+            )
+            mapping = {
+                key: _tag_envelope(value, tags[key], versions) if tags.get(key) else value
+                for key, value in mapping.items()
+            }
+
+        serialized = {key: _serialize(value) for key, value in mapping.items()}
+        results = await redis.pipeline(
+            [["SETEX", key, ttl, value] for key, value in serialized.items()]
+        )
+        return _store_set_results(serialized, ttl, results)
+
+    except Exception as e:
+        _record_fallback(mapping, error=True)
+        logger.error(f"Lỗi cache set many: {e}")
+        return False
+
+
+@_timed("delete")
+async def async_cache_delete_many(keys: list[str]) -> bool:
+    """Phiên bản async của `cache_delete_many`."""
+    if not keys:
+        return True
+    _l1_delete(keys)
+    try:
+        redis = await get_async_redis_client()
+        if redis is None:
+            logger.warning(f"Redis unavailable, bỏ qua cache delete {len(keys)} keys")
+            _record_fallback(keys)
+            return False
+
+        if _delete_failed(await redis.pipeline(_delete_commands(keys))):
+            _record_fallback(keys, error=True)
+            return False
+        cache_metrics.record_many(keys, "deletes")
+        return True
+
+    except Exception as e:
+        _record_fallback(keys, error=True)
+        logger.error(f"Lỗi cache delete many: {e}")
+        return False
+
+
+async def _flush_invalidations(keys: list[str]) -> None:
+    """Xóa một lô key ở L2 (raise để hàng đợi thử lại)."""
+    redis = await get_async_redis_client()
+    if redis is None:
+        raise RedisConnectionError("Redis unavailable")
+    if _delete_failed(await redis.pipeline(_delete_commands(keys))):
+        raise RedisError(f"Lệnh xóa {len(keys)} key lỗi trong pipeline")
+
+
+invalidation_queue = InvalidationQueue(
+    _flush_invalidations,
+    flush_interval=settings.cache_invalidation_flush_interval,
+    batch_size=settings.cache_invalidation_batch_size,
+    max_retries=settings.cache_invalidation_max_retries,
+    retry_base=settings.cache_invalidation_retry_base,
+    retry_max=settings.cache_invalidation_retry_max,
+)
+
+
+def async_cache_invalidate(*keys: str) -> None:
+    """
+    Vô hiệu hóa key mà không chờ Redis (dùng sau khi commit ghi DB).
+
+    L1 của worker hiện tại bị xóa ngay; L2 và L1 của worker khác được xóa theo
+    lô bởi hàng đợi nền, có thử lại khi Redis lỗi. Trong lúc chờ, các hàm đọc
+    async coi key là miss.
+    """
+    _l1_delete(list(keys))
+    cache_metrics.record_many(keys, "deletes")
+    invalidation_queue.enqueue(*keys)
+
+
+class CachePipeline:
+    """Gom các lệnh cache rồi gửi trong một request khi thoát context.
+
+    Dùng được cả `with pipeline() as pipe:` (client sync) lẫn
+    `async with pipeline() as pipe:` (client async). Kết quả nằm trong
+    `pipe.results` theo thứ tự lệnh; giá trị GET đã được parse JSON.
+    Khi Redis unavailable hoặc lỗi, `results` chứa None cho mọi lệnh.
+    """
+
+    def __init__(self, transaction: bool = False):
+        self.transaction = transaction
+        self.commands: list[list[Any]] = []
+        self.results: list[Any] = []
+
+    def get(self, key: str) -> int:
+        """Thêm lệnh GET, trả về vị trí kết quả trong `results`."""
+        self.commands.append(["GET", key])
+        return len(self.commands) - 1
+
+    def set(self, key: str, value: Any, ttl: int = 3600) -> int:
+        _l1_delete([key])
+        self.commands.append(["SETEX", key, ttl, _serialize(value)])
+        return len(self.commands) - 1
+
+    def delete(self, *keys: str) -> int:
+        """Thêm lệnh DEL (L1 bị xóa ngay, các worker khác được báo khi flush)."""
+        _l1_delete(list(keys))
+        commands = _delete_commands(list(keys))
+        self.commands.extend(commands)
+        return len(self.commands) - len(commands)
+
+    def exists(self, key: str) -> int:
+        self.commands.append(["EXISTS", key])
+        return len(self.commands) - 1
+
+    def execute(self, *command: Any) -> int:
+        """Thêm lệnh Redis bất kỳ."""
+        self.commands.append(list(command))
+        return len(self.commands) - 1
+
+    def _decode(self, raw_results: list) -> list:
+        return [
+            _deserialize(result)
+            if command[0] == "GET" and result is not None
+            else result
+            for command, result in zip(self.commands, raw_results)
+        ]
+
+    def flush(self) -> list:
+        """Gửi các lệnh qua client sync."""
+        raw_results: list = [None] * len(self.commands)
+        try:
+            redis = get_redis_client()
+            if redis is None:
+                logger.warning("Redis unavailable, bỏ qua cache pipeline")
+            elif self.commands:
+                raw_results = redis.pipeline(self.commands, self.transaction)
+        except Exception as e:
+            logger.error(f"Lỗi cache pipeline: {e}")
+        self.results = _check_tags(self._decode(raw_results))
+        self.commands = []
+        return self.results
+
+    async def async_flush(self) -> list:
+        """Gửi các lệnh qua client async."""
+        raw_results: list = [None] * len(self.commands)
+        try:
+            redis = await get_async_redis_client()
+            if redis is None:
+                logger.warning("Redis unavailable, bỏ qua cache pipeline")
+            elif self.commands:
+                raw_results = await redis.pipeline(self.commands, self.transaction)
+        except Exception as e:
+            logger.error(f"Lỗi cache pipeline: {e}")
+        self.results = await _async_check_tags(self._decode(raw_results))
+        self.commands = []
+        return self.results
+
+    def __enter__(self) -> "CachePipeline":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.flush()
+
+    async def __aenter__(self) -> "CachePipeline":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            await self.async_flush()
+
+
+def pipeline(transaction: bool = False) -> CachePipeline:
+    """
+    Tạo pipeline cache; `transaction=True` dùng endpoint MULTI/EXEC.
+
+    Ví dụ:
+        async with pipeline() as pipe:
+            pipe.set("a", 1)
+            index = pipe.get("b")
+        value = pipe.results[index]
+    """
+    return CachePipeline(transaction)
+
+
+# Envelope cho giá trị do get_or_load ghi: kèm thời gian nạp và thời điểm hết hạn
+LOADED_MARKER = "__loaded__"
+LOCK_KEY_PREFIX = "lock:"
+LOCK_POLL_INTERVAL = 0.05
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+_MISSING = object()
+# Request dẫn đầu bị hủy: request đang chờ tự nạp lại bằng loader của mình
+_RETRY = object()
+_inflight: dict[str, asyncio.Future] = {}
+_load_stats = {
+    "hits": 0,
+    "negative_hits": 0,
+    "loads": 0,
+    "coalesced": 0,
+    "early_refreshes": 0,
+    "lock_waits": 0,
+}
+
+
+def loaded_envelope(value: Any, ttl: int, delta: float = 0.0) -> dict:
+    """Envelope như get_or_load ghi (cho code nạp sẵn cache, vd. warmup).
+
+    `delta` là thời gian nạp (giây), dùng cho XFetch làm mới sớm.
+    """
+    return {LOADED_MARKER: 1, "value": value, "delta": delta, "expiry": time.time() + ttl}
+
+
+def unwrap_loaded(raw: Any) -> Any:
+    """Lấy giá trị thật từ envelope của get_or_load (tombstone -> None)."""
+    if isinstance(raw, dict) and LOADED_MARKER in raw:
+        return raw["value"]
+    return raw
+
+
+def _should_refresh_early(envelope: dict, beta: float) -> bool:
+    """XFetch: nạp lại sớm với xác suất tăng dần khi gần hết hạn.
+
+    Điều kiện `now - delta * beta * ln(rand) >= expiry`, delta là thời gian nạp:
+    key nạp chậm được làm mới sớm hơn.
+    """
+    delta = float(envelope.get("delta") or 0.0)
+    expiry = float(envelope.get("expiry") or 0.0)
+    return time.time() - delta * beta * math.log(1.0 - random.random()) >= expiry
+
+
+async def get_or_load(
+    key: str,
+    loader: Callable[[], Awaitable[Any]],
+    ttl: int = 3600,
+    *,
+    negative_ttl: int = 0,
+    lock: bool = False,
+    lock_timeout: float = 5.0,
+    beta: float = 1.0,
+    tags: list[str] | Callable[[Any], list[str]] | None = None,
+) -> Any:
+    """
+    Đọc key từ cache, nếu miss thì gọi `loader()` và ghi lại (chống cache stampede).
+
+    - Các request đồng thời trong cùng worker dùng chung một lần nạp (single-flight).
+    - `lock=True`: chỉ một worker nạp nhờ khóa `SET NX` trên Redis, worker khác
+      chờ giá trị xuất hiện trong cache (tối đa `lock_timeout` giây).
+    - Trước khi hết TTL, một request có thể nạp lại sớm theo XFetch (`beta`).
+    - `loader()` trả về None: lưu tombstone trong `negative_ttl` giây (0 = không lưu).
+    - `tags`: danh sách tag hoặc hàm nhận giá trị vừa nạp, trả về danh sách tag.
+
+    Trả về:
+        Giá trị đã cache hoặc vừa nạp; None nếu không tồn tại
+    """
+    raw = await async_cache_get(key, _MISSING)
+    if isinstance(raw, dict) and LOADED_MARKER in raw:
+        if not _should_refresh_early(raw, beta):
+            _load_stats["negative_hits" if raw["value"] is None else "hits"] += 1
+            return raw["value"]
+        if key in _inflight:
+            # Đã có request khác đang làm mới: trả giá trị hiện tại
+            _load_stats["hits"] += 1
+            return raw["value"]
+        _load_stats["early_refreshes"] += 1
+    elif raw is not _MISSING:
+        # Giá trị ghi bởi cache_set thông thường
+        _load_stats["hits"] += 1
+        return raw
+
+    future = _inflight.get(key)
+    if future is not None:
+        _load_stats["coalesced"] += 1
+        value = await asyncio.shield(future)
+        if value is _RETRY:
+            return await get_or_load(
+                key,
+                loader,
+                ttl,
+                negative_ttl=negative_ttl,
+                lock=lock,
+                lock_timeout=lock_timeout,
+                beta=beta,
+                tags=tags,
+            )
+        return value
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        value = await _load_and_store(
+            key, loader, ttl, negative_ttl, lock, lock_timeout, tags
+        )
+    except BaseException as e:
+        if isinstance(e, asyncio.CancelledError):
+            # Không hủy future dùng chung: một client ngắt kết nối không được
+            # làm hỏng request của người khác đang chờ cùng key
+            future.set_result(_RETRY)
+        else:
+            future.set_exception(e)
+            future.exception()  # Đánh dấu đã đọc khi không có request nào chờ
+        raise
+    else:
+        future.set_result(value)
+        return value
+    finally:
+        _inflight.pop(key, None)
+
+
+async def _load_and_store(
+    key: str,
+    loader: Callable[[], Awaitable[Any]],
+    ttl: int,
+    negative_ttl: int,
+    lock: bool,
+    lock_timeout: float,
+    tags: list[str] | Callable[[Any], list[str]] | None,
+) -> Any:
+    token = None
+    if lock:
+        token = await _acquire_lock(key, lock_timeout)
+        if token is None:
+            # Worker khác đang nạp: chờ giá trị của worker đó
+            _load_stats["lock_waits"] += 1
+            value = await _wait_for_value(key, lock_timeout)
+            if value is not _MISSING:
+                return value
+
+    try:
+        _load_stats["loads"] += 1
+        started = time.monotonic()
+        value = await loader()
+        delta = round(time.monotonic() - started, 4)
+        entry_ttl = ttl if value is not None else negative_ttl
+        if entry_ttl > 0:
+            envelope = loaded_envelope(value, entry_ttl, delta)
+            entry_tags = tags(value) if callable(tags) else tags
+            await async_cache_set(key, envelope, ttl=entry_ttl, tags=entry_tags)
+        return value
+    finally:
+        if token:
+            await _release_lock(key, token)
+
+
+async def _acquire_lock(key: str, lock_timeout: float) -> str | None:
+    """Lấy khóa nạp trên Redis. Trả về token, None nếu worker khác đang giữ.
+
+    Redis unavailable thì trả về chuỗi rỗng: nạp luôn, không cần khóa.
+    """
+    try:
+        redis = await get_async_redis_client()
+        if redis is None:
+            return ""
+        token = uuid.uuid4().hex
+        acquired = await redis.execute(
+            "SET", f"{LOCK_KEY_PREFIX}{key}", token, "NX", "PX", int(lock_timeout * 1000)
+        )
+        return token if acquired == "OK" else None
+    except Exception as e:
+        logger.warning(f"Không lấy được khóa nạp cho {key}: {e}")
+        return ""
+
+
+async def _release_lock(key: str, token: str) -> None:
+    try:
+        redis = await get_async_redis_client()
+        if redis is not None:
+            await redis.execute(
+                "EVAL", _RELEASE_LOCK_SCRIPT, 1, f"{LOCK_KEY_PREFIX}{key}", token
+            )
+    except Exception as e:
+        # Khóa tự hết hạn sau lock_timeout
+        logger.warning(f"Không nhả được khóa nạp cho {key}: {e}")
+
+
+async def _wait_for_value(key: str, timeout: float) -> Any:
+    """Chờ giá trị do worker giữ khóa ghi vào cache; hết thời gian trả về _MISSING."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+        raw = await async_cache_get(key, _MISSING)
+        if raw is not _MISSING:
+            return unwrap_loaded(raw)
+    return _MISSING
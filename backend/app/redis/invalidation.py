@@ -0,0 +1,168 @@
+"""Hàng đợi invalidation cache chạy nền trong process.
+
+Request ghi chỉ đưa key vào hàng đợi rồi trả về ngay; task nền gom các key
+trong `flush_interval` giây (key trùng chỉ giữ một lần) và gửi mỗi lô tối đa
+`batch_size` key trong một pipeline. Lô lỗi được đưa lại hàng đợi và thử lại
+với backoff tăng gấp đôi; quá `max_retries` lần thì bỏ (entry hết hạn theo TTL).
+
+Trong lúc key còn chờ xóa, `is_pending()` trả về True để lớp đọc bỏ qua cache,
+tránh trả giá trị cũ ngay sau khi ghi.
+"""
+
+import asyncio
+import random
+from typing import Awaitable, Callable
+
+from app.core.logging import logger
+
+
+class InvalidationQueue:
+    """Gom và xóa key cache theo lô bằng một task asyncio nền."""
+
+    def __init__(
+        self,
+        flush: Callable[[list[str]], Awaitable[None]],
+        flush_interval: float = 0.02,
+        batch_size: int = 500,
+        max_retries: int = 5,
+        retry_base: float = 0.2,
+        retry_max: float = 10.0,
+    ):
+        # `flush(keys)` raise khi xóa thất bại
+        self._flush = flush
+        self.flush_interval = flush_interval
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        # key -> số lần đã thử (dict giữ thứ tự enqueue)
+        self._pending: dict[str, int] = {}
+        self._inflight: set[str] = set()
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stats = {
+            "enqueued": 0,
+            "coalesced": 0,
+            "flushed": 0,
+            "batches": 0,
+            "retries": 0,
+            "dropped": 0,
+        }
+
+    def enqueue(self, *keys: str) -> None:
+        """Đưa key vào hàng đợi; phải gọi trong event loop đang chạy."""
+        for key in keys:
+            self._stats["enqueued"] += 1
+            if key in self._pending:
+                self._stats["coalesced"] += 1
+            else:
+                self._pending[key] = 0
+        self._ensure_worker()
+        self._wakeup.set()
+
+    def is_pending(self, key: str) -> bool:
+        return key in self._pending or key in self._inflight
+
+    def __len__(self) -> int:
+        return len(self._pending) + len(self._inflight)
+
+    def _ensure_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        # Lần đầu hoặc event loop mới (ví dụ test): tạo lại task
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # Chờ một cửa sổ ngắn để gom các key của những request ghi đồng thời
+            await asyncio.sleep(self.flush_interval)
+            while self._pending:
+                delay = await self._flush_batch()
+                if delay:
+                    await asyncio.sleep(delay)
+
+    def _take_batch(self) -> dict[str, int]:
+        batch = {}
+        for key in list(self._pending)[: self.batch_size]:
+            batch[key] = self._pending.pop(key)
+        self._inflight.update(batch)
+        return batch
+
+    async def _flush_batch(self) -> float:
+        """Gửi một lô; trả về số giây cần chờ trước lần thử lại (0 nếu thành công)."""
+        batch = self._take_batch()
+        try:
+            await self._flush(list(batch))
+        except asyncio.CancelledError:
+            # Task bị hủy giữa chừng (drain): trả lô về hàng đợi
+            for key, attempts in batch.items():
+                self._pending.setdefault(key, attempts)
+            raise
+        except Exception as e:
+            return self._requeue(batch, e)
+        else:
+            self._stats["flushed"] += len(batch)
+            self._stats["batches"] += 1
+            return 0.0
+        finally:
+            self._inflight.difference_update(batch)
+
+    def _requeue(self, batch: dict[str, int], error: Exception) -> float:
+        attempt = max(batch.values()) + 1
+        dropped = 0
+        for key, attempts in batch.items():
+            if attempts + 1 > self.max_retries:
+                dropped += 1
+            else:
+                # Key được enqueue lại trong lúc gửi thì giữ nguyên số lần thử mới
+                self._pending.setdefault(key, attempts + 1)
+        self._stats["retries"] += 1
+        self._stats["dropped"] += dropped
+        if dropped:
+            logger.error(
+                f"Bỏ invalidation {dropped} key sau {self.max_retries} lần thử: {error}"
+            )
+        else:
+            logger.warning(f"Invalidation {len(batch)} key thất bại, thử lại: {error}")
+        backoff = min(self.retry_max, self.retry_base * 2 ** (attempt - 1))
+        return backoff * random.uniform(0.8, 1.2)
+
+    async def drain(self, timeout: float = 5.0) -> bool:
+        """Xóa hết key còn chờ (khi tắt ứng dụng). False nếu hết thời gian."""
+        if self._task is not None and self._loop is not asyncio.get_running_loop():
+            self._task = None
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        async def _flush_all() -> None:
+            while self._pending:
+                delay = await self._flush_batch()
+                if delay:
+                    await asyncio.sleep(delay)
+
+        try:
+            await asyncio.wait_for(_flush_all(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Hết thời gian drain hàng đợi invalidation, còn {len(self)} key"
+            )
+            return False
+
+    def clear(self) -> None:
+        self._pending.clear()
+        self._inflight.clear()
+
+    def stats(self) -> dict:
+        return {**self._stats, "pending": len(self)}
@@ -0,0 +1,100 @@
+"""Cache L1 trong process: LRU giới hạn theo dung lượng, TTL theo từng entry."""
+
+import threading
+import time
+from collections import OrderedDict
+
+# Ước lượng overhead mỗi entry (key, tuple, node OrderedDict)
+ENTRY_OVERHEAD_BYTES = 200
+
+
+class LocalCache:
+    """LRU lưu giá trị đã serialize (str), giới hạn tổng số byte.
+
+    Giữ bản serialize để mỗi lần hit trả về object mới (caller có thể sửa thoải mái)
+    và để đo dung lượng chính xác.
+    """
+
+    def __init__(self, max_bytes: int, default_ttl: float):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._entries: OrderedDict[str, tuple[str, float, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size(key: str, value: str) -> int:
+        return len(key) + len(value) + ENTRY_OVERHEAD_BYTES
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, size = entry
+            if expires_at <= time.monotonic():
+                self._remove(key, size)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str, ttl: float | None = None) -> bool:
+        size = self._size(key, value)
+        if size > self.max_bytes:
+            return False
+        ttl = self.default_ttl if ttl is None else min(ttl, self.default_ttl)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[2]
+            self._entries[key] = (value, time.monotonic() + ttl, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                evicted_key, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+        return True
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            self._remove(key, entry[2])
+            self.invalidations += 1
+            return True
+
+    def _remove(self, key: str, size: int) -> None:
+        del self._entries[key]
+        self.current_bytes -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
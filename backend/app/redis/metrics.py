@@ -0,0 +1,166 @@
+"""Metrics cho lớp cache, gom theo namespace (phần key trước dấu `:` đầu tiên).
+
+Bộ đếm và histogram là dict/list thuần, tăng không lấy lock: dưới GIL mỗi lần
+cập nhật rất rẻ, đổi lại có thể lệch vài đơn vị khi nhiều thread ghi cùng lúc —
+chấp nhận được cho số liệu quan sát. Lock chỉ dùng khi gặp namespace mới.
+"""
+
+import bisect
+import threading
+from typing import Iterable
+
+# Giây, theo kiểu bucket của Prometheus (bucket cuối là +Inf)
+LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+)
+COUNTERS = (
+    "hits_l1",
+    "hits_l2",
+    "misses",
+    "sets",
+    "deletes",
+    "errors",
+    "fallbacks",
+    "bytes_read",
+    "bytes_written",
+)
+OPERATIONS = ("get", "set", "delete")
+# Giới hạn số namespace để key sinh động không làm phình bộ nhớ
+MAX_NAMESPACES = 64
+OVERFLOW_NAMESPACE = "_other"
+DEFAULT_NAMESPACE = "_default"
+
+
+def namespace_of(key: str) -> str:
+    prefix, sep, _ = key.partition(":")
+    return prefix if sep and prefix else DEFAULT_NAMESPACE
+
+
+class LatencyHistogram:
+    """Histogram độ trễ (giây) với bucket cộng dồn theo `LATENCY_BUCKETS`."""
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def snapshot(self) -> dict:
+        cumulative, buckets = 0, {}
+        for bound, count in zip((*LATENCY_BUCKETS, float("inf")), self.counts):
+            cumulative += count
+            buckets["+Inf" if bound == float("inf") else repr(bound)] = cumulative
+        return {"count": self.count, "sum": round(self.total, 6), "buckets": buckets}
+
+
+class _NamespaceMetrics:
+    __slots__ = ("counters", "latency")
+
+    def __init__(self):
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.latency = {operation: LatencyHistogram() for operation in OPERATIONS}
+
+
+class CacheMetrics:
+    """Bộ đếm và histogram độ trễ cho từng namespace key."""
+
+    def __init__(self, max_namespaces: int = MAX_NAMESPACES):
+        self.max_namespaces = max_namespaces
+        self._namespaces: dict[str, _NamespaceMetrics] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> _NamespaceMetrics:
+        name = namespace_of(key)
+        metrics = self._namespaces.get(name)
+        if metrics is None:
+            with self._lock:
+                if len(self._namespaces) >= self.max_namespaces:
+                    name = OVERFLOW_NAMESPACE
+                metrics = self._namespaces.setdefault(name, _NamespaceMetrics())
+        return metrics
+
+    def record(self, key: str, counter: str, amount: int = 1) -> None:
+        self._get(key).counters[counter] += amount
+
+    def record_many(self, keys: Iterable[str], counter: str) -> None:
+        for key in keys:
+            self._get(key).counters[counter] += 1
+
+    def observe(self, operation: str, keys: str | Iterable[str], seconds: float) -> None:
+        """Ghi độ trễ một lời gọi; lời gọi nhiều key tính một lần cho mỗi namespace."""
+        if isinstance(keys, str):
+            self._get(keys).latency[operation].observe(seconds)
+            return
+        seen = set()
+        for key in keys:
+            metrics = self._get(key)
+            if id(metrics) not in seen:
+                seen.add(id(metrics))
+                metrics.latency[operation].observe(seconds)
+
+    def snapshot(self) -> dict:
+        result = {}
+        for name, metrics in list(self._namespaces.items()):
+            counters = dict(metrics.counters)
+            lookups = counters["hits_l1"] + counters["hits_l2"] + counters["misses"]
+            hits = counters["hits_l1"] + counters["hits_l2"]
+            result[name] = {
+                **counters,
+                "hit_rate": round(hits / lookups, 4) if lookups else None,
+                "latency_seconds": {
+                    operation: histogram.snapshot()
+                    for operation, histogram in metrics.latency.items()
+                },
+            }
+        return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._namespaces.clear()
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(snapshot: dict, gauges: dict[str, float] | None = None) -> str:
+    """Xuất snapshot của `CacheMetrics` theo định dạng text exposition của Prometheus."""
+    lines = []
+    for counter in COUNTERS:
+        metric = f"zenspa_cache_{counter}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for name, data in snapshot.items():
+            lines.append(f'{metric}{{namespace="{escape_label(name)}"}} {data[counter]}')
+
+    metric = "zenspa_cache_operation_seconds"
+    lines.append(f"# TYPE {metric} histogram")
+    for name, data in snapshot.items():
+        for operation, histogram in data["latency_seconds"].items():
+            labels = f'namespace="{escape_label(name)}",operation="{operation}"'
+            for bound, count in histogram["buckets"].items():
+                lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f"{metric}_sum{{{labels}}} {histogram['sum']}")
+            lines.append(f"{metric}_count{{{labels}}} {histogram['count']}")
+
+    for metric, value in (gauges or {}).items():
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,264 @@
+"""Cache kết quả truy vấn async theo khai báo: `@cached_query(ttl, depends_on)`.
+
+    @cached_query(ttl=600, depends_on=[Profile, UserRoleLink])
+    async def count_staff(session: AsyncSession, branch_id: UUID) -> int: ...
+
+Key dựng từ tên hàm và tham số (bỏ qua session), kết quả lưu qua `get_or_load`
+với tag `table:<bảng>` cho từng bảng phụ thuộc. Hook của SQLAlchemy ghi nhận các
+bảng bị ghi trong transaction (flush ORM và `insert/update/delete` trực tiếp);
+sau commit, tag các bảng đó được tăng version nên mọi entry phụ thuộc hết hiệu lực.
+Chỉ bảng có trong `depends_on` của ít nhất một hàm được theo dõi: ghi vào bảng
+khác không tốn thêm lệnh Redis nào.
+
+Kết quả phải serialize được bằng codec cache (dict/list/giá trị đơn), không trả
+về object ORM. Trong transaction đã ghi vào bảng phụ thuộc, hàm đọc thẳng DB.
+"""
+
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+from typing import Any, Awaitable, Callable, Iterable
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession as SAAsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.logging import logger
+from app.redis.helpers import async_invalidate_tag, get_or_load
+
+QUERY_KEY_PREFIX = "query:"
+TABLE_TAG_PREFIX = "table:"
+_WRITTEN_TABLES = "cache_written_tables"
+
+# Bảng được khai báo trong depends_on của các hàm @cached_query
+_cached_tables: set[str] = set()
+# Bảng vừa commit, đang chờ tăng version tag: đọc thẳng DB như hàng đợi invalidation
+_pending_tables: dict[str, int] = {}
+_tasks: set[asyncio.Task] = set()
+_stats = {"calls": 0, "bypassed": 0, "invalidations": 0}
+
+
+def table_tag(table: str) -> str:
+    return f"{TABLE_TAG_PREFIX}{table}"
+
+
+def _table_name(dependency: Any) -> str:
+    if isinstance(dependency, str):
+        return dependency
+    table = getattr(dependency, "__table__", None)
+    if table is None:
+        raise TypeError(f"depends_on cần model SQLModel hoặc tên bảng, nhận {dependency!r}")
+    return table.name
+
+
+def _key_part(value: Any) -> Any:
+    """Dạng ổn định của một tham số (UUID, enum, datetime -> chuỗi)."""
+    if isinstance(value, (list, tuple, set, frozenset)):
+        parts = [_key_part(item) for item in value]
+        return sorted(parts, key=repr) if isinstance(value, (set, frozenset)) else parts
+    if isinstance(value, dict):
+        return {str(k): _key_part(v) for k, v in value.items()}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(getattr(value, "value", value))
+
+
+def _is_session(value: Any) -> bool:
+    return isinstance(value, (Session, SAAsyncSession))
+
+
+def _sync_session(session: Any) -> Session:
+    return session.sync_session if isinstance(session, SAAsyncSession) else session
+
+
+class _CachedQuery:
+    def __init__(
+        self,
+        func: Callable[..., Awaitable[Any]],
+        ttl: int,
+        tables: tuple[str, ...],
+        key_prefix: str | None,
+        negative_ttl: int,
+        lock: bool,
+    ):
+        self.func = func
+        self.ttl = ttl
+        self.tables = tables
+        self.tags = [table_tag(table) for table in tables]
+        self.negative_ttl = negative_ttl
+        self.lock = lock
+        self.signature = inspect.signature(func)
+        self.key_prefix = key_prefix or f"{func.__module__}.{func.__qualname__}"
+
+    def cache_key(self, *args, **kwargs) -> str:
+        bound = self.signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        params = {
+            name: _key_part(value)
+            for name, value in bound.arguments.items()
+            if not _is_session(value)
+        }
+        digest = hashlib.sha1(
+            json.dumps(params, sort_keys=True, separators=(",", ":")).encode()
+        ).hexdigest()[:16]
+        return f"{QUERY_KEY_PREFIX}{self.key_prefix}:{digest}"
+
+    def _bypass(self, args, kwargs) -> bool:
+        """Đọc thẳng DB khi bảng phụ thuộc đang chờ invalidation hoặc bị ghi trong session."""
+        if any(table in _pending_tables for table in self.tables):
+            return True
+        for value in (*args, *kwargs.values()):
+            if _is_session(value):
+                session = _sync_session(value)
+                written = session.info.get(_WRITTEN_TABLES, ())
+                if session.new or session.dirty or session.deleted:
+                    written = {*written, *_tables_of(session)}
+                if any(table in written for table in self.tables):
+                    return True
+        return False
+
+    async def __call__(self, *args, **kwargs):
+        if self._bypass(args, kwargs):
+            _stats["bypassed"] += 1
+            return await self.func(*args, **kwargs)
+        _stats["calls"] += 1
+        return await get_or_load(
+            self.cache_key(*args, **kwargs),
+            lambda: self.func(*args, **kwargs),
+            ttl=self.ttl,
+            negative_ttl=self.negative_ttl,
+            lock=self.lock,
+            tags=self.tags,
+        )
+
+
+def cached_query(
+    ttl: int = 3600,
+    depends_on: Iterable[Any] = (),
+    *,
+    key_prefix: str | None = None,
+    negative_ttl: int = 0,
+    lock: bool = False,
+):
+    """Decorator cache kết quả của hàm service async theo tham số.
+
+    - `depends_on`: model hoặc tên bảng; ghi vào bảng nào làm entry hết hiệu lực.
+    - `key_prefix`: mặc định `<module>.<tên hàm>`; đặt cố định nếu hay đổi tên.
+    - `negative_ttl`, `lock`: như `get_or_load`.
+
+    Hàm được bọc có thêm `cache_key(*args, **kwargs)` để tự xóa một entry.
+    """
+    tables = tuple(dict.fromkeys(_table_name(dependency) for dependency in depends_on))
+    if not tables:
+        raise ValueError("cached_query cần ít nhất một bảng trong depends_on")
+
+    def decorator(func):
+        if not inspect.iscoroutinefunction(func):
+            raise TypeError("cached_query chỉ dùng cho hàm async")
+        cached = _CachedQuery(func, ttl, tables, key_prefix, negative_ttl, lock)
+        _cached_tables.update(tables)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await cached(*args, **kwargs)
+
+        wrapper.cache_key = cached.cache_key
+        wrapper.tables = tables
+        return wrapper
+
+    return decorator
+
+
+def _mark_pending(tables: Iterable[str]) -> None:
+    for table in tables:
+        _pending_tables[table] = _pending_tables.get(table, 0) + 1
+
+
+def _unmark_pending(tables: Iterable[str]) -> None:
+    for table in tables:
+        _pending_tables[table] -= 1
+        if not _pending_tables[table]:
+            del _pending_tables[table]
+
+
+async def invalidate_tables(*tables: str) -> bool:
+    """Làm mọi entry phụ thuộc các bảng hết hiệu lực (tăng version tag)."""
+    _mark_pending(tables)
+    try:
+        _stats["invalidations"] += len(tables)
+        return await async_invalidate_tag(*(table_tag(table) for table in tables))
+    finally:
+        _unmark_pending(tables)
+
+
+def query_cache_stats() -> dict:
+    return {
+        **_stats,
+        "tables": sorted(_cached_tables),
+        "pending_tables": sorted(_pending_tables),
+    }
+
+
+# Hook SQLAlchemy: ghi nhận bảng bị ghi, invalidation sau commit
+
+
+def _tables_of(session: Session) -> set[str]:
+    return {
+        obj.__table__.name
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if hasattr(obj, "__table__")
+    }
+
+
+def _remember_written(session: Session, tables: Iterable[str]) -> None:
+    tables = _cached_tables.intersection(tables)
+    if tables:
+        session.info.setdefault(_WRITTEN_TABLES, set()).update(tables)
+
+
+@event.listens_for(Session, "before_flush")
+def _track_flush(session: Session, flush_context, instances) -> None:
+    if _cached_tables:
+        _remember_written(session, _tables_of(session))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_write(orm_execute_state) -> None:
+    state = orm_execute_state
+    if state.is_insert or state.is_update or state.is_delete:
+        table = getattr(state.statement, "table", None)
+        if table is not None and getattr(table, "name", None):
+            _remember_written(state.session, [table.name])
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    tables = session.info.pop(_WRITTEN_TABLES, None)
+    if not tables:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Session sync ngoài event loop (script, migration): không có cache async để xóa
+        return
+    # Đánh dấu ngay để request đọc sau commit không nhận entry cũ
+    tables = tuple(sorted(tables))
+    _mark_pending(tables)
+    task = loop.create_task(_invalidate_committed(tables))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def _invalidate_committed(tables: tuple[str, ...]) -> None:
+    try:
+        if not await invalidate_tables(*tables):
+            logger.warning(f"Không invalidation được cache truy vấn của bảng {tables}")
+    finally:
+        _unmark_pending(tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_written(session: Session) -> None:
+    session.info.pop(_WRITTEN_TABLES, None)
@@ -0,0 +1,211 @@
+"""Cache dùng chung giữa các worker trên cùng máy qua file memory-mapped.
+
+Bảng hash số slot cố định (open addressing, dò tuyến tính tối đa `PROBE_LIMIT`
+slot). Mỗi slot có bộ đếm seqlock: writer tăng lên số lẻ, ghi dữ liệu rồi tăng
+lên số chẵn; reader không lấy lock, chỉ đọc lại nếu seq thay đổi trong lúc đọc.
+Writer giữa các process được tuần tự hóa bằng `flock` trên file.
+
+API giống `LocalCache` (get/set/delete/clear/stats) nên helpers dùng thay thế được.
+"""
+
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+MAGIC = b"ZSPC0001"
+# magic, số slot, kích thước slot
+FILE_HEADER = struct.Struct("<8sII")
+FILE_HEADER_SIZE = 64
+# seq, hash key, expires_at (unix time), độ dài key, độ dài value
+SLOT_HEADER = struct.Struct("<IQdHI")
+SLOT_HEADER_SIZE = 32
+SEQ = struct.Struct("<I")
+PROBE_LIMIT = 16
+READ_RETRIES = 16
+
+
+def _key_hash(key: bytes) -> int:
+    # hash() của Python bị random theo process, không dùng chung được
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+
+
+class SharedMemoryCache:
+    """Cache str -> str trong một segment mmap dùng chung giữa các process."""
+
+    def __init__(self, path: str, slots: int, slot_size: int, default_ttl: float):
+        if slot_size <= SLOT_HEADER_SIZE:
+            raise ValueError("slot_size quá nhỏ")
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self.default_ttl = default_ttl
+        self.capacity = slot_size - SLOT_HEADER_SIZE
+        # Bộ đếm theo process
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.rejected = 0
+        self._thread_lock = threading.Lock()
+
+        size = FILE_HEADER_SIZE + slots * slot_size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._write_lock():
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+            self._buf = mmap.mmap(self._fd, size)
+            header = FILE_HEADER.unpack_from(self._buf, 0)
+            if header != (MAGIC, slots, slot_size):
+                # File mới hoặc khác cấu hình: khởi tạo lại toàn bộ
+                self._buf[:] = bytes(size)
+                FILE_HEADER.pack_into(self._buf, 0, MAGIC, slots, slot_size)
+
+    @contextmanager
+    def _write_lock(self):
+        with self._thread_lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _offsets(self, key_hash: int):
+        start = key_hash % self.slots
+        for i in range(min(PROBE_LIMIT, self.slots)):
+            yield FILE_HEADER_SIZE + ((start + i) % self.slots) * self.slot_size
+
+    def _read_value(self, offset: int, target: int, key: bytes) -> bytes | None:
+        """Đọc value của `key` ở slot theo seqlock; None nếu slot chứa key khác,
+        đã hết hạn hoặc đang bị ghi liên tục (torn read chỉ dẫn tới miss)."""
+        buf = self._buf
+        for _ in range(READ_RETRIES):
+            seq, key_hash, expires_at, key_len, value_len = SLOT_HEADER.unpack_from(
+                buf, offset
+            )
+            if seq & 1:
+                continue
+            if key_hash != target or key_len != len(key):
+                return None
+            if key_len + value_len > self.capacity:
+                continue
+            start = offset + SLOT_HEADER_SIZE
+            data = buf[start : start + key_len + value_len]
+            if SEQ.unpack_from(buf, offset)[0] != seq:
+                continue
+            if data[:key_len] != key:
+                return None
+            if expires_at <= time.time():
+                self.expirations += 1
+                return None
+            return data[key_len:]
+        return None
+
+    def get(self, key: str) -> str | None:
+        raw_key = key.encode()
+        target = _key_hash(raw_key)
+        for offset in self._offsets(target):
+            value = self._read_value(offset, target, raw_key)
+            if value is not None:
+                self.hits += 1
+                return value.decode()
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: str, ttl: float | None = None) -> bool:
+        raw_key, raw_value = key.encode(), value.encode()
+        if len(raw_key) > 0xFFFF or len(raw_key) + len(raw_value) > self.capacity:
+            self.rejected += 1
+            return False
+        ttl = self.default_ttl if ttl is None else min(ttl, self.default_ttl)
+        target = _key_hash(raw_key)
+        now = time.time()
+
+        with self._write_lock():
+            chosen = victim = None
+            victim_expiry = float("inf")
+            for offset in self._offsets(target):
+                _, key_hash, expires_at, key_len, _ = SLOT_HEADER.unpack_from(
+                    self._buf, offset
+                )
+                if key_hash == target and self._slot_key(offset, key_len) == raw_key:
+                    chosen = offset
+                    break
+                if not key_len or expires_at <= now:
+                    chosen = chosen or offset
+                elif expires_at < victim_expiry:
+                    victim, victim_expiry = offset, expires_at
+            if chosen is None:
+                # Mọi slot dò được đều còn hạn: bỏ entry sắp hết hạn nhất
+                chosen = victim
+                self.evictions += 1
+            self._write_slot(chosen, target, now + ttl, raw_key, raw_value)
+        return True
+
+    def delete(self, key: str) -> bool:
+        raw_key = key.encode()
+        target = _key_hash(raw_key)
+        with self._write_lock():
+            for offset in self._offsets(target):
+                _, key_hash, _, key_len, _ = SLOT_HEADER.unpack_from(self._buf, offset)
+                if key_hash == target and self._slot_key(offset, key_len) == raw_key:
+                    self._write_slot(offset, 0, 0.0, b"", b"")
+                    self.invalidations += 1
+                    return True
+        return False
+
+    def _slot_key(self, offset: int, key_len: int) -> bytes:
+        start = offset + SLOT_HEADER_SIZE
+        return self._buf[start : start + key_len]
+
+    def _write_slot(
+        self, offset: int, key_hash: int, expires_at: float, key: bytes, value: bytes
+    ) -> None:
+        """Ghi slot theo seqlock (gọi khi đang giữ write lock)."""
+        seq = SEQ.unpack_from(self._buf, offset)[0]
+        SLOT_HEADER.pack_into(
+            self._buf, offset, seq + 1, key_hash, expires_at, len(key), len(value)
+        )
+        start = offset + SLOT_HEADER_SIZE
+        self._buf[start : start + len(key) + len(value)] = key + value
+        SEQ.pack_into(self._buf, offset, (seq + 2) & 0xFFFFFFFE)
+
+    def clear(self) -> None:
+        with self._write_lock():
+            for index in range(self.slots):
+                offset = FILE_HEADER_SIZE + index * self.slot_size
+                if SLOT_HEADER.unpack_from(self._buf, offset)[3]:
+                    self._write_slot(offset, 0, 0.0, b"", b"")
+
+    def __len__(self) -> int:
+        now = time.time()
+        count = 0
+        for index in range(self.slots):
+            offset = FILE_HEADER_SIZE + index * self.slot_size
+            _, _, expires_at, key_len, _ = SLOT_HEADER.unpack_from(self._buf, offset)
+            if key_len and expires_at > now:
+                count += 1
+        return count
+
+    def stats(self) -> dict:
+        return {
+            "backend": "shared",
+            "entries": len(self),
+            "slots": self.slots,
+            "slot_size": self.slot_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "rejected": self.rejected,
+        }
+
+    def close(self) -> None:
+        self._buf.close()
+        os.close(self._fd)
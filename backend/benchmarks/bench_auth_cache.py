@@ -0,0 +1,52 @@
+"""So sánh throughput của `get_current_user` khi có và không có token cache."""
+
+import time
+from unittest.mock import MagicMock
+
+import jwt
+
+from benchmarks.common import bench
+from app.core import auth
+
+ITERATIONS = 50_000
+SECRET = "bench-secret-with-at-least-32-bytes!!"
+
+
+def main() -> None:
+    auth.settings.supabase_jwt_secret = SECRET
+    token = jwt.encode(
+        {
+            "sub": "00000000-0000-0000-0000-000000000001",
+            "aud": "authenticated",
+            "email": "bench@example.com",
+            "exp": int(time.time()) + 3600,
+            "app_metadata": {"roles": ["customer"]},
+            "user_metadata": {"full_name": "Bench User"},
+        },
+        SECRET,
+        algorithm="HS256",
+    )
+    request = MagicMock()
+    request.cookies = {"access_token": token}
+
+    auth.token_cache.max_size = 0
+    uncached = bench(
+        "get_current_user (không cache)",
+        lambda: auth.get_current_user(request, None),
+        ITERATIONS,
+    )
+
+    auth.token_cache.max_size = 10_000
+    auth.token_cache.clear()
+    cached = bench(
+        "get_current_user (token cache)",
+        lambda: auth.get_current_user(request, None),
+        ITERATIONS,
+    )
+
+    print(f"Tăng tốc: x{cached / uncached:.1f}")
+    print(f"Cache stats: {auth.token_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Encode/decode và kích thước payload: đường cũ (json.dumps, lỗi thì str) so với codec.
+
+Đường cũ không serialize được dict có UUID/datetime nên lưu repr Python, và khi
+đọc ra chỉ nhận lại một chuỗi (cache profile không bao giờ hit).
+"""
+
+import json
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from benchmarks.common import bench
+from app.redis.codec import CacheCodec, orjson
+
+ITERATIONS = 20_000
+
+
+def _profile() -> dict:
+    now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return {
+        "id": uuid4(),
+        "email": "bench@example.com",
+        "full_name": "Bench User",
+        "phone": "+84901234567",
+        "birth_date": "1990-01-01",
+        "avatar_url": "https://cdn.example.com/avatars/bench.png",
+        "roles": ["customer"],
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def _old_serialize(value):
+    try:
+        return json.dumps(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def _old_deserialize(value):
+    try:
+        return json.loads(value)
+    except (json.JSONDecodeError, TypeError):
+        return value
+
+
+def _run(label: str, encode, decode, value) -> None:
+    encoded = encode(value)
+    decoded = decode(encoded)
+    print(f"-- {label}: {len(encoded):,} byte, decode ra {type(decoded).__name__}")
+    bench("   encode", lambda: encode(value), ITERATIONS)
+    bench("   decode", lambda: decode(encoded), ITERATIONS)
+
+
+def main() -> None:
+    print(f"orjson: {'có' if orjson else 'không'}")
+    cases = {
+        "profile": _profile(),
+        "danh sách 50 profile": [_profile() for _ in range(50)],
+    }
+    codec = CacheCodec(compress_threshold=1024)
+    for case, value in cases.items():
+        print(f"\n=== {case}")
+        _run("cũ (json.dumps / str)", _old_serialize, _old_deserialize, value)
+        _run("codec json", codec.encode, codec.decode, value)
+        raw = CacheCodec(compress_threshold=0)
+        _run("codec json, không nén", raw.encode, raw.decode, value)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""1.000 request đồng thời vào một key lạnh: cache-aside thường so với get_or_load.
+
+Loader giả lập query profile + roles mất `LOADER_LATENCY`; Redis là fakeredis
+(client RESP async) để có SET NX và Lua như server thật.
+"""
+
+import asyncio
+import time
+from unittest.mock import patch
+
+import fakeredis
+
+from app.redis import helpers
+from app.redis.client import AsyncRespRedisClient
+
+REQUESTS = 1000
+LOADER_LATENCY = 0.02
+
+
+async def _naive_get(key: str, loader):
+    value = await helpers.async_cache_get(key)
+    if value is None:
+        value = await loader()
+        await helpers.async_cache_set(key, value, ttl=60)
+    return value
+
+
+async def _run(label: str, get) -> None:
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(LOADER_LATENCY)
+        return {"id": "1", "roles": ["customer"]}
+
+    helpers.clear_local_cache()
+    key = f"user_profile:{label}"
+    start = time.perf_counter()
+    await asyncio.gather(*(get(key, loader) for _ in range(REQUESTS)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<14} loader gọi {calls:>5} lần  {elapsed * 1000:>8.1f} ms")
+
+
+async def main() -> None:
+    client = AsyncRespRedisClient(
+        fakeredis.aioredis.FakeRedis(decode_responses=True, max_connections=REQUESTS)
+    )
+
+    async def get_client():
+        return client
+
+    print(f"{REQUESTS} request đồng thời, loader {LOADER_LATENCY * 1000:.0f} ms")
+    with patch.object(helpers, "get_async_redis_client", get_client):
+        await _run("cache-aside", _naive_get)
+        await _run(
+            "get_or_load",
+            lambda key, loader: helpers.get_or_load(key, loader, ttl=60, lock=True),
+        )
+    print(helpers.cache_stats()["loader"])
+    await client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""Warmup 50.000 profile: thời gian theo số batch chạy song song.
+
+DB giả lập: mỗi query mất `QUERY_LATENCY` (hai query mỗi batch); Redis là
+fakeredis (client RESP async), ghi mỗi batch bằng một pipeline.
+"""
+
+import asyncio
+import time
+import uuid
+from unittest.mock import patch
+
+import fakeredis
+
+from app.modules.user import user_warmup
+from app.redis import helpers
+from app.redis.client import AsyncRespRedisClient
+
+USERS = 50_000
+BATCH_SIZE = 500
+QUERY_LATENCY = 0.02
+USER_IDS = [uuid.uuid4() for _ in range(USERS)]
+
+
+class _Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class _Session:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def exec(self, statement):
+        await asyncio.sleep(QUERY_LATENCY)
+        return _Result(USER_IDS)
+
+
+async def _load_roles(session):
+    await asyncio.sleep(QUERY_LATENCY)
+    return [{"id": 1, "name": "customer", "description": None}]
+
+
+async def _load_profiles(session, user_ids):
+    await asyncio.sleep(QUERY_LATENCY * 2)
+    return {
+        user_id: {"id": user_id, "full_name": "Bench User", "roles": ["customer"]}
+        for user_id in user_ids
+    }
+
+
+async def main() -> None:
+    client = AsyncRespRedisClient(fakeredis.aioredis.FakeRedis(decode_responses=True))
+
+    async def get_client():
+        return client
+
+    print(f"{USERS:,} profile, batch {BATCH_SIZE}, query {QUERY_LATENCY * 1000:.0f} ms")
+    with patch.object(helpers, "get_async_redis_client", get_client), patch.object(
+        user_warmup, "AsyncSessionLocal", _Session
+    ), patch.object(user_warmup, "load_roles", _load_roles), patch.object(
+        user_warmup, "load_profiles_with_roles", _load_profiles
+    ):
+        for concurrency in (1, 4, 8):
+            await client.execute("FLUSHDB")
+            helpers.clear_local_cache()
+            start = time.perf_counter()
+            progress = await user_warmup.warm_user_cache(
+                limit=USERS, batch_size=BATCH_SIZE, concurrency=concurrency
+            )
+            elapsed = time.perf_counter() - start
+            print(
+                f"concurrency {concurrency}: {progress['warmed']:,} profile "
+                f"trong {elapsed:.2f} s ({progress['warmed'] / elapsed:,.0f} profile/s)"
+            )
+    await client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+"""Độ trễ request theo chế độ pool DB: "session" (QueuePool) và "transaction" (NullPool).
+
+Cần Postgres thật: `BENCH_DATABASE_URL` (kết nối trực tiếp hoặc session pooler,
+cổng 5432) và tùy chọn `BENCH_POOLER_URL` (transaction pooler, cổng 6543). Không
+có `BENCH_POOLER_URL` thì chế độ "transaction" chạy trên `BENCH_DATABASE_URL`:
+đo được chi phí NullPool và bỏ cache prepared statement, không gồm pooler.
+
+Mỗi "request" lấy một kết nối từ engine và chạy hai query có tham số (profile + roles).
+"""
+
+import asyncio
+import os
+import statistics
+import time
+import uuid
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.database import engine_options
+
+CONCURRENCY = 20
+REQUESTS = 1_000
+PROFILE_QUERY = text("SELECT CAST(:id AS uuid) AS id, now() AS updated_at")
+ROLES_QUERY = text(
+    "SELECT name FROM (VALUES ('customer'), ('admin')) AS roles(name) WHERE name <> :name"
+)
+
+
+def _async_url(url: str) -> str:
+    return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+
+async def _request(engine) -> float:
+    started = time.perf_counter()
+    async with engine.connect() as conn:
+        await conn.execute(PROFILE_QUERY, {"id": str(uuid.uuid4())})
+        await conn.execute(ROLES_QUERY, {"name": "technician"})
+    return time.perf_counter() - started
+
+
+async def _run(label: str, url: str, mode: str) -> None:
+    engine = create_async_engine(_async_url(url), **engine_options(mode))
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one() -> float:
+        async with semaphore:
+            return await _request(engine)
+
+    await asyncio.gather(*(one() for _ in range(CONCURRENCY)))  # warmup
+    started = time.perf_counter()
+    latencies = sorted(await asyncio.gather(*(one() for _ in range(REQUESTS))))
+    elapsed = time.perf_counter() - started
+    await engine.dispose()
+
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(
+        f"{label:<34} {REQUESTS / elapsed:>8,.0f} req/s  "
+        f"p50 {p50:>7.2f} ms  p95 {p95:>7.2f} ms  p99 {p99:>7.2f} ms"
+    )
+
+
+async def main() -> None:
+    database_url = os.environ.get("BENCH_DATABASE_URL")
+    if not database_url:
+        print("Cần BENCH_DATABASE_URL (Postgres thật) để chạy benchmark này")
+        return
+    pooler_url = os.environ.get("BENCH_POOLER_URL", database_url)
+    print(f"{REQUESTS} request, {CONCURRENCY} đồng thời, 2 query mỗi request")
+    await _run("session (QueuePool, stmt cache)", database_url, "session")
+    await _run("transaction (NullPool, no cache)", pooler_url, "transaction")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""Chi phí verify JWT mỗi request theo từng thuật toán ký.
+
+Đo cả `jwt.decode` trực tiếp lẫn `verify_jwt` (gồm chọn key theo kid từ JWKS).
+"""
+
+import json
+import tempfile
+import time
+from unittest.mock import patch
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from jwt.algorithms import ECAlgorithm, OKPAlgorithm, RSAAlgorithm
+
+from benchmarks.common import bench
+from app.core import auth, jwks
+
+ITERATIONS = 5_000
+HS_SECRET = "bench-secret-with-at-least-32-bytes!!"
+
+
+def _asymmetric_keys() -> dict[str, tuple[object, dict]]:
+    rsa_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    ec_key = ec.generate_private_key(ec.SECP256R1())
+    ed_key = ed25519.Ed25519PrivateKey.generate()
+    return {
+        "RS256": (rsa_key, json.loads(RSAAlgorithm.to_jwk(rsa_key.public_key()))),
+        "ES256": (ec_key, json.loads(ECAlgorithm.to_jwk(ec_key.public_key()))),
+        "EdDSA": (ed_key, json.loads(OKPAlgorithm.to_jwk(ed_key.public_key()))),
+    }
+
+
+def main() -> None:
+    claims = {
+        "sub": "00000000-0000-0000-0000-000000000001",
+        "aud": "authenticated",
+        "exp": int(time.time()) + 3600,
+    }
+    keys = _asymmetric_keys()
+
+    jwk_list = []
+    for alg, (_, jwk) in keys.items():
+        jwk.update({"kid": f"kid-{alg}", "alg": alg})
+        jwk_list.append(jwk)
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump({"keys": jwk_list}, f)
+    store = jwks.JWKSKeyStore(f.name, refresh_interval=3600)
+    store.refresher.run_now()
+
+    tokens = {"HS256": jwt.encode(claims, HS_SECRET, algorithm="HS256")}
+    for alg, (private_key, _) in keys.items():
+        tokens[alg] = jwt.encode(
+            claims, private_key, algorithm=alg, headers={"kid": f"kid-{alg}"}
+        )
+
+    print("== jwt.decode (key có sẵn)")
+    bench(
+        "HS256",
+        lambda: jwt.decode(
+            tokens["HS256"], HS_SECRET, algorithms=["HS256"], audience="authenticated"
+        ),
+        ITERATIONS,
+    )
+    for alg in keys:
+        public_key = store.get_key(f"kid-{alg}").key
+        bench(
+            alg,
+            lambda alg=alg, public_key=public_key: jwt.decode(
+                tokens[alg], public_key, algorithms=[alg], audience="authenticated"
+            ),
+            ITERATIONS,
+        )
+
+    print("== verify_jwt (gồm chọn key theo alg/kid)")
+    with patch.object(auth.settings, "supabase_jwt_secret", HS_SECRET), patch.object(
+        auth.settings, "jwt_algorithms", list(tokens)
+    ), patch.object(auth, "get_jwks_store", return_value=store):
+        for alg, token in tokens.items():
+            bench(alg, lambda token=token: auth.verify_jwt(token), ITERATIONS)
+
+
+if __name__ == "__main__":
+    main()
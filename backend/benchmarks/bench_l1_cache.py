@@ -0,0 +1,82 @@
+"""`/api/v1/users/me` khi profile đã cache: chỉ Redis (L2) so với L1 + L2.
+
+Request tuần tự qua stand-in Upstash có độ trễ mạng giả lập; L1 hit không gửi
+request nào tới Redis.
+"""
+
+import asyncio
+import time
+from unittest.mock import patch
+from uuid import UUID
+
+import httpx
+
+from benchmarks.upstash_standin import UpstashStandIn
+from app.core import auth
+from app.core.database import get_async_session
+from app.core.replicas import get_read_session
+from app.main import app
+from app.redis import client as redis_client
+from app.redis import helpers
+
+LATENCY = 0.005  # 5 ms mỗi round trip
+REQUESTS = 300
+USER_ID = UUID("00000000-0000-0000-0000-000000000001")
+
+
+async def _fake_session():
+    yield None
+
+
+async def _run(label: str) -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as c:
+        await c.get("/api/v1/users/me")  # warmup
+        start = time.perf_counter()
+        for _ in range(REQUESTS):
+            response = await c.get("/api/v1/users/me")
+            assert response.status_code == 200, response.text
+        elapsed = time.perf_counter() - start
+    print(
+        f"{label:<20} {REQUESTS / elapsed:>8.0f} req/s  "
+        f"{elapsed / REQUESTS * 1000:>6.2f} ms/request"
+    )
+
+
+async def main() -> None:
+    user = auth.CurrentUser(str(USER_ID), "bench@example.com", None, ["customer"])
+    app.dependency_overrides[auth.get_current_user] = lambda: user
+    app.dependency_overrides[get_async_session] = _fake_session
+    app.dependency_overrides[get_read_session] = _fake_session
+
+    with UpstashStandIn(latency=LATENCY) as server, patch.multiple(
+        redis_client.settings,
+        upstash_redis_rest_url=server.url,
+        upstash_redis_rest_token="bench",
+    ):
+        await helpers.async_cache_set(
+            f"user_profile:{USER_ID}",
+            {
+                "id": str(USER_ID),
+                "email": "bench@example.com",
+                "full_name": "Bench User",
+                "phone": None,
+                "birth_date": None,
+                "avatar_url": None,
+                "roles": ["customer"],
+                "created_at": "2025-01-01T00:00:00+00:00",
+                "updated_at": "2025-01-01T00:00:00+00:00",
+            },
+        )
+        print(f"Độ trễ Redis {LATENCY * 1000:.0f} ms")
+        with patch.object(helpers, "_l1", None):
+            await _run("Chỉ L2 (Redis)")
+        helpers.clear_local_cache()
+        await _run("L1 + L2")
+        print(helpers.cache_stats())
+        await redis_client.close_async_redis()
+        redis_client.close_redis()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""CPU dựng và compile câu lệnh cho một request `/users/me` khi cache miss.
+
+Mỗi request gồm hai câu lệnh: profile theo id và tên role của user (join).
+Chỉ đo phần SQLAlchemy làm trước khi gửi tới asyncpg (dựng câu lệnh, tính cache
+key, tra hoặc ghi cache compiled), không có kết nối DB:
+- select() mỗi lần, không cache compiled (như khi cache quá nhỏ, bị đẩy ra);
+- select() mỗi lần + cache compiled của engine (đường cũ);
+- lambda_stmt từ `user_statements` + cache compiled (đường mới).
+"""
+
+import time
+import uuid
+
+from sqlalchemy.dialects.postgresql.asyncpg import dialect as asyncpg_dialect
+from sqlmodel import select
+
+from app.modules.user import user_statements as statements
+from app.modules.user.user_models import Profile, Role, UserRoleLink
+
+REQUESTS = 20_000
+DIALECT = asyncpg_dialect()
+USER_IDS = [uuid.uuid4() for _ in range(1_000)]
+
+
+def _select_statements(user_id):
+    return (
+        select(Profile).where(Profile.id == user_id),
+        select(Role.name)
+        .join(UserRoleLink, UserRoleLink.role_id == Role.id)
+        .where(UserRoleLink.user_id == user_id),
+    )
+
+
+def _lambda_statements(user_id):
+    return (
+        statements.profile_by_id(user_id),
+        statements.role_names_of_user(user_id),
+    )
+
+
+def _prepare(statement, compiled_cache) -> None:
+    # Cùng bước Connection.execute gọi trước khi chuyển câu lệnh cho driver
+    statement._compile_w_cache(DIALECT, compiled_cache=compiled_cache, column_keys=[])
+
+
+def _run(label: str, build, compiled_cache) -> float:
+    for user_id in USER_IDS[:10]:  # warmup: phân tích lambda, điền cache compiled
+        for statement in build(user_id):
+            _prepare(statement, compiled_cache)
+    started = time.process_time()
+    for i in range(REQUESTS):
+        for statement in build(USER_IDS[i % len(USER_IDS)]):
+            _prepare(statement, compiled_cache)
+    per_request = (time.process_time() - started) / REQUESTS * 1e6
+    print(f"{label:<40} {per_request:>8.1f} µs CPU/request")
+    return per_request
+
+
+def main() -> None:
+    print(f"{REQUESTS:,} request, 2 câu lệnh mỗi request, dialect asyncpg")
+    _run("select(), không cache compiled", _select_statements, None)
+    before = _run("select() + cache compiled", _select_statements, {})
+    after = _run("lambda_stmt + cache compiled", _lambda_statements, {})
+    print(f"Giảm {1 - after / before:.0%} CPU so với đường cũ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""So sánh kiểm tra quyền: duyệt list roles (cách cũ) và bitmask đã biên dịch.
+
+Dùng bảng route tổng hợp với nhiều role và permission.
+"""
+
+import random
+from enum import Enum
+
+from benchmarks.common import bench
+from app.core.auth import CurrentUser
+from app.modules.user.user_permissions import PermissionPolicy
+
+ROLE_COUNT = 48
+PERMISSION_COUNT = 120
+ROUTE_COUNT = 500
+ITERATIONS = 200_000
+
+
+def main() -> None:
+    rng = random.Random(42)
+    SyntheticPermission = Enum(
+        "SyntheticPermission",
+        {f"P{i}": f"resource_{i}:action" for i in range(PERMISSION_COUNT)},
+    )
+    permissions = list(SyntheticPermission)
+    roles = [f"role_{i}" for i in range(ROLE_COUNT)]
+
+    # Mỗi role được gán ngẫu nhiên một nửa số permission
+    matrix = {
+        role: set(rng.sample(permissions, k=max(1, len(permissions) // 2)))
+        for role in roles
+    }
+    policy = PermissionPolicy(matrix, permissions)
+
+    # Cách cũ: mỗi route giữ danh sách role được phép, check bằng `in`
+    routes_old = []
+    routes_new = []
+    for _ in range(ROUTE_COUNT):
+        permission = rng.choice(permissions)
+        allowed_roles = [role for role in roles if permission in matrix[role]]
+        routes_old.append(allowed_roles)
+        routes_new.append(policy.mask_of([permission]))
+
+    users = [
+        CurrentUser(str(i), None, None, rng.sample(roles, k=rng.randint(1, 5)))
+        for i in range(100)
+    ]
+    checks = [
+        (rng.randrange(ROUTE_COUNT), users[rng.randrange(len(users))])
+        for _ in range(1024)
+    ]
+
+    state = {"i": 0}
+
+    def old_check() -> bool:
+        route_index, user = checks[state["i"] & 1023]
+        state["i"] += 1
+        user_roles = user.roles
+        return any(role in user_roles for role in routes_old[route_index])
+
+    def new_check() -> bool:
+        route_index, user = checks[state["i"] & 1023]
+        state["i"] += 1
+        required = routes_new[route_index]
+        return policy.has(user, required)
+
+    print(f"{ROLE_COUNT} roles, {len(permissions)} permissions, {ROUTE_COUNT} routes")
+    old = bench("list roles + `in`", old_check, ITERATIONS)
+    new = bench("bitmask AND", new_check, ITERATIONS)
+    print(f"Tăng tốc: x{new / old:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Throughput `/api/v1/users/me` đồng thời: cache sync (requests) và async (httpx).
+
+Dùng stand-in Upstash với độ trễ mạng giả lập; profile đã có sẵn trong cache nên
+request không chạm DB. Cache L1 bị tắt để mọi request đều đi qua Redis.
+"""
+
+import asyncio
+import time
+from unittest.mock import patch
+from uuid import UUID
+
+import httpx
+
+from benchmarks.upstash_standin import UpstashStandIn
+from app.core import auth
+from app.core.database import get_async_session
+from app.core.replicas import get_read_session
+from app.main import app
+from app.redis import client as redis_client
+from app.redis import helpers
+from app.redis.helpers import cache_get, cache_set
+
+LATENCY = 0.05  # 50 ms mỗi round trip
+CONCURRENCY = 50
+REQUESTS = 200
+USER_ID = UUID("00000000-0000-0000-0000-000000000001")
+
+
+async def _fake_session():
+    yield None
+
+
+async def _old_cache_get(key, fallback=None):
+    """Đường cũ: gọi helper sync ngay trên event loop."""
+    return cache_get(key, fallback)
+
+
+async def _run(label: str) -> None:
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as c:
+
+        async def one() -> None:
+            async with semaphore:
+                response = await c.get("/api/v1/users/me")
+                assert response.status_code == 200, response.text
+
+        await one()  # warmup (khởi tạo connection pool)
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(REQUESTS)))
+        elapsed = time.perf_counter() - start
+    print(f"{label:<28} {REQUESTS / elapsed:>8.0f} req/s  ({elapsed:.2f}s)")
+
+
+async def main() -> None:
+    user = auth.CurrentUser(str(USER_ID), "bench@example.com", None, ["customer"])
+    app.dependency_overrides[auth.get_current_user] = lambda: user
+    app.dependency_overrides[get_async_session] = _fake_session
+    app.dependency_overrides[get_read_session] = _fake_session
+
+    with UpstashStandIn(latency=LATENCY) as server, patch.multiple(
+        redis_client.settings,
+        upstash_redis_rest_url=server.url,
+        upstash_redis_rest_token="bench",
+    ), patch.object(helpers, "_l1", None):
+        cache_set(
+            f"user_profile:{USER_ID}",
+            {
+                "id": str(USER_ID),
+                "email": "bench@example.com",
+                "full_name": "Bench User",
+                "phone": None,
+                "birth_date": None,
+                "avatar_url": None,
+                "roles": ["customer"],
+                "created_at": "2025-01-01T00:00:00+00:00",
+                "updated_at": "2025-01-01T00:00:00+00:00",
+            },
+        )
+        print(f"Độ trễ {LATENCY * 1000:.0f} ms, {CONCURRENCY} request đồng thời")
+        with patch.object(helpers, "async_cache_get", _old_cache_get):
+            await _run("Trước (requests, sync)")
+        await _run("Sau (httpx async, pool)")
+        await redis_client.close_async_redis()
+        redis_client.close_redis()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
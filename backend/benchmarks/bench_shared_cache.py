@@ -0,0 +1,92 @@
+"""L1 riêng từng worker (LocalCache) so với segment dùng chung (SharedMemoryCache).
+
+Mỗi worker là một process nạp cùng `ENTRIES` profile vào cache rồi đọc lại.
+Bộ nhớ đo bằng PSS (`/proc/self/smaps_rollup`): trang dùng chung được chia đều
+cho các process đang map, nên phản ánh đúng chi phí thực của mỗi worker.
+"""
+
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from app.redis.local_cache import LocalCache
+from app.redis.shared_cache import SharedMemoryCache
+
+WORKERS = 4
+ENTRIES = 20_000
+READS = 100_000
+PROFILE = json.dumps(
+    {
+        "id": "00000000-0000-0000-0000-000000000000",
+        "email": "bench@example.com",
+        "full_name": "Bench User " + "x" * 200,
+        "roles": ["customer"],
+        "created_at": "2025-01-01T00:00:00+00:00",
+    }
+)
+
+
+def _pss_kb() -> int:
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1])
+    return 0
+
+
+def _worker(backend: str, path: str, start: multiprocessing.Barrier, out) -> None:
+    if backend == "shared":
+        cache = SharedMemoryCache(
+            path, slots=ENTRIES * 3 // 2, slot_size=448, default_ttl=600
+        )
+    else:
+        cache = LocalCache(max_bytes=256 * 1024 * 1024, default_ttl=600)
+    baseline = _pss_kb()
+    for i in range(ENTRIES):
+        cache.set(f"user_profile:{i}", PROFILE)
+    start.wait()  # mọi worker đã nạp xong, trang dùng chung được chia đều
+    pss = _pss_kb() - baseline
+    start.wait()  # chưa worker nào thoát (unmap) khi các worker khác đang đo
+
+    # Thời gian CPU của process: các worker chạy song song không làm lệch số đo
+    begin = time.process_time()
+    for i in range(READS):
+        cache.get(f"user_profile:{i % ENTRIES}")
+    elapsed = time.process_time() - begin
+    out.put((pss, elapsed / READS * 1e6, cache.hits))
+
+
+def _run(backend: str, path: str) -> None:
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(WORKERS)
+    out = ctx.Queue()
+    procs = [
+        ctx.Process(target=_worker, args=(backend, path, barrier, out))
+        for _ in range(WORKERS)
+    ]
+    for proc in procs:
+        proc.start()
+    results = [out.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    pss = sum(r[0] for r in results) / WORKERS / 1024
+    latency = sum(r[1] for r in results) / WORKERS
+    hit_rate = sum(r[2] for r in results) / (READS * WORKERS)
+    print(
+        f"{backend:<8} PSS tăng thêm/worker {pss:>7.1f} MB  "
+        f"hit {latency:>6.2f} µs  hit rate {hit_rate:.0%}"
+    )
+
+
+def main() -> None:
+    print(f"{WORKERS} worker, {ENTRIES:,} entry ~{len(PROFILE)} byte")
+    shm = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    with tempfile.TemporaryDirectory(dir=shm) as tmp:
+        _run("memory", "")
+        _run("shared", os.path.join(tmp, "cache"))
+
+
+if __name__ == "__main__":
+    main()
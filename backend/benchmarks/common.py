@@ -0,0 +1,16 @@
+"""Tiện ích đo đạc dùng chung cho các benchmark."""
+
+import time
+from typing import Callable
+
+
+def bench(label: str, fn: Callable[[], object], iterations: int) -> float:
+    """Chạy `fn` `iterations` lần, in và trả về số lần gọi mỗi giây."""
+    fn()  # warmup
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    ops = iterations / elapsed
+    print(f"{label:<40} {ops:>12,.0f} ops/s  {elapsed / iterations * 1e6:>9.2f} µs/op")
+    return ops
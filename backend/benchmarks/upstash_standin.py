@@ -0,0 +1,118 @@
+"""Server giả lập Upstash REST API (in-memory) với độ trễ mạng giả lập.
+
+Dùng cho benchmark: `with UpstashStandIn(latency=0.02) as server: server.url`.
+"""
+
+import asyncio
+import socket
+import threading
+import time
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+
+class _Store:
+    def __init__(self) -> None:
+        self.data: dict[str, tuple[str, float | None]] = {}
+
+    def _alive(self, key: str) -> str | None:
+        item = self.data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.time():
+            del self.data[key]
+            return None
+        return value
+
+    def execute(self, command: list[str]):
+        name, args = command[0].upper(), command[1:]
+        if name == "PING":
+            return "PONG"
+        if name == "GET":
+            return self._alive(args[0])
+        if name == "MGET":
+            return [self._alive(key) for key in args]
+        if name == "SET":
+            self.data[args[0]] = (args[1], None)
+            return "OK"
+        if name == "SETEX":
+            self.data[args[0]] = (args[2], time.time() + int(args[1]))
+            return "OK"
+        if name == "DEL":
+            return sum(self.data.pop(key, None) is not None for key in args)
+        if name == "EXISTS":
+            return sum(self._alive(key) is not None for key in args)
+        if name == "INCR":
+            value = int(self._alive(args[0]) or 0) + 1
+            self.data[args[0]] = (str(value), None)
+            return value
+        raise ValueError(f"ERR unknown command '{name}'")
+
+
+def build_app(latency: float) -> Starlette:
+    store = _Store()
+
+    async def delay() -> None:
+        if latency:
+            await asyncio.sleep(latency)
+
+    async def command(request: Request) -> JSONResponse:
+        await delay()
+        path = request.path_params.get("path", "")
+        try:
+            if path:
+                parts = path.split("/")
+                return JSONResponse({"result": store.execute(parts)})
+            return JSONResponse({"result": store.execute(await request.json())})
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+
+    async def pipeline(request: Request) -> JSONResponse:
+        await delay()
+        results = []
+        for cmd in await request.json():
+            try:
+                results.append({"result": store.execute(cmd)})
+            except ValueError as e:
+                results.append({"error": str(e)})
+        return JSONResponse(results)
+
+    return Starlette(
+        routes=[
+            Route("/pipeline", pipeline, methods=["POST"]),
+            Route("/multi-exec", pipeline, methods=["POST"]),
+            Route("/", command, methods=["POST"]),
+            Route("/{path:path}", command, methods=["GET", "POST"]),
+        ]
+    )
+
+
+class UpstashStandIn:
+    """Chạy stand-in server bằng uvicorn trong thread nền."""
+
+    def __init__(self, latency: float = 0.0):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        self.port = sock.getsockname()[1]
+        sock.close()
+        self.url = f"http://127.0.0.1:{self.port}"
+        config = uvicorn.Config(
+            build_app(latency), host="127.0.0.1", port=self.port, log_level="error"
+        )
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def __enter__(self) -> "UpstashStandIn":
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
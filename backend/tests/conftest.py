@@ -8,6 +8,7 @@ from sqlmodel import SQLModel
 
 from app.main import app
 from app.core.database import engine, get_async_session
+from app.core.replicas import get_read_session
 from app.core.config import settings
 
 # Override database URL for testing if needed
@@ -53,8 +54,30 @@ async def client(session: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
         yield session
 
     app.dependency_overrides[get_async_session] = get_session_override
+    app.dependency_overrides[get_read_session] = get_session_override
 
     async with AsyncClient(app=app, base_url="http://test") as c:
         yield c
 
     app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def async_redis():
+    """Client RESP async trên fakeredis (cho middleware dùng Redis)."""
+    fakeredis = pytest.importorskip("fakeredis")
+    from app.redis.client import AsyncRespRedisClient
+
+    return AsyncRespRedisClient(fakeredis.aioredis.FakeRedis(decode_responses=True))
+
+
+@pytest.fixture(autouse=True)
+def clear_local_cache():
+    """Cache L1 và hàng đợi invalidation là state toàn cục của process: xóa giữa các test."""
+    from app.redis.helpers import clear_local_cache, invalidation_queue
+
+    clear_local_cache()
+    invalidation_queue.clear()
+    yield
+    clear_local_cache()
+    invalidation_queue.clear()
@@ -35,3 +35,175 @@ def test_get_user_profile_no_auth():
 
 # Note: Để test đầy đủ, cần mock Supabase và tạo valid JWT.
 # Hiện tại, basic tests để validate structure.
+
+
+def _make_token(secret: str, **claims) -> str:
+    import time
+    import jwt
+
+    payload = {
+        "sub": "user-1",
+        "aud": "authenticated",
+        "email": "a@example.com",
+        "exp": int(time.time()) + 3600,
+        "app_metadata": {"roles": ["admin"]},
+        "user_metadata": {"full_name": "Test User"},
+    }
+    payload.update(claims)
+    return jwt.encode(payload, secret, algorithm="HS256")
+
+
+def test_authenticate_token_uses_cache():
+    """Token đã verify được lấy từ cache ở lần gọi sau."""
+    from unittest.mock import patch
+    from app.core import auth
+
+    with patch.object(auth.settings, "supabase_jwt_secret", "test-secret-with-at-least-32-bytes!!"):
+        auth.token_cache.clear()
+        token = _make_token("test-secret-with-at-least-32-bytes!!")
+
+        with patch.object(auth, "verify_jwt", wraps=auth.verify_jwt) as spy:
+            first = auth.authenticate_token(token)
+            second = auth.authenticate_token(token)
+
+        assert spy.call_count == 1
+        assert first is second
+        assert first["id"] == "user-1"
+        assert first.get("roles") == ["admin"]
+        assert first.full_name == "Test User"
+        assert auth.token_cache.stats()["hits"] == 1
+        assert auth.token_cache.stats()["misses"] == 1
+
+
+def test_token_cache_expiry_and_lru():
+    """Entry hết hạn tại exp và bị evict theo LRU."""
+    from app.core.auth import CurrentUser, TokenCache
+
+    cache = TokenCache(max_size=2)
+    for i in range(3):
+        cache.set(bytes([i]), CurrentUser(str(i), None, None, [], expires_at=100.0))
+
+    assert cache.get(bytes([0]), now=50.0) is None  # Bị evict (LRU)
+    assert cache.get(bytes([2]), now=50.0).id == "2"
+    assert cache.get(bytes([2]), now=100.0) is None  # Hết hạn tại exp
+
+
+def test_verify_jwt_es256_with_local_jwks(tmp_path):
+    """Verify token ES256 bằng key lấy từ file JWKS local."""
+    import json
+    import time
+    from unittest.mock import patch
+    import jwt
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from jwt.algorithms import ECAlgorithm
+    from app.core import auth, jwks
+
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    jwk = json.loads(ECAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update({"kid": "key-1", "alg": "ES256", "use": "sig"})
+    jwks_file = tmp_path / "jwks.json"
+    jwks_file.write_text(json.dumps({"keys": [jwk]}))
+
+    store = jwks.JWKSKeyStore(str(jwks_file), refresh_interval=600)
+    store.refresher.run_now()
+    claims = {"sub": "user-1", "aud": "authenticated", "exp": int(time.time()) + 60}
+
+    with patch.object(auth.settings, "jwt_algorithms", ["HS256", "ES256"]), patch.object(
+        auth, "get_jwks_store", return_value=store
+    ):
+        token = jwt.encode(
+            claims, private_key, algorithm="ES256", headers={"kid": "key-1"}
+        )
+        assert auth.verify_jwt(token)["sub"] == "user-1"
+
+        unknown_kid = jwt.encode(
+            claims, private_key, algorithm="ES256", headers={"kid": "rotated"}
+        )
+        with pytest.raises(Exception):
+            auth.verify_jwt(unknown_kid)
+
+    # ES256 không nằm trong danh sách cho phép -> bị từ chối
+    with pytest.raises(Exception):
+        auth.verify_jwt(token)
+
+
+def test_role_version_map_batched_sync():
+    """Change feed + MGET chỉ cho các user đang được theo dõi."""
+    from unittest.mock import MagicMock, patch
+    from app.core.role_version import RoleVersionMap
+
+    versions = RoleVersionMap(max_size=100, retention=3600, sync_interval=3600)
+    mock_client = MagicMock()
+    mock_client.execute.side_effect = lambda *cmd: {
+        "ZRANGEBYSCORE": ["user-1", "2000000000", "user-untracked", "2000000000"],
+        "MGET": ["3"],
+    }.get(cmd[0])
+
+    with patch("app.core.role_version.get_redis_client", return_value=mock_client):
+        assert versions.current("user-1") is None  # Chưa biết: không tin JWT
+        versions.refresher.run_now()
+        assert versions.current("user-1") == 3
+
+    mock_client.execute.assert_any_call("MGET", "role_version:user-1")
+
+
+def test_client_identity_uses_token_cache_only():
+    """Middleware chỉ tra token cache; token chưa cache hoặc lỗi không bị verify, tính theo IP."""
+    from unittest.mock import patch
+    from starlette.requests import HTTPConnection
+    from app.core import auth
+
+    secret = "test-secret-with-at-least-32-bytes!!"
+    token = _make_token(secret)
+
+    def connection(token: str) -> HTTPConnection:
+        return HTTPConnection(
+            {
+                "type": "http",
+                "headers": [(b"authorization", f"Bearer {token}".encode())],
+                "client": ("10.0.0.1", 1234),
+            }
+        )
+
+    with patch.object(auth.settings, "supabase_jwt_secret", secret):
+        auth.token_cache.clear()
+        with patch.object(auth, "verify_jwt", wraps=auth.verify_jwt) as spy:
+            assert auth.client_identity(connection(token)) == "ip:10.0.0.1"
+            assert auth.client_identity(connection("invalid")) == "ip:10.0.0.1"
+            assert spy.call_count == 0
+
+            auth.authenticate_token(token)  # Endpoint verify và cache token
+            assert auth.client_identity(connection(token)) == "user:user-1"
+
+
+@pytest.mark.asyncio
+async def test_verified_client_identity_verifies_off_event_loop():
+    """Token chưa cache được verify trong thread: danh tính ổn định ngay từ lần đầu."""
+    import threading
+    from unittest.mock import patch
+    from starlette.requests import HTTPConnection
+    from app.core import auth
+
+    secret = "test-secret-with-at-least-32-bytes!!"
+    token = _make_token(secret)
+    connection = HTTPConnection(
+        {
+            "type": "http",
+            "headers": [(b"authorization", f"Bearer {token}".encode())],
+            "client": ("10.0.0.1", 1234),
+        }
+    )
+    threads = []
+
+    def verify(token):
+        threads.append(threading.current_thread())
+        return original(token)
+
+    original = auth.verify_jwt
+    with patch.object(auth.settings, "supabase_jwt_secret", secret):
+        auth.token_cache.clear()
+        with patch.object(auth, "verify_jwt", verify):
+            assert await auth.verified_client_identity(connection) == "user:user-1"
+            assert await auth.verified_client_identity(connection) == "user:user-1"
+
+    assert len(threads) == 1 and threads[0] is not threading.main_thread()
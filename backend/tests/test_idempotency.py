@@ -0,0 +1,137 @@
+"""Tests cho Idempotency-Key middleware."""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from app.core.idempotency import IdempotencyMiddleware
+
+
+def _app(calls: list) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(IdempotencyMiddleware, paths=["/admin"], lock_timeout=2)
+
+    @app.post("/admin/invite")
+    async def invite(payload: dict):
+        calls.append(payload)
+        await asyncio.sleep(0.05)
+        return {"invited": payload["email"], "n": len(calls)}
+
+    return app
+
+
+@pytest.mark.asyncio
+async def test_duplicates_are_answered_from_first_response(async_redis):
+    """Request trùng đồng thời chờ request đầu; request sau nhận response đã lưu."""
+    calls = []
+    headers = {"Idempotency-Key": "abc"}
+    body = {"email": "a@example.com"}
+    with patch(
+        "app.core.idempotency.get_async_redis_client",
+        AsyncMock(return_value=async_redis),
+    ):
+        async with AsyncClient(
+            transport=ASGITransport(app=_app(calls)), base_url="http://test"
+        ) as client:
+            first, second = await asyncio.gather(
+                client.post("/admin/invite", json=body, headers=headers),
+                client.post("/admin/invite", json=body, headers=headers),
+            )
+            later = await client.post("/admin/invite", json=body, headers=headers)
+            other_body = await client.post(
+                "/admin/invite", json={"email": "b@example.com"}, headers=headers
+            )
+            no_key = await client.post("/admin/invite", json=body)
+
+    assert len(calls) == 2  # Một lần cho key "abc", một lần cho request không có key
+    assert first.json() == second.json() == later.json() == {
+        "invited": "a@example.com",
+        "n": 1,
+    }
+    assert later.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert other_body.status_code == 422
+    assert no_key.json()["n"] == 2
+
+
+@pytest.mark.asyncio
+async def test_pending_marker_from_other_worker_is_awaited(async_redis):
+    """Worker khác đang xử lý: chờ marker chuyển sang done rồi trả response đó."""
+    import json
+
+    calls = []
+    app = _app(calls)
+    with patch(
+        "app.core.idempotency.get_async_redis_client",
+        AsyncMock(return_value=async_redis),
+    ):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            # Chạy request đầu để có fingerprint và response, rồi giả lập worker khác
+            # vẫn đang giữ marker
+            first = await client.post(
+                "/admin/invite",
+                json={"email": "a@example.com"},
+                headers={"Idempotency-Key": "k"},
+            )
+            key = (await async_redis.execute("KEYS", "idempotency:*"))[0]
+            stored = await async_redis.get(key)
+            pending = {"state": "pending", "fingerprint": json.loads(stored)["fingerprint"]}
+            await async_redis.execute("SET", key, json.dumps(pending))
+
+            async def finish_elsewhere():
+                await asyncio.sleep(0.1)
+                await async_redis.execute("SET", key, stored)
+
+            replay, _ = await asyncio.gather(
+                client.post(
+                    "/admin/invite",
+                    json={"email": "a@example.com"},
+                    headers={"Idempotency-Key": "k"},
+                ),
+                finish_elsewhere(),
+            )
+
+    assert len(calls) == 1
+    assert replay.json() == first.json()
+    assert replay.headers["Idempotent-Replayed"] == "true"
+
+
+@pytest.mark.asyncio
+async def test_leader_cancel_does_not_fail_duplicates(async_redis):
+    """Request đầu bị hủy (client ngắt kết nối): request trùng vẫn nhận được response."""
+    calls = []
+    app = FastAPI()
+    app.add_middleware(IdempotencyMiddleware, paths=["/admin"], lock_timeout=2)
+
+    @app.post("/admin/invite")
+    async def invite(payload: dict):
+        calls.append(payload)
+        if len(calls) == 1:
+            await asyncio.sleep(10)  # Request đầu treo tới khi bị hủy
+        return {"invited": payload["email"], "n": len(calls)}
+
+    request = {"json": {"email": "a@example.com"}, "headers": {"Idempotency-Key": "c"}}
+    with patch(
+        "app.core.idempotency.get_async_redis_client",
+        AsyncMock(return_value=async_redis),
+    ):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            leader = asyncio.create_task(client.post("/admin/invite", **request))
+            while not calls:
+                await asyncio.sleep(0.01)
+            duplicate = asyncio.create_task(client.post("/admin/invite", **request))
+            await asyncio.sleep(0.05)
+            leader.cancel()
+            response = await duplicate
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+
+    assert response.status_code == 200
+    assert response.json() == {"invited": "a@example.com", "n": 2}
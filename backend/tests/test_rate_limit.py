@@ -0,0 +1,105 @@
+"""Tests cho rate limit middleware."""
+
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from app.core.rate_limit import (
+    RateLimiter,
+    RateLimitMiddleware,
+    RateLimitRule,
+    parse_limit,
+)
+
+
+def _app(limiter: RateLimiter) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(
+        RateLimitMiddleware,
+        rules=[RateLimitRule("admin", "/admin", "2/60", key_by="ip")],
+        default=RateLimitRule("default", "/", "100/60", key_by="ip"),
+        exempt_paths=["/health"],
+        limiter=limiter,
+    )
+
+    @app.get("/admin/ping")
+    async def admin_ping():
+        return {"ok": True}
+
+    @app.get("/health")
+    async def health():
+        return {"ok": True}
+
+    return app
+
+
+def test_parse_limit():
+    assert parse_limit("120/60") == (120, 60.0)
+    with pytest.raises(ValueError):
+        parse_limit("120")
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_in_redis_sets_headers_and_429(async_redis):
+    """Hết token trả 429 kèm Retry-After; mọi response có header RateLimit-*."""
+    limiter = RateLimiter()
+    with patch(
+        "app.core.rate_limit.get_async_redis_client",
+        AsyncMock(return_value=async_redis),
+    ):
+        async with AsyncClient(
+            transport=ASGITransport(app=_app(limiter)), base_url="http://test"
+        ) as client:
+            first = await client.get("/admin/ping")
+            second = await client.get("/admin/ping")
+            third = await client.get("/admin/ping")
+            health = await client.get("/health")
+
+    assert first.status_code == second.status_code == 200
+    assert first.headers["RateLimit-Limit"] == "2"
+    assert first.headers["RateLimit-Remaining"] == "1"
+    assert first.headers["RateLimit-Policy"] == "2;w=60"
+    assert second.headers["RateLimit-Remaining"] == "0"
+    assert third.status_code == 429
+    assert third.json()["error"]["code"] == "RATE_LIMITED"
+    assert int(third.headers["Retry-After"]) > 0
+    assert "RateLimit-Limit" not in health.headers
+    assert limiter.stats()["local_fallbacks"] == 0
+    # Bucket nằm trong Redis: worker khác dùng chung hạn mức
+    assert await async_redis.execute("EXISTS", "ratelimit:admin:ip:127.0.0.1") == 1
+
+
+@pytest.mark.asyncio
+async def test_local_bucket_when_redis_unavailable():
+    """Redis unavailable: vẫn giới hạn bằng bucket cục bộ của worker."""
+    limiter = RateLimiter()
+    with patch(
+        "app.core.rate_limit.get_async_redis_client", AsyncMock(return_value=None)
+    ):
+        async with AsyncClient(
+            transport=ASGITransport(app=_app(limiter)), base_url="http://test"
+        ) as client:
+            statuses = [(await client.get("/admin/ping")).status_code for _ in range(3)]
+
+    assert statuses == [200, 200, 429]
+    assert limiter.stats()["local_fallbacks"] == 3
+
+
+@pytest.mark.asyncio
+async def test_redis_error_skips_eval_retry():
+    """Redis lỗi/timeout không phải NOSCRIPT: không gửi thêm EVAL, dùng bucket cục bộ ngay."""
+    from app.core.exceptions import CacheException
+
+    redis = AsyncMock()
+    redis.execute.side_effect = CacheException("Redis error: Timeout reading from socket")
+    limiter = RateLimiter()
+    with patch(
+        "app.core.rate_limit.get_async_redis_client", AsyncMock(return_value=redis)
+    ):
+        decision = await limiter.hit("admin:ip:127.0.0.1", 2, 60)
+
+    assert decision.allowed
+    assert redis.execute.await_count == 1
+    assert limiter.stats()["local_fallbacks"] == 1
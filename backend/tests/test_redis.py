@@ -72,3 +72,807 @@ def test_cache_set_fallback():
         result = cache_set("test_key", "test_value")
 
         assert result is False
+
+
+@pytest.mark.asyncio
+async def test_async_cache_get_success():
+    """Test async cache get không chặn event loop."""
+    from unittest.mock import AsyncMock
+    from app.redis.helpers import async_cache_get
+
+    mock_client = MagicMock()
+    mock_client.get = AsyncMock(return_value='{"key": "value"}')
+    with patch(
+        "app.redis.helpers.get_async_redis_client", AsyncMock(return_value=mock_client)
+    ):
+        result = await async_cache_get("test_key")
+
+    assert result == {"key": "value"}
+    mock_client.get.assert_awaited_once_with("test_key")
+
+
+@pytest.mark.asyncio
+async def test_async_cache_set_fallback():
+    """Test async cache set khi Redis unavailable."""
+    from unittest.mock import AsyncMock
+    from app.redis.helpers import async_cache_set
+
+    with patch(
+        "app.redis.helpers.get_async_redis_client", AsyncMock(return_value=None)
+    ):
+        assert await async_cache_set("test_key", "test_value") is False
+
+
+@pytest.mark.asyncio
+async def test_async_upstash_client_roundtrip():
+    """AsyncUpstashRestClient gửi đúng lệnh tới REST API."""
+    import httpx
+    from app.redis.client import AsyncUpstashRestClient
+
+    requests_seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests_seen.append((request.method, request.url.path, request.content))
+        return httpx.Response(200, json={"result": "OK"})
+
+    client = AsyncUpstashRestClient("https://test.upstash.io", "token")
+    client.client._transport = httpx.MockTransport(handler)
+
+    assert await client.setex("k", 60, "v", timeout=0.5) == "OK"
+    assert requests_seen[0][:2] == ("POST", "/")
+    assert requests_seen[0][2] == b'["SETEX","k","60","v"]'
+    await client.close()
+
+
+def test_cache_get_many_uses_single_mget():
+    """cache_get_many gửi một MGET và parse từng giá trị."""
+    from app.redis.helpers import cache_get_many
+
+    with patch('app.redis.helpers.get_redis_client') as mock_get_client:
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.mget.return_value = ['{"a": 1}', None]
+
+        result = cache_get_many(["k1", "k2"], fallback="miss")
+
+    mock_client.mget.assert_called_once_with("k1", "k2")
+    assert result == {"k1": {"a": 1}, "k2": "miss"}
+
+
+@pytest.mark.asyncio
+async def test_pipeline_flushes_in_one_request():
+    """pipeline() gom lệnh và gửi một lần khi thoát context."""
+    from unittest.mock import AsyncMock
+    from app.redis.helpers import _serialize, pipeline
+
+    mock_client = MagicMock()
+    mock_client.pipeline = AsyncMock(return_value=["OK", '{"x": 1}', 1])
+    with patch(
+        "app.redis.helpers.get_async_redis_client", AsyncMock(return_value=mock_client)
+    ):
+        async with pipeline() as pipe:
+            pipe.set("a", {"x": 1}, ttl=60)
+            index = pipe.get("a")
+            pipe.delete("b")
+
+    commands, transaction = mock_client.pipeline.await_args.args
+    assert commands[:3] == [
+        ["SETEX", "a", 60, _serialize({"x": 1})],
+        ["GET", "a"],
+        ["DEL", "b"],
+    ]
+    assert transaction is False
+    assert pipe.results[index] == {"x": 1}
+
+
+def test_l1_serves_repeated_reads_without_network():
+    """Lần đọc thứ hai lấy từ L1, không gọi Redis."""
+    from app.redis.helpers import cache_stats
+
+    with patch('app.redis.helpers.get_redis_client') as mock_get_client:
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.get.return_value = '{"name": "a"}'
+
+        assert cache_get("profile:1") == {"name": "a"}
+        assert cache_get("profile:1") == {"name": "a"}
+
+    mock_client.get.assert_called_once_with("profile:1")
+    stats = cache_stats()
+    assert stats["l1"]["hits"] == 1
+    assert stats["l2"]["hits"] >= 1
+
+
+def test_cache_delete_evicts_l1_and_publishes_invalidation():
+    """cache_delete xóa L1 và gửi lệnh invalidation trong cùng pipeline với DEL."""
+    from app.redis.helpers import L1_INVALIDATION_KEY
+
+    with patch('app.redis.helpers.get_redis_client') as mock_get_client:
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        cache_set("profile:1", {"name": "a"})
+        assert cache_delete("profile:1") is True
+
+        mock_client.get.return_value = None
+        assert cache_get("profile:1", fallback="miss") == "miss"
+
+    commands = mock_client.pipeline.call_args.args[0]
+    assert commands[0] == ["DEL", "profile:1"]
+    assert commands[1][0] == "EVAL" and L1_INVALIDATION_KEY in commands[1]
+
+
+def test_cache_delete_reports_failed_pipeline_command():
+    """DEL/SETEX lỗi trong pipeline (kết quả None) trả về False và được đếm là fallback."""
+    from app.redis.helpers import cache_delete_many, cache_metrics, cache_set_many
+
+    with patch('app.redis.helpers.get_redis_client') as mock_get_client:
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.pipeline.return_value = [None, 7]
+        errors = cache_metrics.snapshot().get("profile", {}).get("errors", 0)
+
+        assert cache_delete("profile:1") is False
+        assert cache_delete_many(["profile:1", "profile:2"]) is False
+        assert cache_metrics.snapshot()["profile"]["errors"] == errors + 3
+
+        mock_client.pipeline.return_value = [1, 7]
+        assert cache_delete("profile:1") is True
+
+        # SETEX lỗi một key: trả về False, key lỗi không vào L1
+        mock_client.pipeline.return_value = ["OK", None]
+        assert cache_set_many({"profile:1": 1, "profile:2": 2}, ttl=60) is False
+        assert cache_metrics.snapshot()["profile"]["errors"] == errors + 4
+        mock_client.get.return_value = None
+        assert cache_get("profile:2", fallback="miss") == "miss"
+
+
+def test_l1_applies_invalidations_from_other_workers():
+    """Key do worker khác xóa được bỏ khỏi L1 ở lần đồng bộ kế tiếp."""
+    from app.redis import helpers
+
+    with patch('app.redis.helpers.get_redis_client') as mock_get_client:
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        helpers._l1_cursor = 5
+        cache_set("profile:1", {"name": "a"})
+        mock_client.execute.return_value = ["profile:1", "7"]
+
+        helpers._sync_l1_invalidations()
+
+    assert helpers._l1.get("profile:1") is None
+    assert helpers._l1_cursor == 7
+
+
+def test_local_cache_evicts_by_size():
+    """LocalCache giữ tổng dung lượng dưới max_bytes, bỏ entry ít dùng nhất."""
+    from app.redis.local_cache import ENTRY_OVERHEAD_BYTES, LocalCache
+
+    cache = LocalCache(max_bytes=2 * (ENTRY_OVERHEAD_BYTES + 12), default_ttl=30)
+    cache.set("k1", "x" * 10)
+    cache.set("k2", "x" * 10)
+    cache.get("k1")
+    cache.set("k3", "x" * 10)
+
+    assert cache.get("k2") is None
+    assert cache.get("k1") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_shared_memory_cache_is_shared_between_mappings(tmp_path):
+    """Hai instance mở cùng file thấy dữ liệu của nhau (như hai worker)."""
+    from app.redis.shared_cache import SharedMemoryCache
+
+    path = str(tmp_path / "cache")
+    worker_a = SharedMemoryCache(path, slots=64, slot_size=256, default_ttl=30)
+    worker_b = SharedMemoryCache(path, slots=64, slot_size=256, default_ttl=30)
+
+    assert worker_a.set("profile:1", '{"name": "a"}') is True
+    assert worker_b.get("profile:1") == '{"name": "a"}'
+    assert worker_b.delete("profile:1") is True
+    assert worker_a.get("profile:1") is None
+    assert worker_a.set("big", "x" * 300) is False
+
+    worker_a.close()
+    worker_b.close()
+
+
+def test_shared_memory_cache_expiry_and_eviction(tmp_path):
+    """Entry hết hạn bị bỏ qua; khi hết slot dò được thì entry sắp hết hạn nhất bị thay."""
+    from app.redis.shared_cache import SharedMemoryCache
+
+    cache = SharedMemoryCache(str(tmp_path / "cache"), slots=2, slot_size=128, default_ttl=30)
+    cache.set("expired", "v", ttl=-1)
+    assert cache.get("expired") is None
+
+    cache.set("k1", "v1", ttl=10)
+    cache.set("k2", "v2", ttl=20)
+    cache.set("k3", "v3", ttl=20)
+    assert cache.get("k3") == "v3"
+    assert len(cache) == 2
+    assert cache.stats()["evictions"] >= 1
+    cache.close()
+
+
+def test_shared_l1_falls_back_without_fcntl():
+    """Nền tảng không có fcntl (Windows): helpers vẫn import được, L1 lùi về LRU riêng."""
+    import sys
+    from app.redis import helpers
+    from app.redis.local_cache import LocalCache
+
+    with patch.dict(sys.modules, {"app.redis.shared_cache": None}), patch.multiple(
+        helpers.settings, cache_l1_enabled=True, cache_l1_backend="shared"
+    ):
+        assert isinstance(helpers._build_l1(), LocalCache)
+
+
+@pytest.fixture
+def resp_clients():
+    """Cặp client RESP sync/async: redis-server nếu có REDIS_TEST_URL, không thì fakeredis."""
+    import os
+    from app.redis.client import AsyncRespRedisClient, RespRedisClient
+
+    url = os.environ.get("REDIS_TEST_URL")
+    if url:
+        sync_client = RespRedisClient.from_url(url)
+        async_client = AsyncRespRedisClient.from_url(url)
+    else:
+        fakeredis = pytest.importorskip("fakeredis")
+        server = fakeredis.FakeServer()
+        sync_client = RespRedisClient(
+            fakeredis.FakeRedis(server=server, decode_responses=True)
+        )
+        async_client = AsyncRespRedisClient(
+            fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+        )
+    sync_client.execute("FLUSHDB")
+    yield sync_client, async_client
+    sync_client.close()
+
+
+def test_resp_backend_helper_semantics(resp_clients):
+    """Helpers sync qua backend RESP cho kết quả như qua Upstash REST."""
+    from app.redis.helpers import cache_delete_many, cache_get_many, cache_set_many
+
+    sync_client, _ = resp_clients
+    with patch('app.redis.helpers.get_redis_client', return_value=sync_client):
+        assert cache_set("k1", {"a": 1}, ttl=60) is True
+        assert cache_set_many({"k2": [1, 2]}, ttl=60) is True
+        assert cache_get_many(["k1", "k2", "k3"], fallback="miss") == {
+            "k1": {"a": 1},
+            "k2": [1, 2],
+            "k3": "miss",
+        }
+        assert cache_delete("k1") is True
+        assert cache_delete_many(["k2"]) is True
+        assert cache_get("k1", fallback="miss") == "miss"
+
+    assert sync_client.execute("EXISTS", "k1", "k2") == 0
+    # Lệnh Lua phát invalidation L1 chạy được trên backend RESP
+    assert int(sync_client.execute("GET", "cache:l1_invalidation_seq")) == 2
+    entries = sync_client.execute(
+        "ZRANGEBYSCORE", "cache:l1_invalidations", "-inf", "+inf", "WITHSCORES"
+    )
+    assert entries[::2] == ["k1", "k2"]
+
+
+@pytest.mark.asyncio
+async def test_resp_backend_async_pipeline(resp_clients):
+    """Client async RESP: pipeline trả kết quả thô, lệnh lỗi thành None."""
+    from unittest.mock import AsyncMock
+    from app.redis.helpers import async_cache_get, async_cache_set, pipeline
+
+    _, async_client = resp_clients
+    with patch(
+        "app.redis.helpers.get_async_redis_client", AsyncMock(return_value=async_client)
+    ):
+        assert await async_cache_set("profile", {"name": "a"}, ttl=60) is True
+        async with pipeline(transaction=True) as pipe:
+            index = pipe.get("profile")
+            pipe.execute("INCR", "counter")
+            pipe.execute("HGET", "profile", "name")
+
+    assert pipe.results[index] == {"name": "a"}
+    assert pipe.results[1:] == [1, None]
+    assert await async_client.ping() == "PONG"
+    await async_client.close()
+
+
+@pytest.mark.asyncio
+async def test_get_or_load_coalesces_concurrent_misses(resp_clients):
+    """Nhiều request đồng thời vào một key lạnh chỉ gọi loader một lần."""
+    import asyncio
+    from unittest.mock import AsyncMock
+    from app.redis.helpers import get_or_load
+
+    _, async_client = resp_clients
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"name": "a"}
+
+    with patch(
+        "app.redis.helpers.get_async_redis_client", AsyncMock(return_value=async_client)
+    ):
+        results = await asyncio.gather(
+            *(get_or_load("profile:1", loader, ttl=60, lock=True) for _ in range(50))
+        )
+        assert await get_or_load("profile:1", loader, ttl=60) == {"name": "a"}
+
+    assert calls == 1
+    assert all(result == {"name": "a"} for result in results)
+    assert await async_client.execute("EXISTS", "lock:profile:1") == 0
+
+
+@pytest.mark.asyncio
+async def test_get_or_load_leader_cancel_does_not_fail_waiters(resp_clients):
+    """Request dẫn đầu bị hủy: request đang chờ tự nạp lại thay vì nhận CancelledError."""
+    import asyncio
+    from unittest.mock import AsyncMock
+    from app.redis import helpers
+    from app.redis.helpers import get_or_load
+
+    _, async_client = resp_clients
+    started = asyncio.Event()
+
+    async def slow_loader():
+        started.set()
+        await asyncio.sleep(10)
+
+    async def loader():
+        return {"name": "b"}
+
+    with patch(
+        "app.redis.helpers.get_async_redis_client", AsyncMock(return_value=async_client)
+    ):
+        leader = asyncio.create_task(get_or_load("profile:2", slow_loader, ttl=60))
+        await started.wait()
+        coalesced = helpers._load_stats["coalesced"]
+        waiter = asyncio.create_task(get_or_load("profile:2", loader, ttl=60))
+        while helpers._load_stats["coalesced"] == coalesced:
+            await asyncio.sleep(0)
+        leader.cancel()
+        assert await waiter == {"name": "b"}
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+
+@pytest.mark.asyncio
+async def test_get_or_load_caches_tombstone(resp_clients):
+    """Loader trả về None được cache trong negative_ttl."""
+    from unittest.mock import AsyncMock
+    from app.redis.helpers import get_or_load
+
+    _, async_client = resp_clients
+    loader = AsyncMock(return_value=None)
+    with patch(
+        "app.redis.helpers.get_async_redis_client", AsyncMock(return_value=async_client)
+    ):
+        assert await get_or_load("missing", loader, negative_ttl=30) is None
+        assert await get_or_load("missing", loader, negative_ttl=30) is None
+
+    loader.assert_awaited_once()
+    assert 0 < await async_client.execute("TTL", "missing") <= 30
+
+
+@pytest.mark.asyncio
+async def test_get_or_load_refreshes_early_near_expiry():
+    """XFetch: entry sắp hết hạn và nạp chậm được làm mới trước TTL."""
+    import time
+    from unittest.mock import AsyncMock
+    from app.redis.helpers import LOADED_MARKER, get_or_load
+
+    # Đã tới thời điểm hết hạn logic: luôn nạp lại
+    envelope = {LOADED_MARKER: 1, "value": "old", "delta": 60.0, "expiry": time.time()}
+    loader = AsyncMock(return_value="new")
+    with patch(
+        "app.redis.helpers.async_cache_get", AsyncMock(return_value=envelope)
+    ), patch("app.redis.helpers.async_cache_set", AsyncMock(return_value=True)):
+        assert await get_or_load("k", loader, ttl=60) == "new"
+
+    envelope["expiry"] = time.time() + 3600
+    envelope["delta"] = 0.001
+    with patch("app.redis.helpers.async_cache_get", AsyncMock(return_value=envelope)):
+        assert await get_or_load("k", loader, ttl=60) == "old"
+    loader.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_get_or_load_waits_for_other_worker_lock(resp_clients):
+    """Worker khác giữ khóa nạp: chờ giá trị xuất hiện thay vì tự truy vấn."""
+    import asyncio
+    from unittest.mock import AsyncMock
+    from app.redis.helpers import get_or_load
+
+    _, async_client = resp_clients
+    await async_client.execute("SET", "lock:profile:2", "other", "PX", 5000)
+    loader = AsyncMock(return_value="mine")
+
+    async def other_worker():
+        await asyncio.sleep(0.1)
+        await async_client.setex("profile:2", 60, '"theirs"')
+
+    with patch(
+        "app.redis.helpers.get_async_redis_client", AsyncMock(return_value=async_client)
+    ):
+        result, _ = await asyncio.gather(
+            get_or_load("profile:2", loader, lock=True, lock_timeout=2), other_worker()
+        )
+
+    assert result == "theirs"
+    loader.assert_not_awaited()
+
+
+def test_circuit_breaker_state_machine():
+    """CLOSED -> OPEN sau đủ lỗi, HALF_OPEN cho một lời gọi thử, backoff tăng dần."""
+    import time
+    from app.redis.circuit_breaker import CircuitBreaker, CircuitState
+
+    breaker = CircuitBreaker("test", failure_threshold=2, base_backoff=0.02)
+    breaker.record_failure("boom")
+    assert breaker.state == CircuitState.CLOSED
+    breaker.record_failure("boom")
+    assert breaker.state == CircuitState.OPEN
+    assert breaker.allow_request() is False
+
+    time.sleep(0.03)
+    assert breaker.allow_request() is True
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert breaker.allow_request() is False  # Chỉ một lời gọi thử
+
+    breaker.record_failure("boom")
+    assert breaker.state == CircuitState.OPEN
+    assert breaker.retry_in() > 0.02  # Backoff gấp đôi
+
+    time.sleep(0.06)
+    assert breaker.allow_request() is True
+    breaker.record_success()
+    assert breaker.state == CircuitState.CLOSED
+    assert breaker.stats()["transitions"] == {"closed": 1, "open": 2, "half_open": 2}
+
+
+def test_get_redis_client_fails_fast_while_open():
+    """Khởi tạo thất bại mở circuit: các lần gọi sau trả None, không thử kết nối lại."""
+    from app.redis import client as client_module
+    from app.redis.circuit_breaker import CircuitBreaker, CircuitState
+
+    unreachable = MagicMock()
+    unreachable.ping.side_effect = ConnectionError("timeout")
+    breaker = CircuitBreaker("redis", base_backoff=60)
+    with patch.object(client_module, "redis_breaker", breaker), patch.object(
+        client_module, "_redis_client", None
+    ), patch.object(
+        client_module, "_create_redis_client", return_value=unreachable
+    ) as create:
+        assert client_module.get_redis_client() is None
+        assert client_module.get_redis_client() is None
+        assert cache_get("k", fallback="fallback") == "fallback"
+
+    create.assert_called_once()
+    assert breaker.state == CircuitState.OPEN
+    assert breaker.rejected >= 2
+
+
+def test_client_errors_do_not_trip_breaker():
+    """Lỗi lệnh (4xx) không tính là sự cố kết nối."""
+    import requests
+    from app.redis.circuit_breaker import CircuitBreaker, CircuitState
+    from app.redis.client import UpstashRestClient
+
+    breaker = CircuitBreaker("redis", failure_threshold=1)
+    client = UpstashRestClient("http://upstash.test", "token", breaker=breaker)
+    bad_request = MagicMock(status_code=400)
+    bad_request.raise_for_status.side_effect = requests.HTTPError(response=bad_request)
+    with patch.object(client.session, "request", return_value=bad_request):
+        with pytest.raises(Exception):
+            client.get("k")
+    assert breaker.state == CircuitState.CLOSED
+
+    with patch.object(
+        client.session, "request", side_effect=requests.ConnectionError("refused")
+    ):
+        with pytest.raises(Exception):
+            client.get("k")
+    assert breaker.state == CircuitState.OPEN
+
+
+def test_codec_handles_uuid_datetime_enum_and_legacy_json():
+    """Codec encode UUID/datetime/Enum, vẫn đọc được JSON cũ không có envelope."""
+    from datetime import datetime, timezone
+    from enum import Enum
+    from uuid import UUID
+    from app.redis.codec import CacheCodec
+
+    class Color(str, Enum):
+        RED = "red"
+
+    codec = CacheCodec(compress_threshold=0)
+    user_id = UUID("00000000-0000-0000-0000-000000000001")
+    value = {
+        "id": user_id,
+        "at": datetime(2025, 1, 1, tzinfo=timezone.utc),
+        "color": Color.RED,
+    }
+    assert codec.decode(codec.encode(value)) == {
+        "id": str(user_id),
+        "at": "2025-01-01T00:00:00+00:00",
+        "color": "red",
+    }
+    assert codec.decode('{"legacy": true}') == {"legacy": True}
+    assert codec.decode("plain text") == "plain text"
+
+
+def test_codec_compresses_large_values_and_rejects_unknown_versions():
+    """Payload lớn được nén; envelope phiên bản lạ thành cache miss."""
+    from app.redis.codec import CacheCodec, CodecError
+
+    codec = CacheCodec(compress_threshold=256)
+    value = [{"name": "Bench User", "roles": ["customer"]}] * 100
+    encoded = codec.encode(value)
+    assert encoded[3] == "z"
+    assert len(encoded) < len(str(value)) / 4
+    assert codec.decode(encoded) == value
+
+    with pytest.raises(CodecError):
+        codec.decode("\x1f9j-{}")
+    with pytest.raises(CodecError):
+        codec.decode("\x1f1m-gqFhAQ==")  # Codec không còn hỗ trợ (msgpack)
+    with patch('app.redis.helpers.get_redis_client') as mock_get_client:
+        mock_get_client.return_value.get.return_value = "\x1f9j-{}"
+        assert cache_get("future", fallback="miss") == "miss"
+
+
+def test_invalidate_tag_expires_tagged_entries(resp_clients):
+    """invalidate_tag chỉ tăng version; entry mang tag đó thành miss, entry khác giữ nguyên."""
+    from app.redis.helpers import cache_get_many, invalidate_tag
+
+    sync_client, _ = resp_clients
+    with patch('app.redis.helpers.get_redis_client', return_value=sync_client):
+        cache_set("profile:1", {"name": "a"}, tags=["user:1", "role:admin"])
+        cache_set("profile:2", {"name": "b"}, tags=["user:2", "role:customer"])
+        assert cache_get("profile:1") == {"name": "a"}  # L1 hit, tag hợp lệ
+
+        assert invalidate_tag("role:admin") is True
+        assert cache_get("profile:1", fallback="miss") == "miss"
+        assert cache_get_many(["profile:1", "profile:2"], fallback="miss") == {
+            "profile:1": "miss",
+            "profile:2": {"name": "b"},
+        }
+
+    assert sync_client.execute("GET", "tag:role:admin") == "1"
+
+
+@pytest.mark.asyncio
+async def test_tag_invalidation_reaches_other_workers(resp_clients):
+    """Worker khác bỏ version tag đã biết khi đồng bộ kênh invalidation L1."""
+    from unittest.mock import AsyncMock
+    from app.redis import helpers
+
+    sync_client, async_client = resp_clients
+    with patch(
+        "app.redis.helpers.get_async_redis_client", AsyncMock(return_value=async_client)
+    ), patch("app.redis.helpers.get_redis_client", return_value=sync_client):
+        helpers._l1_cursor = None
+        helpers._sync_l1_invalidations()  # Khởi tạo cursor từ seq hiện tại
+        await helpers.async_cache_set("profile:1", {"name": "a"}, tags=["role:admin"])
+        assert "role:admin" in helpers._tag_versions
+
+        # Worker khác tăng version trực tiếp trên Redis và phát invalidation
+        await async_client.pipeline(helpers._invalidate_tag_commands(("role:admin",)))
+        helpers._sync_l1_invalidations()
+
+        assert "role:admin" not in helpers._tag_versions
+        assert await helpers.async_cache_get("profile:1", fallback="miss") == "miss"
+
+
+def test_tag_versions_kept_without_l1(resp_clients):
+    """Tắt L1: version tag vẫn giữ trong worker, đọc entry có tag không MGET thêm."""
+    from unittest.mock import MagicMock
+    from app.redis import helpers
+
+    sync_client, _ = resp_clients
+    redis = MagicMock(wraps=sync_client)
+    with patch.object(helpers, "_l1", None), patch(
+        "app.redis.helpers.get_redis_client", return_value=redis
+    ), patch.object(helpers._l1_refresher, "maybe_refresh"):
+        helpers._l1_cursor = None
+        helpers._sync_l1_invalidations()
+        cache_set("profile:1", {"name": "a"}, tags=["role:admin"])
+        redis.mget.reset_mock()  # MGET lúc ghi để stamp version là cần thiết
+        for _ in range(3):
+            assert cache_get("profile:1") == {"name": "a"}
+        redis.mget.assert_not_called()
+
+        # Worker khác invalidate tag: kênh invalidation vẫn chạy khi tắt L1
+        sync_client.pipeline(helpers._invalidate_tag_commands(("role:admin",)))
+        helpers._sync_l1_invalidations()
+        assert cache_get("profile:1", fallback="miss") == "miss"
+
+
+@pytest.mark.asyncio
+async def test_invalidation_queue_coalesces_and_batches(resp_clients):
+    """Key trùng chỉ xóa một lần; cả lô đi trong một pipeline, đọc lúc chờ là miss."""
+    from unittest.mock import AsyncMock
+    from app.redis import helpers
+
+    sync_client, async_client = resp_clients
+    with patch(
+        "app.redis.helpers.get_async_redis_client", AsyncMock(return_value=async_client)
+    ):
+        await helpers.async_cache_set_many({"p:1": 1, "p:2": 2}, ttl=60)
+        flush = AsyncMock(wraps=helpers._flush_invalidations)
+        with patch.object(helpers.invalidation_queue, "_flush", flush):
+            helpers.async_cache_invalidate("p:1", "p:2")
+            helpers.async_cache_invalidate("p:1")
+            assert await helpers.async_cache_get("p:1", fallback="miss") == "miss"
+            assert await helpers.invalidation_queue.drain(timeout=1) is True
+
+    flush.assert_awaited_once_with(["p:1", "p:2"])
+    assert sync_client.execute("EXISTS", "p:1", "p:2") == 0
+    assert helpers.invalidation_queue.stats()["coalesced"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_invalidation_queue_retries_with_backoff():
+    """Lô lỗi được thử lại; quá số lần thử thì bỏ thay vì kẹt hàng đợi."""
+    from unittest.mock import AsyncMock
+    from app.redis.invalidation import InvalidationQueue
+
+    flush = AsyncMock(side_effect=[ConnectionError("down"), None])
+    queue = InvalidationQueue(flush, flush_interval=0, retry_base=0.001)
+    queue.enqueue("k1")
+    assert await queue.drain(timeout=1) is True
+    assert flush.await_count == 2
+    assert queue.stats()["retries"] == 1 and queue.stats()["flushed"] == 1
+
+    failing = InvalidationQueue(
+        AsyncMock(side_effect=ConnectionError("down")),
+        flush_interval=0,
+        max_retries=2,
+        retry_base=0.001,
+    )
+    failing.enqueue("k2")
+    assert await failing.drain(timeout=1) is True
+    assert failing.stats()["dropped"] == 1 and not failing.is_pending("k2")
+
+
+@pytest.mark.asyncio
+async def test_flush_invalidations_raises_on_failed_delete():
+    """DEL lỗi trong pipeline làm lô bị đưa lại hàng đợi thay vì tính là đã xóa."""
+    from unittest.mock import AsyncMock
+    from app.redis import helpers
+    from app.redis.invalidation import InvalidationQueue
+
+    redis = MagicMock()
+    redis.pipeline = AsyncMock(side_effect=[[None, 3], [2, 3]])
+    queue = InvalidationQueue(
+        helpers._flush_invalidations, flush_interval=0, retry_base=0.001
+    )
+    with patch(
+        "app.redis.helpers.get_async_redis_client", AsyncMock(return_value=redis)
+    ):
+        queue.enqueue("p:1")
+        assert await queue.drain(timeout=1) is True
+
+    assert redis.pipeline.await_count == 2
+    assert queue.stats()["retries"] == 1 and queue.stats()["flushed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_metrics_per_namespace(resp_clients):
+    """Hit/miss/set/bytes/fallback được đếm theo prefix key và xuất được cho Prometheus."""
+    from unittest.mock import AsyncMock
+    from app.api.metrics import get_metrics
+    from app.redis import helpers
+
+    helpers.cache_metrics.reset()
+    _, async_client = resp_clients
+    with patch(
+        "app.redis.helpers.get_async_redis_client", AsyncMock(return_value=async_client)
+    ):
+        await helpers.async_cache_set("user_profile:1", {"a": 1}, ttl=60)
+        await helpers.async_cache_get("user_profile:1")  # L1 hit
+        helpers.clear_local_cache()
+        await helpers.async_cache_get("user_profile:1")  # L2 hit
+        await helpers.async_cache_get_many(["user_profile:2", "session:1"])
+    with patch(
+        "app.redis.helpers.get_async_redis_client", AsyncMock(return_value=None)
+    ):
+        await helpers.async_cache_get("user_profile:3")
+
+    profile = helpers.cache_metrics.snapshot()["user_profile"]
+    assert profile["hits_l1"] == 1 and profile["hits_l2"] == 1
+    assert profile["misses"] == 1 and profile["sets"] == 1
+    assert profile["fallbacks"] == 1 and profile["errors"] == 0
+    assert profile["bytes_written"] == profile["bytes_read"] > 0
+    assert profile["latency_seconds"]["get"]["count"] == 4
+    assert profile["latency_seconds"]["get"]["buckets"]["+Inf"] == 4
+    assert helpers.cache_metrics.snapshot()["session"]["misses"] == 1
+
+    response = await get_metrics(format="prometheus")
+    text = response.body.decode()
+    assert 'zenspa_cache_hits_l2_total{namespace="user_profile"} 1' in text
+    assert (
+        'zenspa_cache_operation_seconds_count{namespace="user_profile",operation="get"} 4'
+        in text
+    )
+    assert "zenspa_cache_circuit_state 0" in text
+
+
+@pytest.mark.asyncio
+async def test_cached_query_invalidated_by_commit_on_dependent_table(resp_clients):
+    """@cached_query cache theo tham số; commit ghi vào bảng phụ thuộc làm entry cũ."""
+    import asyncio
+    from unittest.mock import AsyncMock
+    from sqlmodel import Session, create_engine, select, update
+    from app.modules.user.user_models import Role
+    from app.redis import query_cache
+    from app.redis.query_cache import cached_query
+
+    engine = create_engine("sqlite://")
+    Role.__table__.create(engine)
+    calls = 0
+
+    @cached_query(ttl=60, depends_on=[Role])
+    async def role_names(session, prefix: str = "") -> list[str]:
+        nonlocal calls
+        calls += 1
+        roles = session.exec(select(Role).order_by(Role.id)).all()
+        return [role.name for role in roles if role.name.startswith(prefix)]
+
+    _, async_client = resp_clients
+    with patch(
+        "app.redis.helpers.get_async_redis_client", AsyncMock(return_value=async_client)
+    ), Session(engine) as session:
+        session.add(Role(name="admin"))
+        session.commit()
+        await asyncio.gather(*list(query_cache._tasks))
+
+        assert await role_names(session) == ["admin"]
+        assert await role_names(session, prefix="") == ["admin"]
+        assert await role_names(session, "a") == ["admin"]
+        assert calls == 2  # Session không thuộc key; prefix "" và "a" là hai entry
+
+        # Ghi chưa commit trong session: đọc thẳng DB
+        session.add(Role(name="customer"))
+        assert await role_names(session) == ["admin", "customer"]
+        session.commit()
+        assert query_cache.query_cache_stats()["pending_tables"] == ["roles"]
+        await asyncio.gather(*list(query_cache._tasks))
+        assert await role_names(session) == ["admin", "customer"]
+        calls_before_update = calls
+
+        # Câu lệnh update trực tiếp cũng được ghi nhận
+        session.exec(update(Role).where(Role.name == "admin").values(name="owner"))
+        session.commit()
+        await asyncio.gather(*list(query_cache._tasks))
+        assert await role_names(session) == ["owner", "customer"]
+        assert calls == calls_before_update + 1
+
+    assert query_cache.query_cache_stats()["pending_tables"] == []
+
+
+@pytest.mark.asyncio
+async def test_commit_on_uncached_table_sends_no_invalidation():
+    """Ghi vào bảng không có trong depends_on nào: không tăng version tag, không gọi Redis."""
+    from unittest.mock import AsyncMock
+    from sqlalchemy import Column, Integer, MetaData, Table, insert
+    from sqlmodel import Session, create_engine
+    from app.redis import query_cache
+
+    audit_log = Table("audit_log", MetaData(), Column("id", Integer, primary_key=True))
+    engine = create_engine("sqlite://")
+    audit_log.create(engine)
+
+    invalidate = AsyncMock(return_value=True)
+    with patch.object(query_cache, "async_invalidate_tag", invalidate), Session(
+        engine
+    ) as session:
+        session.execute(insert(audit_log).values(id=1))
+        session.commit()
+
+    assert "audit_log" not in query_cache.query_cache_stats()["tables"]
+    assert not query_cache._tasks
+    invalidate.assert_not_awaited()
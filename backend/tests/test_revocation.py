@@ -0,0 +1,51 @@
+"""Tests cho token revocation list."""
+
+from unittest.mock import MagicMock, patch
+
+from app.core.revocation import BloomFilter, RevocationList, REVOKED_KEY
+
+
+def _revocation_list() -> RevocationList:
+    return RevocationList(
+        capacity=1000, retention=3600, sync_interval=3600, full_sync_interval=3600
+    )
+
+
+def test_bloom_filter_membership():
+    """Phần tử đã thêm luôn được báo có; tỉ lệ dương tính giả thấp."""
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"sub:{i}")
+
+    assert all(f"sub:{i}" in bloom for i in range(1000))
+    false_positives = sum(f"other:{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_is_revoked_only_checks_redis_on_filter_hit():
+    """Token không có trong filter không tốn lookup Redis."""
+    mock_client = MagicMock()
+    mock_client.execute.side_effect = lambda *cmd: (
+        ["sub:user-1", "1000"] if cmd[0] == "ZRANGEBYSCORE" else "1000"
+    )
+    revocations = _revocation_list()
+
+    with patch("app.core.revocation.get_redis_client", return_value=mock_client):
+        revocations.refresher.run_now()
+        assert revocations.is_revoked("user-2") is False
+        assert revocations.exact_lookups == 0
+
+        # Token phát hành trước thời điểm thu hồi bị từ chối, token mới thì không
+        assert revocations.is_revoked("user-1", issued_at=900) is True
+        assert revocations.is_revoked("user-1", issued_at=1100) is False
+        mock_client.execute.assert_any_call("ZSCORE", REVOKED_KEY, "sub:user-1")
+
+
+def test_revoke_without_redis_applies_locally():
+    """Redis down: thu hồi vẫn có hiệu lực trong worker hiện tại."""
+    revocations = _revocation_list()
+
+    with patch("app.core.revocation.get_redis_client", return_value=None):
+        assert revocations.revoke_token("session-1") is False
+        assert revocations.is_revoked("user-1", jti="session-1") is True
+        assert revocations.is_revoked("user-1", jti="session-2") is False
@@ -56,3 +56,293 @@ def test_profile_update_schema():
     update = ProfileUpdate(full_name="Updated Name", phone="+84123456789")
     assert update.full_name == "Updated Name"
     assert update.phone == "+84123456789"
+
+
+def test_permission_policy_masks():
+    """Ma trận quyền được biên dịch thành bitmask theo role."""
+    from app.core.auth import CurrentUser
+    from app.modules.user.user_permissions import Permission, policy
+
+    admin = CurrentUser("1", None, None, ["admin"])
+    customer = CurrentUser("2", None, None, ["customer", "unknown-role"])
+    required = policy.mask_of([Permission.USER_ROLE_ASSIGN])
+
+    assert policy.has(admin, required)
+    assert not policy.has(customer, required)
+    assert policy.has(customer, policy.mask_of([Permission.PROFILE_READ_OWN]))
+    assert customer.permission_mask is not None  # Mask được giữ lại trên user
+
+
+@pytest.mark.asyncio
+async def test_require_permission_dependency():
+    """require() dùng lại dependency và trả 403 khi thiếu quyền."""
+    from unittest.mock import patch
+    from fastapi import HTTPException
+    from app.core.auth import CurrentUser
+    from app.modules.user import user_permissions
+    from app.modules.user.user_permissions import Permission, require
+
+    dependency = require(Permission.STAFF_INVITE)
+    assert require(Permission.STAFF_INVITE) is dependency
+
+    admin = CurrentUser("1", None, None, ["admin"])
+    with patch.object(user_permissions.role_versions, "current", return_value=0):
+        assert await dependency(current_user=admin, session=None) is admin
+
+        with pytest.raises(HTTPException) as exc_info:
+            await dependency(
+                current_user=CurrentUser("2", None, None, ["technician"]), session=None
+            )
+    assert exc_info.value.status_code == 403
+
+
+def test_route_carries_required_permissions():
+    """Mask và x-permissions gắn vào từng route, không chỉ vào dependency dùng chung."""
+    from fastapi import FastAPI
+    from app.modules.user.user_permissions import Permission, policy
+    from app.modules.user.user_routes import admin_router, router
+
+    warmup = next(route for route in admin_router.routes if route.path == "/cache/warmup")
+    assert warmup.required_mask == policy.mask_of([Permission.CACHE_WARMUP])
+    assert warmup.openapi_extra["x-permissions"] == [Permission.CACHE_WARMUP.value]
+    me = next(route for route in router.routes if route.path == "/me")
+    assert not hasattr(me, "required_mask")
+
+    app = FastAPI()
+    app.include_router(admin_router, prefix="/admin")
+    operations = app.openapi()["paths"]["/admin/cache/warmup"]
+    assert {op["x-permissions"][0] for op in operations.values()} == {"cache:warmup"}
+
+
+@pytest.mark.asyncio
+async def test_unknown_role_version_does_not_trust_jwt_roles():
+    """User worker chưa biết version (mới gặp, bị evict): roles lấy từ DB, không từ JWT."""
+    from unittest.mock import AsyncMock, patch
+    from app.core.auth import CurrentUser
+    from app.core.role_version import RoleVersionMap
+    from app.modules.user import user_permissions
+    from app.modules.user.user_permissions import Permission, require
+
+    user_id = "00000000-0000-0000-0000-000000000002"
+    demoted = CurrentUser(user_id, None, None, ["admin"])  # JWT còn role cũ
+    dependency = require(Permission.USER_ROLE_ASSIGN)
+    get_roles = AsyncMock(return_value=["customer"])
+    versions = RoleVersionMap(max_size=1, retention=3600, sync_interval=3600)
+
+    with patch.object(user_permissions, "role_versions", versions), patch.object(
+        user_permissions, "get_role_names", get_roles
+    ), patch("app.core.role_version.get_redis_client", return_value=None):
+        with pytest.raises(Exception):
+            await dependency(current_user=demoted, session=None)
+        versions.current("other-user")  # Đẩy user khỏi LRU
+        with pytest.raises(Exception):
+            await dependency(current_user=demoted, session=None)
+
+    assert get_roles.await_count == 2
+    assert demoted.roles == ["customer"]
+
+
+@pytest.mark.asyncio
+async def test_role_version_change_reloads_roles_from_db():
+    """Role version khác -> đọc roles từ DB một lần, sau đó dùng lại."""
+    from unittest.mock import AsyncMock, patch
+    from app.core.auth import CurrentUser
+    from app.modules.user import user_permissions
+    from app.modules.user.user_permissions import Permission, require
+
+    user_id = "00000000-0000-0000-0000-000000000001"
+    user = CurrentUser(user_id, None, None, ["admin"])
+    dependency = require(Permission.USER_ROLE_ASSIGN)
+    get_roles = AsyncMock(return_value=["customer"])
+
+    with patch.object(
+        user_permissions.role_versions, "current", return_value=2
+    ), patch.object(user_permissions, "get_role_names", get_roles):
+        with pytest.raises(Exception):
+            await dependency(current_user=user, session=None)
+        with pytest.raises(Exception):
+            await dependency(current_user=user, session=None)
+
+    get_roles.assert_awaited_once()
+    assert user.roles == ["customer"]
+    assert user.role_version == 2
+
+
+@pytest.mark.asyncio
+async def test_warm_user_cache_batches_with_concurrency_limit():
+    """Warmup chia batch, không vượt giới hạn song song và báo tiến độ."""
+    import asyncio
+    import uuid
+    from unittest.mock import AsyncMock, MagicMock, patch
+    from app.modules.user import user_warmup
+    from app.redis.helpers import unwrap_loaded
+
+    user_ids = [uuid.uuid4() for _ in range(25)]
+    session = MagicMock()
+    session.__aenter__ = AsyncMock(return_value=session)
+    session.__aexit__ = AsyncMock(return_value=False)
+    session.exec = AsyncMock(return_value=MagicMock(all=lambda: user_ids))
+    running = peak = 0
+
+    async def load_profiles(_, batch):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return {user_id: {"id": user_id, "roles": ["customer"]} for user_id in batch}
+
+    set_many = AsyncMock(return_value=True)
+    with patch.object(
+        user_warmup, "AsyncSessionLocal", return_value=session
+    ), patch.object(
+        user_warmup, "load_roles", AsyncMock(return_value=[])
+    ), patch.object(
+        user_warmup, "load_profiles_with_roles", load_profiles
+    ), patch.object(
+        user_warmup, "async_cache_set", AsyncMock(return_value=True)
+    ), patch.object(user_warmup, "async_cache_set_many", set_many):
+        progress = await user_warmup.warm_user_cache(
+            limit=25, batch_size=10, concurrency=2
+        )
+
+    assert progress["status"] == "completed"
+    assert progress["total"] == progress["warmed"] == 25
+    assert set_many.await_count == 3  # 10 + 10 + 5, mỗi batch một pipeline
+    assert peak == 2
+    # Entry ghi cùng envelope với get_or_load (XFetch làm mới sớm được)
+    entry = next(iter(set_many.await_args_list[0].args[0].values()))
+    assert unwrap_loaded(entry)["roles"] == ["customer"] and "expiry" in entry
+
+
+def test_warmup_limit_is_validated():
+    """limit âm hoặc quá trần bị từ chối (422) trước khi vào SQL LIMIT."""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.modules.user import user_routes
+    from app.modules.user.user_permissions import Permission, require
+
+    app = FastAPI()
+    app.include_router(user_routes.admin_router)
+    app.dependency_overrides[require(Permission.CACHE_WARMUP)] = lambda: None
+    client = TestClient(app)
+
+    assert client.post("/cache/warmup", params={"limit": -1}).status_code == 422
+    too_many = user_routes.WARMUP_MAX_PROFILES + 1
+    assert client.post("/cache/warmup", params={"limit": too_many}).status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_warmup_lease_allows_one_worker_and_shares_status():
+    """Chỉ một worker giữ lease warmup; trạng thái đọc được từ Redis ở worker khác."""
+    import asyncio
+    import json
+    from unittest.mock import AsyncMock, patch
+    from app.modules.user import user_warmup
+    from app.redis.client import AsyncRespRedisClient
+
+    fakeredis = pytest.importorskip("fakeredis")
+    redis = AsyncRespRedisClient(fakeredis.aioredis.FakeRedis(decode_responses=True))
+    release = asyncio.Event()
+
+    async def warm(**kwargs):
+        user_warmup.warmup_progress.start()
+        await user_warmup._publish_progress()
+        await release.wait()
+
+    with patch.object(
+        user_warmup, "get_async_redis_client", AsyncMock(return_value=redis)
+    ), patch.object(user_warmup, "warm_user_cache", warm):
+        assert await user_warmup.start_warmup() is True
+        await asyncio.sleep(0.01)
+        assert (await user_warmup.get_warmup_status())["status"] == "running"
+
+        # Worker khác: lease đang bị giữ nên không chạy thêm một lần warmup
+        user_warmup._warmup_task, task = None, user_warmup._warmup_task
+        assert await user_warmup.start_warmup() is False
+
+        release.set()
+        await task
+        assert await redis.exists(user_warmup.WARMUP_LEASE_KEY) == 0
+
+        # Worker chạy warmup chết giữa chừng: lease hết hạn, trạng thái báo lỗi
+        status = json.loads(await redis.get(user_warmup.WARMUP_STATUS_KEY))
+        assert status["status"] == "running"
+        interrupted = await user_warmup.get_warmup_status()
+        assert interrupted["status"] == "failed"
+
+
+@pytest.mark.asyncio
+async def test_invalidate_changed_users_from_notify_payloads():
+    """Payload NOTIFY xóa cache hồ sơ; thay đổi role tăng role version."""
+    import uuid
+    from unittest.mock import MagicMock, patch
+    from app.modules.user import user_service
+
+    profile_user, role_user = uuid.uuid4(), uuid.uuid4()
+    invalidate = MagicMock()
+    bump = MagicMock()
+    with patch.object(user_service, "async_cache_invalidate", invalidate), patch.object(
+        user_service.role_versions, "bump", bump
+    ):
+        await user_service.invalidate_changed_users(
+            {f"profiles:{profile_user}", f"user_role_links:{role_user}", "profiles:bad"}
+        )
+
+    assert set(invalidate.call_args.args) == {
+        f"user_profile:{profile_user}",
+        f"user_profile:{role_user}",
+    }
+    bump.assert_called_once_with(role_user)
+
+
+def test_user_statements_reuse_cache_key_across_parameters():
+    """Lambda statement: khác tham số vẫn cùng cache key, giá trị đi qua bind param."""
+    import uuid
+    from sqlalchemy.dialects.postgresql import asyncpg
+    from app.modules.user import user_statements as statements
+
+    first_id, second_id = uuid.uuid4(), uuid.uuid4()
+    first = statements.role_names_of_user(first_id)
+    second = statements.role_names_of_user(second_id)
+    first_key, second_key = first._generate_cache_key(), second._generate_cache_key()
+
+    assert first_key.key == second_key.key
+    assert [param.value for param in second_key.bindparams] == [second_id]
+    assert "$1::UUID" in str(second.compile(dialect=asyncpg.dialect()))
+    assert (
+        statements.profile_by_id(first_id)._generate_cache_key().key
+        != first_key.key
+    )
+
+
+@pytest.mark.asyncio
+async def test_ensure_profile_rechecks_primary_before_creating():
+    """Miss qua replica: profile đã có trên primary thì chỉ bỏ tombstone, không INSERT."""
+    import uuid
+    from unittest.mock import AsyncMock, MagicMock, patch
+    from app.modules.user import user_service
+
+    user_id = uuid.uuid4()
+    create = AsyncMock()
+    invalidate = MagicMock()
+    loaded = AsyncMock(return_value={"id": user_id})
+    with patch.object(
+        user_service, "get_profile_by_id", AsyncMock(return_value=MagicMock())
+    ), patch.object(user_service, "create_profile", create), patch.object(
+        user_service, "_invalidate_profile_cache", invalidate
+    ), patch.object(user_service, "get_profile_with_roles", loaded):
+        assert await user_service.ensure_profile_with_roles(
+            "primary", user_id, "a@example.com", None
+        ) == {"id": user_id}
+    create.assert_not_awaited()
+    invalidate.assert_called_once_with(f"user_profile:{user_id}")
+
+    with patch.object(
+        user_service, "get_profile_by_id", AsyncMock(return_value=None)
+    ), patch.object(user_service, "create_profile", create), patch.object(
+        user_service, "get_profile_with_roles", loaded
+    ):
+        await user_service.ensure_profile_with_roles("primary", user_id, None, "A")
+    create.assert_awaited_once()
+    loaded.assert_awaited_with("primary", user_id, None)